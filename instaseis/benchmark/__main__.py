@@ -279,6 +279,17 @@ class BufferedFullyRandom(InstaseisBenchmark):
         return "Buffered, random src and receiver"
 
 
+class BufferedFullyRandomNoElementIndex(BufferedFullyRandom):
+    def setup(self):
+        self.db = open_db(self.path, read_on_demand=False,
+                          buffer_size_in_mb=250, use_element_index=False)
+        self.max_depth = self.db.info.max_radius - self.db.info.min_radius
+
+    @property
+    def description(self):
+        return "Buffered, random src and receiver, kd-tree element search"
+
+
 class UnbufferedFullyRandom(InstaseisBenchmark):
     def setup(self):
         self.db = open_db(self.path, read_on_demand=False,
@@ -303,6 +314,18 @@ class UnbufferedFullyRandom(InstaseisBenchmark):
         return "Unbuffered, random src and receiver"
 
 
+class UnbufferedFullyRandomNoReadCoalescing(UnbufferedFullyRandom):
+    def setup(self):
+        self.db = open_db(self.path, read_on_demand=False,
+                          buffer_size_in_mb=0, max_read_gap=0)
+        self.max_depth = self.db.info.max_radius - self.db.info.min_radius
+
+    @property
+    def description(self):
+        return "Unbuffered, random src and receiver, only strictly " \
+               "consecutive GLL points read at once"
+
+
 class UnbufferedAndRandomReadOnDemandTrue(InstaseisBenchmark):
     def setup(self):
         self.db = open_db(self.path, read_on_demand=True,
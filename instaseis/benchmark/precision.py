@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Accuracy of the single precision compute path compared to the default
+double precision one. Run with
+
+$ python -m instaseis.benchmark.precision /path/to/DB [/path/to/DB2 ...]
+
+If no path is given, all databases in the test data directory are used.
+
+:copyright:
+    The Instaseis Development Team (instaseis@googlegroups.com), 2026
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import argparse
+import os
+import random
+
+import numpy as np
+
+from instaseis import open_db, ForceSource, Receiver, Source
+
+
+TEST_DATA = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "tests", "data")
+
+
+def _random_pairs(db, n, force):
+    """
+    n random source-receiver pairs within the range of the database.
+    """
+    max_depth = db.info.max_radius - db.info.min_radius
+    pairs = []
+    for _ in range(n):
+        kwargs = dict(
+            latitude=np.rad2deg(np.arcsin(2 * random.random() - 1)),
+            longitude=random.random() * 360.0 - 180.0,
+            depth_in_m=random.random() * max_depth
+            if db.info.is_reciprocal else db.info.source_depth * 1000.0)
+        if force:
+            src = ForceSource(f_r=1E10, f_t=-2E10, f_p=3E10, **kwargs)
+        else:
+            src = Source(m_rr=4.71E17, m_tt=3.81E17, m_pp=-4.74E17,
+                         m_rt=3.99E17, m_rp=-8.05E17, m_tp=-1.23E17,
+                         **kwargs)
+        rec = Receiver(
+            latitude=np.rad2deg(np.arcsin(2 * random.random() - 1)),
+            longitude=random.random() * 360.0 - 180.0)
+        pairs.append((src, rec))
+    return pairs
+
+
+def compare_precisions(path, n=20, seed=12345):
+    """
+    Extract seismograms for random source-receiver pairs with single and
+    double precision and compare them.
+
+    :param path: The database to test.
+    :param n: The number of source-receiver pairs.
+    :param seed: Seed of the random source and receiver locations.
+    :returns: A dictionary with the maximum and the median error of all
+        traces, each relative to the maximum amplitude of the double
+        precision trace, and the memory used by the buffers of both
+        databases, in total and per strain and displacement buffer. The
+        buffers are large enough to never evict anything so
+        both hold the same elements.
+    """
+    random.seed(seed)
+    db_64 = open_db(path, precision="float64", buffer_size_in_mb=1000)
+    db_32 = open_db(path, precision="float32", buffer_size_in_mb=1000)
+
+    pairs = _random_pairs(db_64, n, force=False)
+    if db_64.info.is_reciprocal and db_64.info.dump_type == "displ_only":
+        pairs.extend(_random_pairs(db_64, n, force=True))
+
+    errors = []
+    for src, rec in pairs:
+        components = ["Z", "N", "E"]
+        if db_64.info.components == "horizontal only":
+            components = ["N", "E"]
+        elif db_64.info.components == "vertical only":
+            components = ["Z"]
+        st_64 = db_64.get_seismograms(source=src, receiver=rec,
+                                      components=components)
+        st_32 = db_32.get_seismograms(source=src, receiver=rec,
+                                      components=components)
+        for tr_64, tr_32 in zip(st_64, st_32):
+            peak = np.abs(tr_64.data).max()
+            if not peak:
+                continue
+            errors.append(np.abs(tr_64.data - tr_32.data).max() / peak)
+
+    def _buffer_size(db, buffer="both"):
+        buffers = {"strain": ("strain_buffer",),
+                   "displ": ("displ_buffer",),
+                   "both": ("strain_buffer", "displ_buffer")}[buffer]
+        return sum(getattr(m, b).get_size_mb() for m in db.meshes
+                   if m is not None for b in buffers)
+
+    return {
+        "max_relative_error": max(errors) if errors else 0.0,
+        "median_relative_error": float(np.median(errors)) if errors else 0.0,
+        "buffer_size_in_mb_float64": _buffer_size(db_64),
+        "buffer_size_in_mb_float32": _buffer_size(db_32),
+        "strain_buffer_size_in_mb_float64": _buffer_size(db_64, "strain"),
+        "strain_buffer_size_in_mb_float32": _buffer_size(db_32, "strain"),
+        "displ_buffer_size_in_mb_float64": _buffer_size(db_64, "displ"),
+        "displ_buffer_size_in_mb_float32": _buffer_size(db_32, "displ")}
+
+
+def _find_databases(folder):
+    """
+    All folders directly in folder that can be opened as a database.
+    """
+    dbs = []
+    for name in sorted(os.listdir(folder)):
+        path = os.path.join(folder, name)
+        if not os.path.isdir(path):
+            continue
+        try:
+            open_db(path)
+        except Exception:
+            continue
+        dbs.append(path)
+    return dbs
+
+
+def run_report(paths, n):
+    """
+    Print the accuracy report for a number of databases.
+    """
+    print("Single vs. double precision for %i source-receiver pairs:" % n)
+    for path in paths:
+        r = compare_precisions(path, n=n)
+        print("  %-40s max. error: %.2e  median error: %.2e  "
+              "buffers: %.1f MB vs. %.1f MB" % (
+                  os.path.basename(os.path.normpath(path)),
+                  r["max_relative_error"], r["median_relative_error"],
+                  r["buffer_size_in_mb_float32"],
+                  r["buffer_size_in_mb_float64"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="python -m instaseis.benchmark.precision",
+        description="Compare single and double precision seismograms.")
+    parser.add_argument("folder", type=str, nargs="*",
+                        help="path to AxiSEM Green's function databases")
+    parser.add_argument("-n", type=int, default=20,
+                        help="Number of source-receiver pairs per database.")
+    args = parser.parse_args()
+    run_report(args.folder or _find_databases(TEST_DATA), args.n)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark comparing the scalar and the array versions of the
+rotations. Run with
+
+$ python -m instaseis.benchmark.rotations
+
+:copyright:
+    The Instaseis Development Team (instaseis@googlegroups.com), 2026
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import argparse
+import time
+
+import numpy as np
+
+from instaseis import rotations
+
+
+def _time_it(fct):
+    a = time.time()
+    fct()
+    return time.time() - a
+
+
+def run_benchmark(n):
+    """
+    Time n rotations with the scalar and the array functions and print the
+    results.
+    """
+    np.random.seed(12345)
+    mt = np.random.randn(n, 6) * 1e17
+    x, y, z = np.random.randn(3, n) * 6371e3
+    phi = np.random.uniform(-np.pi, np.pi, n)
+    theta = np.random.uniform(0.0, np.pi, n)
+    lon = np.rad2deg(phi)
+    colat = np.rad2deg(theta)
+
+    benchmarks = [
+        ("rotate_frame_rd",
+         lambda: [rotations.rotate_frame_rd(x[_i], y[_i], z[_i], lon[_i],
+                                            colat[_i]) for _i in range(n)],
+         lambda: rotations.rotate_frame_rd_array(x, y, z, lon, colat)),
+        ("rotate_symm_tensor_voigt_xyz_src_to_xyz_earth",
+         lambda: [rotations.rotate_symm_tensor_voigt_xyz_src_to_xyz_earth(
+             mt[_i], phi[_i], theta[_i]) for _i in range(n)],
+         lambda: rotations.rotate_symm_tensor_voigt_xyz_src_to_xyz_earth_array(
+             mt, phi, theta)),
+        ("rotate_symm_tensor_voigt_xyz_earth_to_xyz_src",
+         lambda: [rotations.rotate_symm_tensor_voigt_xyz_earth_to_xyz_src(
+             mt[_i], phi[_i], theta[_i]) for _i in range(n)],
+         lambda: rotations.rotate_symm_tensor_voigt_xyz_earth_to_xyz_src_array(
+             mt, phi, theta)),
+        ("rotate_symm_tensor_voigt_xyz_to_src",
+         lambda: [rotations.rotate_symm_tensor_voigt_xyz_to_src(
+             mt[_i], phi[_i]) for _i in range(n)],
+         lambda: rotations.rotate_symm_tensor_voigt_xyz_to_src_array(
+             mt, phi))]
+
+    print("Timing %i rotations:" % n)
+    for name, scalar, array in benchmarks:
+        t_scalar = _time_it(scalar)
+        t_array = _time_it(array)
+        print("  %-46s scalar: %8.4f s  array: %8.4f s  speedup: %6.1fx" % (
+            name, t_scalar, t_array, t_scalar / max(t_array, 1E-9)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="python -m instaseis.benchmark.rotations",
+        description="Benchmark the scalar vs. the array rotations.")
+    parser.add_argument("-n", type=int, default=100000,
+                        help="Number of rotations.")
+    args = parser.parse_args()
+    run_benchmark(args.n)
@@ -146,6 +146,24 @@ def repack_databases():
                 output_folder=merged_transposed_bw_db,
                 contiguous=True, compression_level=None, quiet=True)
 
+    # A merged database with the precomputed strain.
+    merged_strain_bw_db = os.path.join(
+        root_folder, "merged_strain_100s_db_bwd_displ_only")
+    os.makedirs(merged_strain_bw_db)
+    print("Creating a merged test database with precomputed strain ...")
+    merge_files(filenames=[px, pz], output_folder=merged_strain_bw_db,
+                contiguous=False, compression_level=2, quiet=True,
+                strain_dtype="float64")
+
+    # A merged database in the Fortran layout.
+    merged_fortran_bw_db = os.path.join(
+        root_folder, "merged_fortran_100s_db_bwd_displ_only")
+    os.makedirs(merged_fortran_bw_db)
+    print("Creating a merged test database in the Fortran layout ...")
+    merge_files(filenames=[px, pz], output_folder=merged_fortran_bw_db,
+                contiguous=True, compression_level=None, quiet=True,
+                layout="fortran")
+
     # Make a horizontal only merged database.
     horizontal_only_merged_db = os.path.join(
         root_folder, "horizontal_only_merged_db")
@@ -201,6 +219,9 @@ def repack_databases():
     with h5py.File(os.path.join(merged_transposed_bw_db,
                                 "merged_output.nc4"), "r") as f:
         merged_tr_shape = f["MergedSnapshots"].shape
+    with h5py.File(os.path.join(merged_strain_bw_db,
+                                "merged_output.nc4"), "r") as f:
+        merged_strain_shape = f["MergedStrain"].shape
     with h5py.File(os.path.join(horizontal_only_merged_db,
                                 "merged_output.nc4"), "r") as f:
         horizontal_only_merged_tr_shape = f["MergedSnapshots"].shape
@@ -217,6 +238,8 @@ def repack_databases():
     assert original_shape == tuple(reversed(repacked_transposed_shape))
     assert merged_shape == (192, 5, 5, 5, 73), str(merged_shape)
     assert merged_tr_shape == (192, 5, 5, 5, 73), str(merged_tr_shape)
+    assert merged_strain_shape == (192, 12, 5, 5, 73), \
+        str(merged_strain_shape)
     assert horizontal_only_merged_tr_shape == (192, 3, 5, 5, 73), \
         str(horizontal_only_merged_tr_shape)
     assert vertical_only_merged_tr_shape == (192, 2, 5, 5, 73), \
@@ -235,6 +258,8 @@ def repack_databases():
         repacked_transposed_bw_db
     dbs["merged_100s_db_bwd_displ_only"] = merged_bw_db
     dbs["merged_transposed_100s_db_bwd_displ_only"] = merged_transposed_bw_db
+    dbs["merged_strain_100s_db_bwd_displ_only"] = merged_strain_bw_db
+    dbs["merged_fortran_100s_db_bwd_displ_only"] = merged_fortran_bw_db
 
     # Special databases.
     dbs["horizontal_only_merged_database"] = horizontal_only_merged_db
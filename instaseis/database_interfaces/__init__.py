@@ -19,6 +19,8 @@ from .forward_instaseis_db import ForwardInstaseisDB
 from .forward_merged_instaseis_db import ForwardMergedInstaseisDB
 from .reciprocal_instaseis_db import ReciprocalInstaseisDB
 from .reciprocal_merged_instaseis_db import ReciprocalMergedInstaseisDB
+from .reciprocal_merged_strain_instaseis_db import \
+    ReciprocalMergedStrainInstaseisDB
 
 
 def find_and_open_files(path, *args, **kwargs):
@@ -60,6 +62,7 @@ def find_and_open_files(path, *args, **kwargs):
             f = h5py.File(found_files[0], mode="r")
             ds = f["/MergedSnapshots"]
             dims = ds.shape[1]
+            has_strain = "MergedStrain" in f
         finally:
             # File closing seems to act up in the tests for maybe locking
             # related reasons? If this proves an issue in production we'll
@@ -69,7 +72,10 @@ def find_and_open_files(path, *args, **kwargs):
             except Exception:  # pragma: no cover
                 pass
 
-        if dims in (2, 3, 5):
+        if dims in (2, 3, 5) and has_strain:
+            return ReciprocalMergedStrainInstaseisDB(
+                db_path=path, netcdf_file=found_files[0], *args, **kwargs)
+        elif dims in (2, 3, 5):
             return ReciprocalMergedInstaseisDB(
                 db_path=path, netcdf_file=found_files[0], *args, **kwargs)
         elif dims == 10:
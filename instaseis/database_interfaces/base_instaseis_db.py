@@ -16,8 +16,13 @@ from __future__ import (absolute_import, division, print_function,
 from future.utils import with_metaclass
 
 from abc import ABCMeta, abstractmethod
+import collections
+import contextlib
 from distutils.version import LooseVersion
+import itertools
 import math
+import multiprocessing
+import threading
 import warnings
 
 import numpy as np
@@ -33,6 +38,15 @@ from ..helpers import get_band_code, sizeof_fmt, rfftfreq
 
 DEFAULT_MU = 32e9
 
+# The number of sources reconvolved with a single FFT in the batch
+# extraction.
+RECONVOLVE_CHUNK_SIZE = 64
+
+FINITE_SOURCE_ENGINES = ("frequency", "time")
+
+# The database of a finite source worker process.
+_WORKER_DB = None
+
 
 KIND_MAP = {
     'displacement': 0,
@@ -252,70 +266,263 @@ class BaseInstaseisDB(with_metaclass(ABCMeta)):
         else:
             dt_out = dt
 
-        stf_deconv_map = {
-            0: self.info.sliprate,
-            1: self.info.slip}
+        if reconvolve_stf and remove_source_shift:
+            raise ValueError("'remove_source_shift' argument not "
+                             "compatible with 'reconvolve_stf'.")
 
-        # Can never be negative with the current logic.
-        n_derivative = KIND_MAP[kind] - STF_MAP[self.info.stf]
+        # Calculate the final time information about the seismograms.
+        time_information = _get_seismogram_times(
+            info=self.info, origin_time=source.origin_time, dt=dt,
+            kernelwidth=kernelwidth, remove_source_shift=remove_source_shift,
+            reconvolve_stf=reconvolve_stf)
 
-        if isinstance(source, ForceSource):
-            n_derivative += 1
+        data = self._process_seismogram_data(
+            data=data, source=source, components=components, kind=kind,
+            remove_source_shift=remove_source_shift,
+            reconvolve_stf=reconvolve_stf, dt=dt, kernelwidth=kernelwidth,
+            time_information=time_information)
+
+        if return_obspy_stream:
+            return self._convert_to_stream(
+                receiver=receiver, components=components, data=data,
+                dt_out=dt_out, starttime=time_information["starttime"])
+        else:
+            return data
+
+    def get_seismograms_batch(self, source, receivers, components=None,
+                              kind='displacement', remove_source_shift=True,
+                              reconvolve_stf=False, dt=None, kernelwidth=12):
+        """
+        Extract seismograms for a single source and many receivers at once.
+
+        Much faster than calling :meth:`get_seismograms` in a loop for large
+        station networks: the sanity checks are only performed once,
+        receivers located in the same element share a single read and
+        strain computation, and no ObsPy objects are created.
+
+        :param source: The source definition.
+        :type source: :class:`instaseis.source.Source` or
+            :class:`instaseis.source.ForceSource`
+        :param receivers: The seismic receivers.
+        :type receivers: list of :class:`instaseis.source.Receiver`
+        :type components: tuple of str, optional
+        :param components: Which components to calculate. Same defaults as
+            for :meth:`get_seismograms`.
+        :type kind: str, optional
+        :param kind: The desired units of the seismogram:
+            ``"displacement"``, ``"velocity"``, or ``"acceleration"``.
+        :type remove_source_shift: bool, optional
+        :param remove_source_shift: Cut all samples before the peak of the
+            source time function.
+        :type reconvolve_stf: bool, optional
+        :param reconvolve_stf: Deconvolve the source time function used in
+            the AxiSEM run and convolve with the STF attached to the source.
+        :type dt: float, optional
+        :param dt: Desired sampling rate of the seismograms.
+        :type kernelwidth: int, optional
+        :param kernelwidth: The width of the sinc kernel used for resampling.
+
+        :returns: The seismograms with the shape
+            ``(len(receivers), len(components), npts)``. The components are
+            in the order they have been requested in.
+        :rtype: :class:`numpy.ndarray`
+        """
+        receivers = list(receivers)
+        return self._get_seismograms_batch_and_process(
+            sources=[source] * len(receivers), receivers=receivers,
+            components=components, kind=kind,
+            remove_source_shift=remove_source_shift,
+            reconvolve_stf=reconvolve_stf, dt=dt, kernelwidth=kernelwidth)
+
+    def get_seismograms_batch_sources(self, sources, receiver,
+                                      components=None, kind='displacement',
+                                      remove_source_shift=True,
+                                      reconvolve_stf=False, dt=None,
+                                      kernelwidth=12):
+        """
+        Extract seismograms for many sources and a single receiver at once.
+
+        The multi-source counterpart of :meth:`get_seismograms_batch`. All
+        parameters have the same meaning.
+
+        :returns: The seismograms with the shape
+            ``(len(sources), len(components), npts)``.
+        :rtype: :class:`numpy.ndarray`
+        """
+        sources = list(sources)
+        return self._get_seismograms_batch_and_process(
+            sources=sources, receivers=[receiver] * len(sources),
+            components=components, kind=kind,
+            remove_source_shift=remove_source_shift,
+            reconvolve_stf=reconvolve_stf, dt=dt, kernelwidth=kernelwidth)
+
+    def _get_seismograms_batch_and_process(self, sources, receivers,
+                                           components, kind,
+                                           remove_source_shift,
+                                           reconvolve_stf, dt, kernelwidth):
+        """
+        Shared implementation of the batch extraction methods. ``sources``
+        and ``receivers`` must have the same length - each pair results in
+        one set of seismograms.
+        """
+        if components is None:
+            components = self.default_components
+        components = list(components)
+
+        sources, receivers = self._get_seismograms_batch_sanity_checks(
+            sources=sources, receivers=receivers, components=components,
+            kind=kind, dt=dt)
 
         if reconvolve_stf and remove_source_shift:
             raise ValueError("'remove_source_shift' argument not "
                              "compatible with 'reconvolve_stf'.")
 
-        # Calculate the final time information about the seismograms.
+        # The times only depend on the database and the settings, the
+        # origin time of the source only shifts the start time which is
+        # irrelevant for the returned arrays.
         time_information = _get_seismogram_times(
-            info=self.info, origin_time=source.origin_time, dt=dt,
+            info=self.info, origin_time=UTCDateTime(0), dt=dt,
             kernelwidth=kernelwidth, remove_source_shift=remove_source_shift,
             reconvolve_stf=reconvolve_stf)
 
-        for comp in components:
-            if reconvolve_stf:
-                # We assume here that the sliprate is well-behaved,
-                # e.g. zeros at the boundaries and no energy above the mesh
-                # resolution.
-                if source.dt is None or source.sliprate is None:
-                    raise ValueError("source has no source time function")
-
-                if STF_MAP[self.info.stf] not in [0, 1]:
-                    raise NotImplementedError(
-                        'deconvolution not implemented for stf %s'
-                        % (self.info.stf))
-
-                stf_deconv_f = np.fft.rfft(
-                    stf_deconv_map[STF_MAP[self.info.stf]],
-                    n=self.info.nfft)
-
-                if abs((source.dt - self.info.dt) / self.info.dt) > 1e-7:
-                    raise ValueError("dt of the source not compatible")
-
-                stf_conv_f = np.fft.rfft(source.sliprate,
-                                         n=self.info.nfft)
-
-                if source.time_shift is not None:
-                    stf_conv_f *= \
-                        np.exp(- 1j * rfftfreq(self.info.nfft) *
-                               2. * np.pi * source.time_shift / self.info.dt)
-
-                # Apply a 5 percent, at least 5 samples taper at the end.
-                # The first sample is guaranteed to be zero in any case.
-                tlen = max(int(math.ceil(0.05 * len(data[comp]))), 5)
-                taper = np.ones_like(data[comp])
-                taper[-tlen:] = scipy.signal.hann(tlen * 2)[tlen:]
-                dataf = np.fft.rfft(taper * data[comp], n=self.info.nfft)
-
-                # Ensure numerical stability by not dividing with zero.
-                f = stf_conv_f
-                _l = np.abs(stf_deconv_f)
-                _idx = np.where(_l > 0.0)
-                f[_idx] /= stf_deconv_f[_idx]
-                f[_l == 0] = 0 + 0j
-
-                data[comp] = np.fft.irfft(dataf * f)[:self.info.npts]
+        all_data = self._get_seismograms_batch(
+            sources=sources, receivers=receivers, components=components)
+
+        if reconvolve_stf:
+            # Reconvolve a number of sources at once.
+            for _i in range(0, len(sources), RECONVOLVE_CHUNK_SIZE):
+                chunk = slice(_i, _i + RECONVOLVE_CHUNK_SIZE)
+                reconvolved = self._reconvolve_stf(
+                    np.array([[d[comp] for comp in components]
+                              for d in all_data[chunk]]),
+                    np.array([self._get_stf_filter(src)
+                              for src in sources[chunk]])[:, np.newaxis, :])
+                for d, r in zip(all_data[chunk], reconvolved):
+                    for _j, comp in enumerate(components):
+                        d[comp] = r[_j]
+
+        output = None
+        for _i, (source, data) in enumerate(zip(sources, all_data)):
+            data = self._process_seismogram_data(
+                data=data, source=source, components=components, kind=kind,
+                remove_source_shift=remove_source_shift,
+                # Already done above.
+                reconvolve_stf=False, dt=dt,
+                kernelwidth=kernelwidth, time_information=time_information)
+            if output is None:
+                output = np.empty(
+                    (len(sources), len(components),
+                     len(data[components[0]])), dtype=np.float64)
+            for _j, comp in enumerate(components):
+                output[_i, _j] = data[comp]
+
+        if output is None:
+            output = np.empty((0, len(components), time_information["npts"]),
+                              dtype=np.float64)
+
+        return output
+
+    def _get_seismograms_batch(self, sources, receivers, components):
+        """
+        Get the raw data for many source-receiver pairs.
+
+        The default implementation just loops over all pairs. Implementations
+        that can do better should override this method.
+
+        :param sources: The sources.
+        :param receivers: The receivers, same length as the sources.
+        :param components: The requested components.
+
+        :returns: A list of data dictionaries, one per pair, in the same
+            format as returned by :meth:`_get_seismograms`.
+        """
+        return [self._get_seismograms(source=src, receiver=rec,
+                                      components=components)
+                for src, rec in zip(sources, receivers)]
+
+    def _iter_seismograms_batch(self, sources, receivers, components):
+        """
+        Get the raw data for many source-receiver pairs in groups that can
+        be processed together, e.g. all pairs in the same element.
+
+        The default implementation yields one pair at a time.
+
+        :param sources: The sources.
+        :param receivers: The receivers, same length as the sources.
+        :param components: The requested components.
+
+        :returns: A generator of ``(indices, data)`` tuples with the indices
+            of the pairs in a group and a list of their data dictionaries.
+            Every pair is part of exactly one group.
+        """
+        with self._prefetching(sources, receivers, components) as advance:
+            for _i, (src, rec) in enumerate(zip(sources, receivers)):
+                advance(_i)
+                yield [_i], [self._get_seismograms(
+                    source=src, receiver=rec, components=components)]
+
+    def get_element_order(self, sources, receivers):
+        """
+        An order of source-receiver pairs in which neighbouring pairs
+        require the same or nearby elements of the database.
+
+        Processing many pairs in this order maximizes buffer hits and reads
+        nearby parts of the files. The default implementation keeps the
+        original order.
+
+        :param sources: The sources.
+        :param receivers: The receivers, same length as the sources.
+        :returns: The indices of the pairs in the order they should be
+            processed.
+        :rtype: :class:`numpy.ndarray`
+        """
+        return np.arange(len(sources))
 
+    @contextlib.contextmanager
+    def _prefetching(self, sources, receivers, components):
+        """
+        Context manager to read the data needed for a number of
+        source-receiver pairs ahead of time while they are processed one
+        after another.
+
+        Yields a function that has to be called with the index of each pair
+        before it is processed. The default implementation does not read
+        ahead.
+
+        :param sources: The sources.
+        :param receivers: The receivers, same length as the sources.
+        :param components: The requested components.
+        """
+        yield lambda index: None
+
+    def _process_seismogram_data(self, data, source, components, kind,
+                                 remove_source_shift, reconvolve_stf, dt,
+                                 kernelwidth, time_information):
+        """
+        Convert raw data returned by :meth:`_get_seismograms` to the final
+        seismograms, e.g. reconvolve, resample, differentiate/integrate,
+        and cut them.
+        """
+        if dt is None:
+            dt_out = self.info.dt
+        else:
+            dt_out = dt
+
+        # Can never be negative with the current logic.
+        n_derivative = KIND_MAP[kind] - STF_MAP[self.info.stf]
+
+        if isinstance(source, ForceSource):
+            n_derivative += 1
+
+        if reconvolve_stf and components:
+            # All components in one go.
+            reconvolved = self._reconvolve_stf(
+                np.array([data[comp] for comp in components]),
+                self._get_stf_filter(source))
+            for _i, comp in enumerate(components):
+                data[comp] = reconvolved[_i]
+
+        for comp in components:
             if dt is not None:
                 data[comp] = lanczos_interpolation(
                     data=np.require(data[comp], requirements=["C"]),
@@ -339,12 +546,98 @@ class BaseInstaseisDB(with_metaclass(ABCMeta)):
             if remove_source_shift:
                 data[comp] = data[comp][time_information["ref_sample"]:]
 
-        if return_obspy_stream:
-            return self._convert_to_stream(
-                receiver=receiver, components=components, data=data,
-                dt_out=dt_out, starttime=time_information["starttime"])
-        else:
-            return data
+        return data
+
+    def _get_stf_cache(self):
+        """
+        The spectrum of the source time function of the database, the
+        frequency axis, and the tapers used to reconvolve seismograms. Only
+        computed once per database.
+        """
+        try:
+            return self.__stf_cache
+        except AttributeError:
+            pass
+
+        if STF_MAP[self.info.stf] not in [0, 1]:
+            raise NotImplementedError(
+                'deconvolution not implemented for stf %s'
+                % (self.info.stf))
+
+        stf_deconv_map = {
+            0: self.info.sliprate,
+            1: self.info.slip}
+        spectrum = np.fft.rfft(stf_deconv_map[STF_MAP[self.info.stf]],
+                               n=self.info.nfft)
+        self.__stf_cache = {
+            "spectrum": spectrum,
+            # Ensure numerical stability by not dividing with zero.
+            "nonzero": np.abs(spectrum) > 0.0,
+            "frequencies": rfftfreq(self.info.nfft),
+            "tapers": {}}
+        return self.__stf_cache
+
+    def _get_stf_filter(self, source):
+        """
+        The spectrum that deconvolves the source time function of the
+        database and convolves the one of the source.
+        """
+        # We assume here that the sliprate is well-behaved, e.g. zeros at
+        # the boundaries and no energy above the mesh resolution.
+        if source.dt is None or source.sliprate is None:
+            raise ValueError("source has no source time function")
+
+        cache = self._get_stf_cache()
+
+        if abs((source.dt - self.info.dt) / self.info.dt) > 1e-7:
+            raise ValueError("dt of the source not compatible")
+
+        f = np.fft.rfft(source.sliprate, n=self.info.nfft)
+
+        if source.time_shift is not None:
+            f *= np.exp(- 1j * cache["frequencies"] * 2. * np.pi *
+                        source.time_shift / self.info.dt)
+
+        nonzero = cache["nonzero"]
+        f[nonzero] /= cache["spectrum"][nonzero]
+        f[~nonzero] = 0 + 0j
+        return f
+
+    def _reconvolve_stf(self, data, stf_filter):
+        """
+        Replace the source time function of the database in many traces
+        with a single FFT.
+
+        :param data: The traces along the last axis, e.g. the components of
+            a source with the shape ``(ncomp, npts)`` or the components of
+            many sources with the shape ``(nsources, ncomp, npts)``.
+        :param stf_filter: The filters as returned by
+            :meth:`_get_stf_filter`, broadcastable to the spectra of the
+            traces, e.g. ``(nsources, 1, nfreq)``.
+        :returns: The reconvolved traces, cut to the length of the
+            database.
+        """
+        return np.fft.irfft(self._get_tapered_spectra(data) * stf_filter,
+                            axis=-1)[..., :self.info.npts]
+
+    def _get_tapered_spectra(self, data):
+        """
+        Taper the end of traces and compute their spectra for the
+        reconvolution.
+
+        :param data: The traces along the last axis.
+        """
+        npts = data.shape[-1]
+        tapers = self._get_stf_cache()["tapers"]
+        if npts not in tapers:
+            # Apply a 5 percent, at least 5 samples taper at the end.
+            # The first sample is guaranteed to be zero in any case.
+            tlen = max(int(math.ceil(0.05 * npts)), 5)
+            taper = np.ones(npts, dtype=np.float64)
+            taper[-tlen:] = scipy.signal.hann(tlen * 2)[tlen:]
+            tapers[npts] = taper
+
+        return np.fft.rfft(tapers[npts] * data, n=self.info.nfft, axis=-1)
 
     @staticmethod
     def _convert_to_stream(receiver, components, data, dt_out, starttime,
@@ -392,7 +685,8 @@ class BaseInstaseisDB(with_metaclass(ABCMeta)):
                                       components=None,
                                       kind='displacement', dt=None,
                                       kernelwidth=12, correct_mu=False,
-                                      progress_callback=None):
+                                      progress_callback=None,
+                                      engine="frequency", processes=None):
         """
         Extract seismograms for a finite source from an Instaseis database.
 
@@ -426,49 +720,63 @@ class BaseInstaseisDB(with_metaclass(ABCMeta)):
             sources for each calculated source. Useful for integration into
             user interfaces to provide some kind of progress information. If
             the callback returns ``True``, the calculation will be cancelled.
+        :type engine: str, optional
+        :param engine: ``"frequency"`` accumulates the spectra of all point
+            sources and transforms the sum back to the time domain once.
+            ``"time"`` reconvolves every point source on its own and sums
+            the seismograms - slower but useful as a reference. Sources
+            other than moment tensor sources always use ``"time"``.
+        :type processes: int, optional
+        :param processes: Split the point sources across this many worker
+            processes. Each worker opens the database on its own, with its
+            own file handles and buffers, and sums its share of the point
+            sources, the partial sums are added at the end. The progress
+            callback is then called whenever a share is done. The workers
+            are started with the ``forkserver`` or ``spawn`` method of
+            :mod:`multiprocessing` so threads of this process cannot leave
+            them with held locks. On Python 2, which can only fork, the
+            point sources are summed in this process if it has other
+            threads.
 
         :returns: Multi component finite source seismogram.
         :rtype: :class:`obspy.core.stream.Stream`
         """
+        if engine not in FINITE_SOURCE_ENGINES:
+            raise ValueError("engine must be one of %s." % ", ".join(
+                "'%s'" % _i for _i in FINITE_SOURCE_ENGINES))
+
         if components is None:
             components = self.default_components
 
         if not self.info.is_reciprocal:
             raise NotImplementedError
 
-        data_summed = {}
-        count = len(sources)
-        for _i, source in enumerate(sources):
-            # Don't perform the diff/integration here, but after the
-            # resampling later on.
-            data = self.get_seismograms(
-                source, receiver, components, reconvolve_stf=True,
-                # Effectively results in nothing happening.
-                kind=INV_KIND_MAP[STF_MAP[self.info.stf]],
-                return_obspy_stream=False, remove_source_shift=False)
-
-            if correct_mu:
-                corr_fac = data["mu"] / DEFAULT_MU,
-            else:
-                corr_fac = 1
-
-            for comp in components:
-                if comp in data_summed:
-                    data_summed[comp] += data[comp] * corr_fac
-                else:
-                    data_summed[comp] = data[comp] * corr_fac
-            # Only used for the GUI.
-            if progress_callback:  # pragma: no cover
-                cancel = progress_callback(_i + 1, count)
-                if cancel:
-                    return None
+        sources = list(sources)
+        if not all(isinstance(_i, Source) for _i in sources):
+            engine = "time"
+        if processes is not None and processes > 1 and len(sources) > 1:
+            data_summed = self._sum_finite_source_parallel(
+                sources=sources, receiver=receiver, components=components,
+                correct_mu=correct_mu, progress_callback=progress_callback,
+                engine=engine, processes=processes)
+        else:
+            data_summed = _sum_finite_source(
+                db=self, sources=sources, receiver=receiver,
+                components=components, correct_mu=correct_mu,
+                progress_callback=progress_callback, engine=engine)
+        # Cancelled.
+        if data_summed is None:
+            return None
+        if engine == "frequency":
+            data_summed = dict(zip(components, np.fft.irfft(
+                data_summed, axis=-1)[:, :self.info.npts]))
 
         if dt is not None:
             for comp in components:
                 # We don't need to align a sample to the peak of the source
                 # time function here.
-                new_npts = int(round(
-                    (len(data[comp]) - 1) * self.info.dt / dt, 6) + 1)
+                new_npts = int(round((len(data_summed[comp]) - 1) *
+                                     self.info.dt / dt, 6) + 1)
                 data_summed[comp] = lanczos_interpolation(
                     data=np.require(data_summed[comp], requirements=["C"]),
                     old_start=0, old_dt=self.info.dt, new_start=0, new_dt=dt,
@@ -513,6 +821,190 @@ class BaseInstaseisDB(with_metaclass(ABCMeta)):
             st += tr
         return st
 
+    def _sum_finite_source_traces(self, sources, receiver, components,
+                                  correct_mu, progress_callback):
+        """
+        Sum the seismograms of the point sources of a finite source in the
+        time domain.
+
+        :returns: A dictionary with the summed trace of each component or
+            ``None`` if cancelled by the progress callback.
+        """
+        data_summed = {}
+        count = len(sources)
+        with self._prefetching(sources, [receiver] * count,
+                               components) as advance:
+            for _i, source in enumerate(sources):
+                advance(_i)
+                # Don't perform the diff/integration here, but after the
+                # resampling later on.
+                data = self.get_seismograms(
+                    source, receiver, components, reconvolve_stf=True,
+                    # Effectively results in nothing happening.
+                    kind=INV_KIND_MAP[STF_MAP[self.info.stf]],
+                    return_obspy_stream=False, remove_source_shift=False)
+
+                if correct_mu:
+                    corr_fac = data["mu"] / DEFAULT_MU,
+                else:
+                    corr_fac = 1
+
+                for comp in components:
+                    if comp in data_summed:
+                        data_summed[comp] += data[comp] * corr_fac
+                    else:
+                        data_summed[comp] = data[comp] * corr_fac
+                # Only used for the GUI.
+                if progress_callback:  # pragma: no cover
+                    cancel = progress_callback(_i + 1, count)
+                    if cancel:
+                        return None
+
+        return data_summed
+
+    def _sum_finite_source_spectra(self, sources, receiver, components,
+                                   correct_mu, progress_callback):
+        """
+        Sum the point sources of a finite source in the frequency domain.
+
+        Reconvolution and summation are linear so the reconvolved spectra
+        of all point sources are accumulated and only the sum has to be
+        transformed back to the time domain. Same result as
+        :meth:`_sum_finite_source_traces`.
+
+        The point sources are evaluated in groups as returned by
+        :meth:`_iter_seismograms_batch` - all point sources in the same
+        element share the strain of that element and the interpolation and
+        the moment tensor contraction are done for all of them at once.
+
+        :returns: The summed spectra with the shape ``(ncomp, nfreq)`` or
+            ``None`` if cancelled by the progress callback.
+        """
+        spectrum = np.zeros((len(components), self.info.nfft // 2 + 1),
+                            dtype=np.complex128)
+        count = len(sources)
+        sources, receivers = self._get_seismograms_batch_sanity_checks(
+            sources=sources, receivers=[receiver] * count,
+            components=components,
+            kind=INV_KIND_MAP[STF_MAP[self.info.stf]], dt=None)
+
+        done = 0
+        groups = self._iter_seismograms_batch(
+            sources=sources, receivers=receivers, components=components)
+        try:
+            for indices, data in groups:
+                f = np.array([self._get_stf_filter(sources[_i])
+                              for _i in indices])
+                if correct_mu:
+                    f *= np.array([d["mu"] for d in data])[:, np.newaxis] / \
+                        DEFAULT_MU
+                spectrum += np.einsum(
+                    "icf,if->cf", self._get_tapered_spectra(np.array(
+                        [[d[comp] for comp in components] for d in data])), f)
+                done += len(indices)
+                # Only used for the GUI.
+                if progress_callback:  # pragma: no cover
+                    cancel = progress_callback(done, count)
+                    if cancel:
+                        return None
+        finally:
+            # Stops reading ahead if cancelled.
+            groups.close()
+
+        return spectrum
+
+    def _sum_finite_source_parallel(self, sources, receiver, components,
+                                    correct_mu, progress_callback, engine,
+                                    processes):
+        """
+        Sum the point sources of a finite source in a pool of worker
+        processes, each with its own instance of the database.
+
+        Neighbouring point sources often require the same elements so each
+        worker gets a few contiguous shares of the sources.
+
+        :returns: The sum as returned by the serial engine or ``None`` if
+            cancelled by the progress callback.
+        """
+        context = _get_finite_source_context()
+        open_args = self._get_worker_open_arguments()
+        if context is None or open_args is None:
+            return _sum_finite_source(
+                db=self, sources=sources, receiver=receiver,
+                components=components, correct_mu=correct_mu,
+                progress_callback=progress_callback, engine=engine)
+
+        count = len(sources)
+        n_shares = min(count, processes * 4)
+        bounds = np.linspace(0, count, n_shares + 1).astype(np.int64)
+        shares = [(sources[_a:_b], receiver, components, correct_mu, engine)
+                  for _a, _b in zip(bounds[:-1], bounds[1:]) if _b > _a]
+
+        pool_size = min(processes, len(shares))
+        pool = context.Pool(processes=pool_size,
+                            initializer=_init_finite_source_worker,
+                            initargs=open_args)
+
+        data_summed = None
+        done = 0
+        shares = iter(shares)
+        pending = collections.deque()
+        try:
+            while True:
+                # Only keep a few shares per worker submitted so a
+                # cancellation only has to wait for those.
+                for share in itertools.islice(
+                        shares, 2 * pool_size - len(pending)):
+                    pending.append(pool.apply_async(
+                        _sum_finite_source_share, (share,)))
+                if not pending:
+                    break
+                n, partial = pending.popleft().get()
+                if data_summed is None:
+                    data_summed = partial
+                elif engine == "frequency":
+                    data_summed += partial
+                else:
+                    for comp in components:
+                        data_summed[comp] += partial[comp]
+                done += n
+                # Only used for the GUI.
+                if progress_callback:  # pragma: no cover
+                    cancel = progress_callback(done, count)
+                    if cancel:
+                        return None
+        finally:
+            # Nothing is submitted anymore - let the workers finish the
+            # submitted shares and exit. Terminating the pool instead can
+            # deadlock while its task handler thread still feeds the workers
+            # if the process has other threads.
+            pool.close()
+            pool.join()
+
+        return data_summed
+
+    def _get_worker_open_arguments(self):
+        """
+        ``(path, kwargs)`` to open this database in a worker process with
+        :func:`~instaseis.database_interfaces.find_and_open_files` or
+        ``None`` if that is not possible.
+        """
+        return None
+
+    def load_shared_data(self):
+        """
+        Load all read-only data needed for the seismogram extraction into
+        memory before forking. Nothing to do by default.
+        """
+        pass
+
+    def reopen_files(self):
+        """
+        Reopen all files of the database in a forked process. Nothing to do
+        by default.
+        """
+        pass
+
     def _get_greens_seiscomp_sanity_checks(self, epicentral_distance_degree,
                                            source_depth_in_m, kind, dt):
         """
@@ -681,6 +1173,62 @@ class BaseInstaseisDB(with_metaclass(ABCMeta)):
 
         return source, receiver
 
+    def _get_seismograms_batch_sanity_checks(self, sources, receivers,
+                                             components, kind, dt):
+        """
+        Sanity checks for the batch extraction methods.
+
+        Every distinct source and receiver object is only parsed and checked
+        once, the epicentral distances of all pairs are checked in one go.
+
+        :param sources: The sources.
+        :param receivers: The receivers, same length as the sources.
+        :param components: a tuple containing any combination of the
+            strings ``"Z"``, ``"N"``, ``"E"``, ``"R"``, and ``"T"``
+        :param kind: 'displacement', 'velocity' or 'acceleration'
+        """
+        if len(sources) != len(receivers):  # pragma: no cover
+            raise ValueError("Need the same number of sources and receivers.")
+        if not sources:
+            return [], []
+
+        # Check each distinct object once together with an arbitrary
+        # partner. This also takes care of the parameter checks.
+        checked_sources = {}
+        checked_receivers = {}
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter("always")
+            for src, rec in zip(sources, receivers):
+                if id(src) in checked_sources and \
+                        id(rec) in checked_receivers:
+                    continue
+                s, r = self._get_seismograms_sanity_checks(
+                    source=checked_sources.get(id(src), src),
+                    receiver=checked_receivers.get(id(rec), rec),
+                    components=components, kind=kind, dt=dt)
+                checked_sources[id(src)] = s
+                checked_receivers[id(rec)] = r
+
+        # Only raise each distinct warning once.
+        for msg in sorted(set(str(_i.message) for _i in w)):
+            warnings.warn(msg)
+
+        new_sources = [checked_sources[id(_i)] for _i in sources]
+        new_receivers = [checked_receivers[id(_i)] for _i in receivers]
+
+        d = locations2degrees(
+            np.array([_i.latitude for _i in new_sources]),
+            np.array([_i.longitude for _i in new_sources]),
+            np.array([_i.latitude for _i in new_receivers]),
+            np.array([_i.longitude for _i in new_receivers]))
+        invalid = (d < self.info.min_d) | (d > self.info.max_d)
+        if np.any(invalid):
+            raise ValueError(
+                'Epicentral distance is %.1f but should be in [%.1f, '
+                '%.1f].' % (d[invalid][0], self.info.min_d, self.info.max_d))
+
+        return new_sources, new_receivers
+
     @property
     def info(self):
         try:
@@ -789,6 +1337,62 @@ class BaseInstaseisDB(with_metaclass(ABCMeta)):
         return components
 
 
+def _sum_finite_source(db, sources, receiver, components, correct_mu,
+                       progress_callback, engine):
+    """
+    Sum point sources with the given engine.
+    """
+    if engine == "frequency":
+        return db._sum_finite_source_spectra(
+            sources=sources, receiver=receiver, components=components,
+            correct_mu=correct_mu, progress_callback=progress_callback)
+    return db._sum_finite_source_traces(
+        sources=sources, receiver=receiver, components=components,
+        correct_mu=correct_mu, progress_callback=progress_callback)
+
+
+def _get_finite_source_context():
+    """
+    The :mod:`multiprocessing` context to start the finite source workers
+    with or ``None`` if no workers can safely be started.
+
+    A forked child only inherits the thread that forked it. Any lock held
+    by another thread at that moment - e.g. of a buffer, a mesh, or the
+    HDF5 library - is never released in the child and the worker would
+    deadlock. The workers are thus started from a fresh interpreter.
+    """
+    try:
+        methods = multiprocessing.get_all_start_methods()
+    except AttributeError:  # pragma: no cover
+        # Python 2 can only fork.
+        return multiprocessing if threading.active_count() == 1 else None
+    return multiprocessing.get_context(
+        "forkserver" if "forkserver" in methods else "spawn")
+
+
+def _init_finite_source_worker(path, kwargs):
+    """
+    Initializer of the finite source worker processes.
+    """
+    global _WORKER_DB
+    from . import find_and_open_files
+    _WORKER_DB = find_and_open_files(path, **kwargs)
+
+
+def _sum_finite_source_share(args):
+    """
+    Sum a share of the point sources of a finite source in a worker
+    process.
+
+    :returns: ``(number of point sources, partial sum)``
+    """
+    sources, receiver, components, correct_mu, engine = args
+    return len(sources), _sum_finite_source(
+        db=_WORKER_DB, sources=sources, receiver=receiver,
+        components=components, correct_mu=correct_mu,
+        progress_callback=None, engine=engine)
+
+
 def _get_seismogram_times(info, origin_time, dt, kernelwidth,
                           remove_source_shift, reconvolve_stf=False):
     """
@@ -18,17 +18,26 @@ from future.utils import with_metaclass
 
 from abc import ABCMeta, abstractmethod
 import collections
+import contextlib
 
 import numpy as np
 from obspy.signal.util import next_pow_2
 import os
+import threading
+import timeit
 
 from .base_instaseis_db import BaseInstaseisDB
+from .element_index import ElementIndex, ElementInfoCache
+from .element_log import AccessRecorder, KINDS, write_element_log
+from .mesh import _get_nbytes
+from .prefetch import ElementPrefetcher
+from .strain_cache import DiskStrainCache
 from .. import finite_elem_mapping
 from .. import helpers
 from .. import rotations
 from .. import sem_derivatives
 from .. import spectral_basis
+from ..source import ForceSource, Receiver, Source
 
 
 ElementInfo = collections.namedtuple("ElementInfo", [
@@ -44,7 +53,12 @@ class BaseNetCDFInstaseisDB(with_metaclass(ABCMeta, BaseInstaseisDB)):
     database.
     """
     def __init__(self, db_path, buffer_size_in_mb=100,
-                 read_on_demand=False, *args, **kwargs):
+                 read_on_demand=False, use_element_index=True,
+                 element_index_cache_dir=None, element_info_cache_size=10000,
+                 element_info_cache_quantum_in_m=1E-3, cache_manager=None,
+                 strain_cache_dir=None, strain_cache_size_in_mb=1000,
+                 precision="float64", access_log=None, prefetch_depth=0,
+                 max_read_gap=8, *args, **kwargs):
         """
         :param db_path: Path to the Instaseis Database containing
             subdirectories PZ and/or PX each containing a
@@ -61,82 +75,464 @@ class BaseNetCDFInstaseisDB(with_metaclass(ABCMeta, BaseInstaseisDB)):
             initialization, faster in individual seismogram extraction,
             useful e.g. for finite sources, default).
         :type read_on_demand: bool, optional
+        :param use_element_index: Locate elements with a precomputed grid
+            index instead of walking the kd-tree. Only applies to
+            ``displ_only`` databases. The index is built on first use.
+        :type use_element_index: bool, optional
+        :param element_index_cache_dir: If given, the element index will be
+            stored in and loaded from this directory so it only has to be
+            built once.
+        :type element_index_cache_dir: str, optional
+        :param element_info_cache_size: The maximum number of located
+            elements to cache. Set to ``0`` to disable the cache.
+        :type element_info_cache_size: int, optional
+        :param element_info_cache_quantum_in_m: Points in the mesh closer
+            than about this distance share the cached element information.
+        :type element_info_cache_quantum_in_m: float, optional
+        :param cache_manager: Store strain and displacement in this shared
+            cache manager instead of in per-mesh buffers. All databases and
+            meshes using the same manager share a single memory budget and
+            ``buffer_size_in_mb`` is ignored.
+        :type cache_manager:
+            :class:`~instaseis.database_interfaces.mesh.CacheManager`,
+            optional
+        :param strain_cache_dir: If given, the strain computed for
+            ``displ_only`` databases is also stored in memory mapped files
+            in this directory so it does not have to be computed again after
+            it has been evicted from the buffers or in another process.
+        :type strain_cache_dir: str, optional
+        :param strain_cache_size_in_mb: The maximum size of the on-disc
+            strain cache per mesh.
+        :type strain_cache_size_in_mb: float, optional
+        :param precision: The precision of the buffered displacement and
+            strain, the strain computation, and the spatial interpolation.
+            The data in the files is single precision so ``"float32"``
+            fits twice as many elements into the buffers at the cost of a
+            slightly lower accuracy. Everything after the interpolation is
+            always double precision.
+        :type precision: str, optional
+        :param access_log: If given, every access of the strain and
+            displacement buffers is appended to this file, e.g. to size the
+            buffers with ``python -m instaseis.scripts.simulate_buffers``.
+            See :mod:`~instaseis.database_interfaces.element_log`.
+        :type access_log: str, optional
+        :param prefetch_depth: If larger than zero, batches and finite
+            sources read the data of this many upcoming elements on a
+            background thread while the current one is processed.
+            Only applies to ``displ_only`` databases.
+        :type prefetch_depth: int, optional
+        :param max_read_gap: The GLL points of an element in ``displ_only``
+            databases are read in contiguous ranges. Ranges separated by at
+            most this many unneeded points are merged into one read.
+        :type max_read_gap: int, optional
         """
+        if precision not in ("float32", "float64"):
+            raise ValueError("precision must be either 'float32' or "
+                             "'float64'.")
         self.db_path = db_path
         self.buffer_size_in_mb = buffer_size_in_mb
+        self.precision = precision
+        self.dtype = np.dtype(precision)
+        self.cache_manager = cache_manager
         self.read_on_demand = read_on_demand
+        self.use_element_index = use_element_index
+        self.element_index_cache_dir = element_index_cache_dir
+        self._element_index = None
+        self._element_index_lock = threading.Lock()
+        self.strain_cache_dir = strain_cache_dir
+        self.strain_cache_size_in_mb = strain_cache_size_in_mb
+        self._disk_strain_caches = {}
+        self._disk_strain_caches_lock = threading.Lock()
+        self.element_info_cache = ElementInfoCache(
+            max_items=element_info_cache_size,
+            quantum_in_m=element_info_cache_quantum_in_m)
+        self.access_recorder = AccessRecorder(access_log) \
+            if access_log else None
+        self.prefetch_depth = prefetch_depth
+        self.max_read_gap = max_read_gap
+        # The prefetcher of the batch or finite source currently processed
+        # by each thread.
+        self._prefetchers = threading.local()
+
+    @property
+    def element_index(self):
+        """
+        The :class:`~instaseis.database_interfaces.element_index.ElementIndex`
+        of the mesh. Built or loaded on first access.
+        """
+        with self._element_index_lock:
+            if self._element_index is None:
+                if self.element_index_cache_dir:
+                    self._element_index = ElementIndex.from_mesh_cached(
+                        self.parsed_mesh, self.element_index_cache_dir)
+                else:
+                    self._element_index = ElementIndex.from_mesh(
+                        self.parsed_mesh)
+        return self._element_index
+
+    def _get_disk_strain_cache(self, mesh, shapes):
+        """
+        The on-disc strain cache of a mesh or ``None`` if not used.
+        """
+        if not self.strain_cache_dir:
+            return None
+        with self._disk_strain_caches_lock:
+            if mesh.filename not in self._disk_strain_caches:
+                if "MergedSnapshots" in mesh.f:
+                    n_elements = mesh.f["MergedSnapshots"].shape[0]
+                else:
+                    n_elements = mesh.f["Mesh"]["fem_mesh"].shape[0]
+                self._disk_strain_caches[mesh.filename] = DiskStrainCache(
+                    cache_dir=self.strain_cache_dir,
+                    mesh_filename=mesh.filename, n_elements=n_elements,
+                    shapes=shapes, dtype=self.dtype,
+                    max_size_in_mb=self.strain_cache_size_in_mb)
+            return self._disk_strain_caches[mesh.filename]
+
+    def _get_worker_open_arguments(self):
+        """
+        ``(path, kwargs)`` to open this database in a worker process. The
+        worker gets its own buffers so neither the cache manager nor the
+        access log are passed on.
+        """
+        return self.db_path, {
+            "buffer_size_in_mb": self.buffer_size_in_mb,
+            "read_on_demand": self.read_on_demand,
+            "use_element_index": self.use_element_index,
+            "element_index_cache_dir": self.element_index_cache_dir,
+            "element_info_cache_size": self.element_info_cache.max_items,
+            "element_info_cache_quantum_in_m":
+                self.element_info_cache.quantum_in_m,
+            "strain_cache_dir": self.strain_cache_dir,
+            "strain_cache_size_in_mb": self.strain_cache_size_in_mb,
+            "precision": self.precision,
+            "prefetch_depth": self.prefetch_depth,
+            "max_read_gap": self.max_read_gap}
+
+    def load_shared_data(self):
+        """
+        Load all read-only data needed for the seismogram extraction into
+        memory.
+
+        Processes forked afterwards share this data through copy-on-write
+        memory pages, as none of it is ever modified. Each forked process
+        has to call :meth:`reopen_files` before using the database.
+        """
+        for m in self.meshes:
+            if m is not None:
+                m.load_into_memory()
+        if self.use_element_index and self.info.dump_type == "displ_only":
+            # Triggers building or loading the index.
+            self.element_index
+
+    def reopen_files(self):
+        """
+        Reopen all files of the database. Must be called in a process forked
+        after the database has been opened.
+        """
+        for m in self.meshes:
+            if m is not None:
+                m.reopen()
+
+    def get_hot_elements(self):
+        """
+        The elements currently in the strain and displacement buffers of all
+        meshes.
+
+        :returns: A list of ``(kind, id_elem)`` tuples, least recently used
+            first, with ``kind`` being either ``"strain"`` or
+            ``"displacement"``.
+        """
+        elements = []
+        seen = set()
+        for m in self.meshes:
+            if m is None:
+                continue
+            for kind, buf in (("strain", m.strain_buffer),
+                              ("displacement", m.displ_buffer)):
+                for id_elem in buf.keys():
+                    element = (kind, int(id_elem))
+                    if element not in seen:
+                        seen.add(element)
+                        elements.append(element)
+        return elements
+
+    def write_hot_elements(self, filename):
+        """
+        Write the elements currently in the buffers to an element log which
+        can be passed to :meth:`preload_elements` after a restart.
+        """
+        write_element_log(filename, self.get_hot_elements())
+
+    def preload_elements(self, elements, progress_callback=None):
+        """
+        Read elements into the buffers, e.g. to warm up a server before it
+        accepts requests.
+
+        :param elements: ``(kind, id_elem)`` tuples as returned by
+            :meth:`get_hot_elements` or read from an element log with
+            :func:`~.element_log.read_element_log`. They are loaded in
+            the given order so the last ones are the most recently used
+            ones if not all of them fit into the buffers.
+        :param progress_callback: Called with the number of processed and
+            the total number of elements after each element.
+        :returns: The number of loaded elements. Elements not in the mesh
+            are skipped.
+        """
+        elements = list(elements)
+        n_elements = self.parsed_mesh.mesh.shape[0]
+        count = 0
+        for _i, (kind, id_elem) in enumerate(elements):
+            if kind not in KINDS:
+                raise ValueError("Unknown element kind '%s'." % kind)
+            if 0 <= id_elem < n_elements:
+                self._preload_element(int(id_elem), kind)
+                count += 1
+            if progress_callback is not None:
+                progress_callback(_i + 1, len(elements))
+        return count
+
+    def get_elements_in_region(self, min_depth_in_m=0.0, max_depth_in_m=None,
+                               min_distance_in_degree=0.0,
+                               max_distance_in_degree=180.0):
+        """
+        Ids of the elements whose midpoints are in a depth and epicentral
+        distance range, the deepest first.
+
+        The mesh is axisymmetric so each element covers a ring around the
+        axis - every geographic region corresponds to a range of epicentral
+        distances. For reciprocal databases these are the source depth and
+        the source-receiver distance, for forward databases the receiver
+        depth and the distance.
+        """
+        points = np.asarray(self.parsed_mesh.mesh[:], dtype=np.float64)
+        depth = self.info.planet_radius - np.hypot(points[:, 0],
+                                                   points[:, 1])
+        distance = np.rad2deg(np.arctan2(points[:, 0], points[:, 1]))
+        mask = (depth >= min_depth_in_m) & \
+            (distance >= min_distance_in_degree) & \
+            (distance <= max_distance_in_degree)
+        if max_depth_in_m is not None:
+            mask &= depth <= max_depth_in_m
+        ids = np.nonzero(mask)[0]
+        return ids[np.argsort(-depth[ids], kind="mergesort")]
+
+    def preload_region(self, min_depth_in_m=0.0, max_depth_in_m=None,
+                       min_distance_in_degree=0.0,
+                       max_distance_in_degree=180.0, kinds=None,
+                       max_elements=None, progress_callback=None):
+        """
+        Read all elements in a depth and epicentral distance range into the
+        buffers. See :meth:`get_elements_in_region`.
+
+        :param kinds: The kinds of buffers to fill. Defaults to the strain
+            for reciprocal and the displacement for forward databases.
+        :param max_elements: Only load this many of the shallowest
+            elements, e.g. as many as fit into the buffers.
+        :param progress_callback: See :meth:`preload_elements`.
+        :returns: The number of loaded elements.
+        """
+        if kinds is None:
+            kinds = ["strain"] if self.info.is_reciprocal else \
+                ["displacement"]
+        ids = self.get_elements_in_region(
+            min_depth_in_m=min_depth_in_m, max_depth_in_m=max_depth_in_m,
+            min_distance_in_degree=min_distance_in_degree,
+            max_distance_in_degree=max_distance_in_degree)
+        if max_elements is not None:
+            ids = ids[len(ids) - min(max_elements, len(ids)):]
+        return self.preload_elements(
+            [(kind, id_elem) for id_elem in ids for kind in kinds],
+            progress_callback=progress_callback)
+
+    def _preload_element(self, id_elem, kind):
+        """
+        Read one element into the buffers by extracting the data of a
+        dummy source at its center.
+        """
+        if self.info.dump_type == "displ_only":
+            element_info = self._get_element_info_for_element(
+                id_elem, xi=0.0, eta=0.0)
+            s, z = element_info.corner_points.mean(axis=0)
+        else:
+            element_info = ElementInfo(
+                id_elem=id_elem, gll_point_ids=None, xi=None, eta=None,
+                corner_points=None, col_points_xi=None, col_points_eta=None,
+                axis=None, eltype=None)
+            s, z = self.parsed_mesh.mesh[id_elem]
+
+        # Reciprocal databases only buffer the displacement for force
+        # sources.
+        if kind == "displacement" and self.info.is_reciprocal and \
+                self.info.dump_type == "displ_only":
+            source = ForceSource(latitude=0.0, longitude=0.0, f_r=1.0)
+        else:
+            source = Source(latitude=0.0, longitude=0.0, m_rr=1.0)
+
+        self._get_data(
+            source=source, receiver=Receiver(latitude=0.0, longitude=0.0),
+            components=self.available_components,
+            coordinates=Coordinates(s=s, phi=0.0, z=z),
+            element_info=element_info)
+
+    def _record_access(self, mesh, kind, id_elem, value, start_time=None,
+                       io_start=None):
+        """
+        Append a buffer access to the access log if one is written.
+
+        :param start_time: The time the element was missed in the buffer.
+            ``None`` for hits.
+        :param io_start: :attr:`Mesh.io_time` at ``start_time``.
+        """
+        if self.access_recorder is None:
+            return
+        io_time = compute_time = 0.0
+        if start_time is not None:
+            io_time = mesh.io_time - io_start
+            compute_time = max(
+                timeit.default_timer() - start_time - io_time, 0.0)
+        self.access_recorder.record(
+            mesh=os.path.relpath(mesh.filename, self.db_path), kind=kind,
+            id_elem=id_elem, hit=start_time is None,
+            nbytes=_get_nbytes(value), io_time=io_time,
+            compute_time=compute_time)
 
     def _get_element_info(self, coordinates):
         """
         Find and collect/calculate information about the element containing
         the given coordinates.
         """
-        k_map = {"displ_only": 6,
-                 "strain_only": 1,
-                 "fullfields": 1}
+        ei = self.element_info_cache.get(coordinates.s, coordinates.z)
+        if ei is None:
+            ei = self._locate_element_info(coordinates)
+            self.element_info_cache.add(coordinates.s, coordinates.z, ei)
+        return ei
+
+    def _locate_element_info(self, coordinates):
+        """
+        Uncached version of :meth:`_get_element_info`.
+        """
+        if self.info.dump_type != "displ_only":
+            id_elem = self.parsed_mesh.kdtree.query(
+                [coordinates.s, coordinates.z], k=1)[1]
+            return ElementInfo(
+                id_elem=id_elem, gll_point_ids=None, xi=None, eta=None,
+                corner_points=None, col_points_xi=None, col_points_eta=None,
+                axis=None, eltype=None)
+
+        id_elem = -1
+        if self.use_element_index:
+            id_elem, xi, eta = self.element_index.locate_point(
+                coordinates.s, coordinates.z, tolerance=1E-3)
+
+        if id_elem < 0:
+            id_elem, xi, eta = self._find_element_kdtree(coordinates)
+
+        return self._get_element_info_for_element(id_elem, xi, eta)
 
+    def _get_element_info_batch(self, coordinates):
+        """
+        Batch version of :meth:`_get_element_info` for a list of
+        coordinates.
+        """
+        cache = self.element_info_cache
+        element_infos = [cache.get(_i.s, _i.z) for _i in coordinates]
+        missing = [_i for _i, ei in enumerate(element_infos) if ei is None]
+        if not missing:
+            return element_infos
+
+        if self.info.dump_type != "displ_only" or \
+                not self.use_element_index:
+            for _i in missing:
+                element_infos[_i] = self._locate_element_info(coordinates[_i])
+        else:
+            ids, xi, eta = self.element_index.locate(
+                [coordinates[_i].s for _i in missing],
+                [coordinates[_i].z for _i in missing], tolerance=1E-3)
+            for _j, _i in enumerate(missing):
+                if ids[_j] < 0:
+                    element_infos[_i] = self._locate_element_info(
+                        coordinates[_i])
+                else:
+                    element_infos[_i] = self._get_element_info_for_element(
+                        int(ids[_j]), xi[_j], eta[_j])
+
+        for _i in missing:
+            cache.add(coordinates[_i].s, coordinates[_i].z, element_infos[_i])
+
+        return element_infos
+
+    def _find_element_kdtree(self, coordinates):
+        """
+        Find the element containing the point by testing the elements with
+        the closest midpoints.
+
+        :returns: ``(id_elem, xi, eta)``
+        """
         nextpoints = self.parsed_mesh.kdtree.query(
-            [coordinates.s, coordinates.z], k=k_map[self.info.dump_type])
+            [coordinates.s, coordinates.z], k=6)
 
         # Find the element containing the point of interest.
-        mesh = self.parsed_mesh.f["Mesh"]
-        if self.info.dump_type == 'displ_only':
-            for idx in nextpoints[1]:
-                corner_points = np.empty((4, 2), dtype="float64")
-
-                if not self.read_on_demand:
-                    corner_point_ids = self.parsed_mesh.fem_mesh[idx][:4]
-                    eltype = self.parsed_mesh.eltypes[idx]
-                    corner_points[:, 0] = \
-                        self.parsed_mesh.mesh_S[corner_point_ids]
-                    corner_points[:, 1] = \
-                        self.parsed_mesh.mesh_Z[corner_point_ids]
-                else:
-                    corner_point_ids = mesh["fem_mesh"][idx][:4]
-
-                    # When reading from a netcdf file, the indices must be
-                    # sorted for newer netcdf versions. The double argsort()
-                    # gives the indices in the sorted array to restore the
-                    # original order.
-                    eltype = mesh["eltype"][idx]
-
-                    m_s = mesh["mesh_S"]
-                    m_z = mesh["mesh_Z"]
-                    corner_points[:, 0] = [m_s[_i] for _i in corner_point_ids]
-                    corner_points[:, 1] = [m_z[_i] for _i in corner_point_ids]
-
-                isin, xi, eta = finite_elem_mapping.inside_element(
-                    coordinates.s, coordinates.z, corner_points, eltype,
-                    tolerance=1E-3)
-                if isin:
-                    id_elem = idx
-                    break
-            else:  # pragma: no cover
-                raise ValueError("Element not found")
-
-            if not self.read_on_demand:
-                gll_point_ids = self.parsed_mesh.sem_mesh[id_elem]
-                axis = bool(self.parsed_mesh.axis[id_elem])
-            else:
-                gll_point_ids = mesh["sem_mesh"][id_elem]
-                axis = bool(mesh["axis"][id_elem])
+        for idx in nextpoints[1]:
+            corner_points, eltype = self._get_corner_points(idx)
+            isin, xi, eta = finite_elem_mapping.inside_element(
+                coordinates.s, coordinates.z, corner_points, eltype,
+                tolerance=1E-3)
+            if isin:
+                return idx, xi, eta
+        else:  # pragma: no cover
+            raise ValueError("Element not found")
+
+    def _get_corner_points(self, id_elem):
+        """
+        Returns the corner points and the element type of an element.
+        """
+        corner_points = np.empty((4, 2), dtype="float64")
+
+        if not self.read_on_demand:
+            corner_point_ids = self.parsed_mesh.fem_mesh[id_elem][:4]
+            eltype = self.parsed_mesh.eltypes[id_elem]
+            corner_points[:, 0] = \
+                self.parsed_mesh.mesh_S[corner_point_ids]
+            corner_points[:, 1] = \
+                self.parsed_mesh.mesh_Z[corner_point_ids]
+        else:
+            mesh = self.parsed_mesh.f["Mesh"]
+            corner_point_ids = mesh["fem_mesh"][id_elem][:4]
 
-            if axis:
-                col_points_xi = self.parsed_mesh.glj_points
-                col_points_eta = self.parsed_mesh.gll_points
-            else:
-                col_points_xi = self.parsed_mesh.gll_points
-                col_points_eta = self.parsed_mesh.gll_points
+            # When reading from a netcdf file, the indices must be
+            # sorted for newer netcdf versions. The double argsort()
+            # gives the indices in the sorted array to restore the
+            # original order.
+            eltype = mesh["eltype"][id_elem]
+
+            m_s = mesh["mesh_S"]
+            m_z = mesh["mesh_Z"]
+            corner_points[:, 0] = [m_s[_i] for _i in corner_point_ids]
+            corner_points[:, 1] = [m_z[_i] for _i in corner_point_ids]
+
+        return corner_points, eltype
+
+    def _get_element_info_for_element(self, id_elem, xi, eta):
+        """
+        Collect all information about an element once it has been found.
+        """
+        corner_points, eltype = self._get_corner_points(id_elem)
+
+        if not self.read_on_demand:
+            gll_point_ids = self.parsed_mesh.sem_mesh[id_elem]
+            axis = bool(self.parsed_mesh.axis[id_elem])
         else:
-            id_elem = nextpoints[1]
-            col_points_xi = None
-            col_points_eta = None
-            gll_point_ids = None
-            axis = None
-            corner_points = None
-            eltype = None
-            xi = None
-            eta = None
+            mesh = self.parsed_mesh.f["Mesh"]
+            gll_point_ids = mesh["sem_mesh"][id_elem]
+            axis = bool(mesh["axis"][id_elem])
+
+        if axis:
+            col_points_xi = self.parsed_mesh.glj_points
+            col_points_eta = self.parsed_mesh.gll_points
+        else:
+            col_points_xi = self.parsed_mesh.gll_points
+            col_points_eta = self.parsed_mesh.gll_points
 
         return ElementInfo(
             id_elem=id_elem, gll_point_ids=gll_point_ids, xi=xi, eta=eta,
@@ -174,6 +570,18 @@ class BaseNetCDFInstaseisDB(with_metaclass(ABCMeta, BaseInstaseisDB)):
         :param components: The requests components. Any combinations of
             ``"Z"``, ``"N"``, ``"E"``, ``"R"``, and ``"T"``
         """
+        coordinates = self._get_coordinates(source=source, receiver=receiver)
+
+        element_info = self._get_element_info(coordinates=coordinates)
+
+        return self._get_data(
+            source=source, receiver=receiver, components=components,
+            coordinates=coordinates, element_info=element_info)
+
+    def _get_coordinates(self, source, receiver):
+        """
+        Coordinates of the point of interest in the rotated mesh frame.
+        """
         if self.info.is_reciprocal:
             a, b = source, receiver
         else:
@@ -185,134 +593,403 @@ class BaseNetCDFInstaseisDB(with_metaclass(ABCMeta, BaseInstaseisDB)):
             a.z(planet_radius=self.info.planet_radius),
             b.longitude, b.colatitude)
 
-        coordinates = Coordinates(s=rotmesh_s, phi=rotmesh_phi, z=rotmesh_z)
-
-        element_info = self._get_element_info(coordinates=coordinates)
-
-        return self._get_data(
-            source=source, receiver=receiver, components=components,
-            coordinates=coordinates, element_info=element_info)
+        return Coordinates(s=rotmesh_s, phi=rotmesh_phi, z=rotmesh_z)
 
-    def _get_strain_interp(  # NOQA
-            self, mesh, id_elem, gll_point_ids, G, GT, col_points_xi,
-            col_points_eta, corner_points, eltype, axis, xi, eta):
-        if id_elem not in mesh.strain_buffer:
-            # Single precision in the NetCDF files but the later interpolation
-            # routines require double precision. Assignment to this array will
-            # force a cast.
-            utemp = np.zeros((mesh.ndumps, mesh.npol + 1, mesh.npol + 1, 3),
-                             dtype=np.float64, order="F")
-
-            # The list of ids we have is unique but not sorted.
-            ids = gll_point_ids.flatten()
-            s_ids = np.sort(ids)
-            mesh_dict = mesh.f["Snapshots"]
-
-            # Load displacement from all GLL points.
-            for i, var in enumerate(["disp_s", "disp_p", "disp_z"]):
-                if var not in mesh_dict:
-                    continue
+    def _get_coordinates_batch(self, sources, receivers):
+        """
+        Batch version of :meth:`_get_coordinates`.
+        """
+        if self.info.is_reciprocal:
+            a, b = sources, receivers
+        else:
+            a, b = receivers, sources
+
+        r = self.info.planet_radius
+        s, phi, z = rotations.rotate_frame_rd_array(
+            [_i.x(planet_radius=r) for _i in a],
+            [_i.y(planet_radius=r) for _i in a],
+            [_i.z(planet_radius=r) for _i in a],
+            [_i.longitude for _i in b],
+            [_i.colatitude for _i in b])
+        return [Coordinates(s=_s, phi=_phi, z=_z)
+                for _s, _phi, _z in zip(s, phi, z)]
+
+    def get_element_order(self, sources, receivers):
+        """
+        Order source-receiver pairs by the id of the element containing
+        their point of interest. Pairs in the same element are processed
+        one after another and the elements are read in the order they are
+        stored in the files - merged databases store them in the traversal
+        order of a kd-tree so elements with close ids are also close in
+        space.
+
+        :returns: The indices of the pairs in the order they should be
+            processed. Pairs in the same element keep their relative order.
+        :rtype: :class:`numpy.ndarray`
+        """
+        if not len(sources):
+            return np.arange(0)
+        element_infos = self._get_element_info_batch(
+            self._get_coordinates_batch(sources, receivers))
+        return np.argsort([int(_i.id_elem) for _i in element_infos],
+                          kind="mergesort")
+
+    def _get_seismograms_batch(self, sources, receivers, components):
+        """
+        Get the raw data for many source-receiver pairs.
 
-                # Make sure it can work with normal and transposed arrays to
-                # support legacy as well as modern, transposed databases.
-                time_axis = mesh.time_axis[var]
+        All pairs whose point of interest falls in the same element are
+        passed to :meth:`_get_data_batch` together so each element only has
+        to be read and processed once. The elements are processed in the
+        order of their ids, see :meth:`get_element_order`.
+        """
+        results = [None] * len(sources)
+        for indices, data in self._iter_seismograms_batch(
+                sources=sources, receivers=receivers, components=components):
+            for _i, d in zip(indices, data):
+                results[_i] = d
+        return results
+
+    def _iter_seismograms_batch(self, sources, receivers, components):
+        """
+        Get the raw data for many source-receiver pairs one element at a
+        time.
 
-                # Chunk the I/O by requesting successive indices in one go -
-                # this actually makes quite a big difference on some file
-                # systems.
-                chunks = helpers.io_chunker(s_ids)
-                _temp = []
-                m = mesh_dict[var]
-                if time_axis == 0:
-                    for _c in chunks:
-                        if isinstance(_c, list):
-                            _temp.append(m[:, _c[0]:_c[1]])
-                        else:
-                            _temp.append(m[:, _c])
-                else:
-                    for _c in chunks:
-                        if isinstance(_c, list):
-                            _temp.append(m[_c[0]:_c[1], :].T)
-                        else:
-                            _temp.append(m[_c, :].T)
+        All pairs in the same element are passed to :meth:`_get_data_batch`
+        together, the elements are processed in the order of their ids.
+        """
+        coordinates = self._get_coordinates_batch(sources, receivers)
+        element_infos = self._get_element_info_batch(coordinates)
+
+        groups = {}
+        for _i, ei in enumerate(element_infos):
+            groups.setdefault(int(ei.id_elem), []).append(_i)
+        groups = sorted(groups.items())
+
+        steps = [None] * len(sources)
+        for step, (_, indices) in enumerate(groups):
+            for _i in indices:
+                steps[_i] = step
+
+        with self._prefetching(sources, receivers, components, steps=steps,
+                               element_infos=element_infos) as advance:
+            for step, (_, indices) in enumerate(groups):
+                advance(step)
+                yield indices, self._get_data_batch(
+                    sources=[sources[_i] for _i in indices],
+                    receivers=[receivers[_i] for _i in indices],
+                    components=components,
+                    coordinates=[coordinates[_i] for _i in indices],
+                    element_infos=[element_infos[_i] for _i in indices])
+
+    @contextlib.contextmanager
+    def _prefetching(self, sources, receivers, components, steps=None,
+                     element_infos=None):
+        """
+        Read the elements of upcoming source-receiver pairs on a background
+        thread if ``prefetch_depth`` is set, see
+        :class:`~instaseis.database_interfaces.prefetch.ElementPrefetcher`.
+
+        :param steps: The step each pair is processed in, defaults to its
+            index.
+        :param element_infos: The element information of all pairs if
+            already known.
+        """
+        tasks = []
+        if self.prefetch_depth > 0 and self.info.dump_type == "displ_only":
+            if element_infos is None:
+                element_infos = self._get_element_info_batch(
+                    self._get_coordinates_batch(sources, receivers))
+            if steps is None:
+                steps = range(len(sources))
+            for step, src, ei in sorted(
+                    zip(steps, sources, element_infos),
+                    key=lambda x: x[0]):
+                for mesh, kind in self._get_element_reads(src, components):
+                    if mesh is None:
+                        continue
+                    tasks.append((step,
+                                  (mesh.filename, kind, int(ei.id_elem)),
+                                  (mesh, kind, ei.id_elem,
+                                   ei.gll_point_ids)))
+        if not tasks:
+            yield lambda step: None
+            return
+
+        prefetcher = ElementPrefetcher(self._prefetch_element, tasks,
+                                       depth=self.prefetch_depth)
+        self._prefetchers.current = prefetcher
+        try:
+            yield prefetcher.advance
+        finally:
+            self._prefetchers.current = None
+            prefetcher.close()
+
+    def _get_element_reads(self, source, components):
+        """
+        The meshes a source reads from and the kind of buffer the results
+        are stored in.
 
-                _t = np.empty((_temp[0].shape[0], 25),
-                              dtype=_temp[0].dtype)
+        The default implementation reads nothing ahead.
 
-                k = 0
-                for _i in _temp:
-                    if len(_i.shape) == 1:
-                        _t[:, k] = _i
-                        k += 1
-                    else:
-                        for _j in range(_i.shape[1]):
-                            _t[:, k + _j] = _i[:, _j]
+        :returns: A list of ``(mesh, kind)`` tuples.
+        """
+        return []
 
-                        k += _j + 1
+    def _prefetch_element(self, mesh, kind, id_elem, gll_point_ids):
+        """
+        Read an element on the prefetch thread unless it is already
+        buffered.
+        """
+        buffer = mesh.strain_buffer if kind == "strain" else \
+            mesh.displ_buffer
+        if id_elem in buffer:
+            return None
+        return self._read_element_data(mesh, kind, id_elem, gll_point_ids)
 
-                _temp = _t
+    def _load_element_data(self, mesh, kind, id_elem, gll_point_ids):
+        """
+        Get the data of an element from the prefetcher or read it.
+        """
+        prefetcher = getattr(self._prefetchers, "current", None)
+        if prefetcher is not None:
+            data = prefetcher.take((mesh.filename, kind, int(id_elem)))
+            if data is not None:
+                return data
+        return self._read_element_data(mesh, kind, id_elem, gll_point_ids)
+
+    def _get_data_batch(self, sources, receivers, components, coordinates,
+                        element_infos):
+        """
+        Get the data for a number of source-receiver pairs all located in
+        the same element.
 
-                for ipol in range(mesh.npol + 1):
-                    for jpol in range(mesh.npol + 1):
-                        idx = ipol * 5 + jpol
-                        utemp[:, jpol, ipol, i] = \
-                            _temp[:, np.argwhere(
-                                s_ids == ids[idx])[0][0]]
+        The default implementation loops over :meth:`_get_data`.
+        Implementations can override this for a more efficient version.
 
-            strain_fct_map = {
-                "monopole": sem_derivatives.strain_monopole_td,
-                "dipole": sem_derivatives.strain_dipole_td,
-                "quadpole": sem_derivatives.strain_quadpole_td}
+        :returns: A list of data dictionaries, one per pair.
+        """
+        return [self._get_data(source=src, receiver=rec,
+                               components=components, coordinates=coords,
+                               element_info=ei)
+                for src, rec, coords, ei in zip(
+                    sources, receivers, coordinates, element_infos)]
+
+    def _contract_moment_tensors(self, sources, receivers, components,
+                                 coordinates, mu, strain_x, strain_z):
+        """
+        Contract interpolated strains with the moment tensors of many
+        sources at once.
 
-            strain = strain_fct_map[mesh.excitation_type](
-                utemp, G, GT, col_points_xi, col_points_eta, mesh.npol,
-                mesh.ndumps, corner_points, eltype, axis)
+        :param strain_x: Interpolated strain of the horizontal component
+            with shape ``(N, npts, 6)`` or ``None``.
+        :param strain_z: Interpolated strain of the vertical component
+            with shape ``(N, npts, 6)`` or ``None``.
 
-            mesh.strain_buffer.add(id_elem, strain)
-        else:
-            strain = mesh.strain_buffer.get(id_elem)
+        :returns: A list of data dictionaries, one per pair.
+        """
+        phi = np.array([_i.phi for _i in coordinates], dtype=np.float64)
+
+        mij = rotations.rotate_symm_tensor_voigt_xyz_src_to_xyz_earth_array(
+            [_i.tensor_voigt for _i in sources],
+            np.deg2rad([_i.longitude for _i in sources]),
+            np.deg2rad([_i.colatitude for _i in sources]))
+        mij = rotations.rotate_symm_tensor_voigt_xyz_earth_to_xyz_src_array(
+            mij, np.deg2rad([_i.longitude for _i in receivers]),
+            np.deg2rad([_i.colatitude for _i in receivers]))
+        mij = rotations.rotate_symm_tensor_voigt_xyz_to_src_array(mij, phi)
+        mij /= self.parsed_mesh.amplitude
+
+        # Voigt weights of the parts depending on cos(phi) and sin(phi).
+        w_a = mij * np.array([1.0, 1.0, 1.0, 0.0, 2.0, 0.0])
+        w_b = mij * np.array([0.0, 0.0, 0.0, 2.0, 0.0, 2.0])
+
+        final = {}
+        if "Z" in components:
+            final["Z"] = np.einsum("ijk,ik->ij", strain_z, w_a)
+        if any(comp in components for comp in ["N", "E", "R", "T"]):
+            a = np.einsum("ijk,ik->ij", strain_x, w_a)
+            b = np.einsum("ijk,ik->ij", strain_x, w_b)
+            if "R" in components:
+                final["R"] = -a
+            if "T" in components:
+                final["T"] = b
+            if "E" in components:
+                final["E"] = a * np.sin(phi)[:, np.newaxis] + \
+                    b * np.cos(phi)[:, np.newaxis]
+            if "N" in components:
+                final["N"] = -(a * np.cos(phi)[:, np.newaxis] -
+                               b * np.sin(phi)[:, np.newaxis])
+
+        results = []
+        for _i in range(len(sources)):
+            data = dict((key, value[_i]) for key, value in final.items())
+            data["mu"] = mu
+            results.append(data)
+        return results
 
-        final_strain = np.empty((strain.shape[0], 6), order="F")
+    def _get_strain_interp(  # NOQA
+            self, mesh, id_elem, gll_point_ids, G, GT, col_points_xi,
+            col_points_eta, corner_points, eltype, axis, xi, eta):
+        strain = self._get_element_strain(
+            mesh, id_elem, gll_point_ids, G, GT, col_points_xi,
+            col_points_eta, corner_points, eltype, axis)
+        return _interpolate_strain(
+            strain, col_points_xi, col_points_eta, xi, eta,
+            flip_sign=mesh.excitation_type != "monopole", dtype=self.dtype)
+
+    def _get_element_strain(  # NOQA
+            self, mesh, id_elem, gll_point_ids, G, GT, col_points_xi,
+            col_points_eta, corner_points, eltype, axis):
+        """
+        Get the strain at all GLL points of an element, either from the
+        buffer, the on-disc strain cache, or by reading the displacement and
+        differentiating it.
+        """
+        strain = mesh.strain_buffer.lookup(id_elem)
+        if strain is None:
+            start_time = timeit.default_timer()
+            io_start = mesh.io_time
+            disk_cache = self._get_disk_strain_cache(
+                mesh=mesh, shapes=[(mesh.ndumps, mesh.npol + 1,
+                                    mesh.npol + 1, 6)])
+            cached = None
+            if disk_cache is not None:
+                cached = disk_cache.get(id_elem)
+            if cached is not None:
+                strain = cached[0]
+            else:
+                strain = self._compute_element_strain(
+                    mesh, id_elem, gll_point_ids, G, GT, col_points_xi,
+                    col_points_eta, corner_points, eltype, axis)
+                if disk_cache is not None:
+                    disk_cache.add(id_elem, [strain])
+
+            mesh.strain_buffer.add(
+                id_elem, strain,
+                cost=timeit.default_timer() - start_time)
+            self._record_access(mesh, "strain", id_elem, strain,
+                                start_time=start_time, io_start=io_start)
+        elif self.access_recorder is not None:
+            self._record_access(mesh, "strain", id_elem, strain)
+
+        return strain
+
+    def _compute_element_strain(  # NOQA
+            self, mesh, id_elem, gll_point_ids, G, GT, col_points_xi,
+            col_points_eta, corner_points, eltype, axis):
+        """
+        Read the displacement at all GLL points of an element and compute
+        the strain.
+        """
+        utemp = self._load_element_data(mesh, "strain", id_elem,
+                                        gll_point_ids)
 
-        for i in range(6):
-            final_strain[:, i] = spectral_basis.lagrange_interpol_2D_td(
-                col_points_xi, col_points_eta, strain[:, :, :, i], xi, eta)
+        strain_fct_map = {
+            "monopole": sem_derivatives.strain_monopole_td,
+            "dipole": sem_derivatives.strain_dipole_td,
+            "quadpole": sem_derivatives.strain_quadpole_td}
 
-        if not mesh.excitation_type == "monopole":
-            final_strain[:, 3] *= -1.0
-            final_strain[:, 5] *= -1.0
+        strain = strain_fct_map[mesh.excitation_type](
+            utemp, G, GT, col_points_xi, col_points_eta, mesh.npol,
+            mesh.ndumps, corner_points, eltype, axis, dtype=self.dtype)
 
-        return final_strain
+        return strain
 
-    def _get_strain(self, mesh, id_elem):
-        if id_elem not in mesh.strain_buffer:
-            strain_temp = np.zeros((self.info.npts, 6), order="F")
+    def _read_element_data(self, mesh, kind, id_elem, gll_point_ids):
+        """
+        Read the data of an element needed to compute the strain or the
+        displacement, depending on ``kind``. Might be called on the prefetch
+        thread so it must not touch the buffers.
 
+        For ``displ_only`` databases this is the displacement at all GLL
+        points of the element.
+        """
+        # Single precision in the NetCDF files but the later interpolation
+        # routines might require double precision. Assignment to this array
+        # will force a cast.
+        utemp = np.zeros((mesh.ndumps, mesh.npol + 1, mesh.npol + 1, 3),
+                         dtype=self.dtype, order="F")
+
+        # Read the GLL points in a few contiguous ranges - this actually
+        # makes quite a big difference on some file systems. Ranges with
+        # small gaps are merged as reading a few unneeded points is much
+        # cheaper than another read.
+        ranges, positions = helpers.plan_reads(
+            gll_point_ids.flatten(), max_gap=self.max_read_gap)
+        n = sum(_stop - _start for _start, _stop in ranges)
+        # The points are stored by ipol first, the displacement by jpol.
+        shape = (mesh.ndumps, mesh.npol + 1, mesh.npol + 1)
+
+        # Serialize the reads of one element - see the concurrency
+        # notes in the mesh module.
+        with mesh.reading():
             mesh_dict = mesh.f["Snapshots"]
 
-            for i, var in enumerate([
-                    'strain_dsus', 'strain_dsuz', 'strain_dpup',
-                    'strain_dsup', 'strain_dzup', 'straintrace']):
+            # Load displacement from all GLL points.
+            for i, var in enumerate(["disp_s", "disp_p", "disp_z"]):
                 if var not in mesh_dict:
                     continue
 
-                # Make sure it can work with normal and transposed arrays to
-                # support legacy as well as modern, transposed databases.
+                # Make sure it can work with normal and transposed arrays
+                # to support legacy as well as modern, transposed
+                # databases.
                 time_axis = mesh.time_axis[var]
 
-                if time_axis == 0:
-                    strain_temp[:, i] = mesh_dict[var][:, id_elem]
-                else:  # pragma: no cover
-                    # We don't have an example for this yet so we just raise
-                    # here for now - implementing it should just be a matter
-                    # of uncommenting the following line.
-                    #
-                    # strain_temp[:, i] = mesh_dict[var][id_elem, :]
-                    raise NotImplementedError
+                m = mesh_dict[var]
+                block = np.empty((mesh.ndumps, n), dtype=m.dtype)
+                k = 0
+                for _start, _stop in ranges:
+                    if time_axis == 0:
+                        block[:, k:k + _stop - _start] = m[:, _start:_stop]
+                    else:
+                        block[:, k:k + _stop - _start] = \
+                            m[_start:_stop, :].T
+                    k += _stop - _start
+
+                utemp[:, :, :, i] = \
+                    block[:, positions].reshape(shape).transpose(0, 2, 1)
+
+        return utemp
+
+    def _get_strain(self, mesh, id_elem):
+        final_strain = mesh.strain_buffer.lookup(id_elem)
+        if final_strain is None:
+            start_time = timeit.default_timer()
+            io_start = mesh.io_time
+            strain_temp = np.zeros((self.info.npts, 6), dtype=self.dtype,
+                                   order="F")
+
+            # Serialize the reads of one element - see the concurrency
+            # notes in the mesh module.
+            with mesh.reading():
+                mesh_dict = mesh.f["Snapshots"]
+
+                for i, var in enumerate([
+                        'strain_dsus', 'strain_dsuz', 'strain_dpup',
+                        'strain_dsup', 'strain_dzup', 'straintrace']):
+                    if var not in mesh_dict:
+                        continue
+
+                    # Make sure it can work with normal and transposed arrays
+                    # to support legacy as well as modern, transposed
+                    # databases.
+                    time_axis = mesh.time_axis[var]
+
+                    if time_axis == 0:
+                        strain_temp[:, i] = mesh_dict[var][:, id_elem]
+                    else:  # pragma: no cover
+                        # We don't have an example for this yet so we just
+                        # raise here for now - implementing it should just be a
+                        # matter of uncommenting the following line.
+                        #
+                        # strain_temp[:, i] = mesh_dict[var][id_elem, :]
+                        raise NotImplementedError
 
             # transform strain to voigt mapping
             # dsus, dpup, dzuz, dzup, dsuz, dsup
-            final_strain = np.empty((self.info.npts, 6), order="F")
+            final_strain = np.empty((self.info.npts, 6), dtype=self.dtype,
+                                    order="F")
             final_strain[:, 0] = strain_temp[:, 0]
             final_strain[:, 1] = strain_temp[:, 2]
             final_strain[:, 2] = (strain_temp[:, 5] - strain_temp[:, 0] -
@@ -320,62 +997,36 @@ class BaseNetCDFInstaseisDB(with_metaclass(ABCMeta, BaseInstaseisDB)):
             final_strain[:, 3] = -strain_temp[:, 4]
             final_strain[:, 4] = strain_temp[:, 1]
             final_strain[:, 5] = -strain_temp[:, 3]
-            mesh.strain_buffer.add(id_elem, final_strain)
-        else:
-            final_strain = mesh.strain_buffer.get(id_elem)
+            mesh.strain_buffer.add(
+                id_elem, final_strain,
+                cost=timeit.default_timer() - start_time)
+            self._record_access(mesh, "strain", id_elem, final_strain,
+                                start_time=start_time, io_start=io_start)
+        elif self.access_recorder is not None:
+            self._record_access(mesh, "strain", id_elem, final_strain)
 
         return final_strain
 
     def _get_displacement(self, mesh, id_elem, gll_point_ids, col_points_xi,
                           col_points_eta, xi, eta):
-        if id_elem not in mesh.displ_buffer:
-            utemp = np.zeros((mesh.ndumps, mesh.npol + 1, mesh.npol + 1, 3),
-                             dtype=np.float64, order="F")
-
-            mesh_dict = mesh.f["Snapshots"]
-
-            # Load displacement from all GLL points.
-            for i, var in enumerate(["disp_s", "disp_p", "disp_z"]):
-                if var not in mesh_dict:
-                    continue
-
-                # Make sure it can work with normal and transposed arrays to
-                # support legacy as well as modern, transposed databases.
-                time_axis = mesh.time_axis[var]
-
-                # The netCDF Python wrappers starting with version 1.1.6
-                # disallow duplicate and unordered indices while slicing. So
-                # we need to do it manually.
-                # The list of ids we have is unique but not sorted.
-                ids = gll_point_ids.flatten()
-                s_ids = np.sort(ids)
-
-                if time_axis == 0:
-                    temp = mesh_dict[var][:, s_ids]
-                    for ipol in range(mesh.npol + 1):
-                        for jpol in range(mesh.npol + 1):
-                            idx = ipol * 5 + jpol
-                            utemp[:, jpol, ipol, i] = \
-                                temp[:, np.argwhere(s_ids == ids[idx])[0][0]]
-                else:
-                    temp = mesh_dict[var][s_ids, :]
-                    for ipol in range(mesh.npol + 1):
-                        for jpol in range(mesh.npol + 1):
-                            idx = ipol * 5 + jpol
-                            utemp[:, jpol, ipol, i] = \
-                                temp[np.argwhere(s_ids == ids[idx])[0][0], :]
-
-            mesh.displ_buffer.add(id_elem, utemp)
-        else:
-            utemp = mesh.displ_buffer.get(id_elem)
-
-        final_displacement = np.empty((utemp.shape[0], 3), order="F")
-
-        for i in range(3):
-            final_displacement[:, i] = spectral_basis.lagrange_interpol_2D_td(
-                col_points_xi, col_points_eta, utemp[:, :, :, i], xi, eta)
-
-        return final_displacement
+        utemp = mesh.displ_buffer.lookup(id_elem)
+        if utemp is None:
+            start_time = timeit.default_timer()
+            io_start = mesh.io_time
+            utemp = self._load_element_data(mesh, "displacement", id_elem,
+                                            gll_point_ids)
+
+            mesh.displ_buffer.add(
+                id_elem, utemp,
+                cost=timeit.default_timer() - start_time)
+            self._record_access(mesh, "displacement", id_elem, utemp,
+                                start_time=start_time, io_start=io_start)
+        elif self.access_recorder is not None:
+            self._record_access(mesh, "displacement", id_elem, utemp)
+
+        return spectral_basis.lagrange_interpol_2D_td_multi(
+            col_points_xi, col_points_eta, utemp[:, :, :, :3], [xi], [eta],
+            dtype=self.dtype)[:, :, 0]
 
     def _get_info(self):
         """
@@ -445,3 +1096,94 @@ class BaseNetCDFInstaseisDB(with_metaclass(ABCMeta, BaseInstaseisDB)):
             axisem_version=self.parsed_mesh.axisem_version,
             datetime=self.parsed_mesh.creation_time
         )
+
+
+def _interpolate_strain(strain, col_points_xi, col_points_eta, xi, eta,
+                        flip_sign, dtype=np.float64):
+    """
+    Interpolate the strain of an element to the point (xi, eta) in the
+    reference element.
+
+    :param strain: The strain at all GLL points of the element with the
+        shape ``(npts, npol + 1, npol + 1, 6)``.
+    :param flip_sign: Flip the sign of the 4th and 6th Voigt component as
+        required for all but the monopole excitation.
+    :param dtype: The precision of the interpolation.
+    """
+    # All 6 components in one call.
+    final_strain = spectral_basis.lagrange_interpol_2D_td_multi(
+        col_points_xi, col_points_eta, strain, [xi], [eta],
+        dtype=dtype)[:, :, 0]
+
+    if flip_sign:
+        final_strain[:, 3] *= -1.0
+        final_strain[:, 5] *= -1.0
+
+    return final_strain
+
+
+def _interpolate_strain_batch(strain, col_points_xi, col_points_eta, xi,
+                              eta, flip_sign, dtype=np.float64):
+    """
+    Interpolate the strain of an element to many points in the reference
+    element with a single call of the interpolation kernel.
+
+    :param strain: The strain at all GLL points of the element with the
+        shape ``(npts, npol + 1, npol + 1, 6)``.
+    :param xi: The xi coordinates of the points.
+    :param eta: The eta coordinates of the points.
+    :param flip_sign: Flip the sign of the 4th and 6th Voigt component as
+        required for all but the monopole excitation.
+    :param dtype: The precision of the interpolation.
+    :returns: The interpolated strain with the shape ``(N, npts, 6)``.
+    """
+    # (npts, 6, N) -> (N, npts, 6)
+    final_strain = spectral_basis.lagrange_interpol_2D_td_multi(
+        col_points_xi, col_points_eta, strain, xi, eta,
+        dtype=dtype).transpose(2, 0, 1)
+
+    if flip_sign:
+        final_strain[:, :, 3] *= -1.0
+        final_strain[:, :, 5] *= -1.0
+
+    return final_strain
+
+
+def _reorder_merged_utemp(utemp, layout, dtype=None):
+    """
+    Reorder the data of one element of a merged database to
+    ``(npts, jpol, ipol, nvars)``.
+
+    :param utemp: The data as stored in the file.
+    :param layout: The layout of the file, either ``"c"`` or ``"fortran"``.
+        The latter results in a Fortran ordered view without any copy.
+    :param dtype: If given, the result is a Fortran ordered array of this
+        dtype as required by the interpolation and strain routines. Only
+        copied if necessary.
+    """
+    if layout == "fortran":
+        # (nvars, ipol, jpol, npts) -> (npts, jpol, ipol, nvars)
+        utemp = utemp.T
+    else:
+        # (nvars, jpol, ipol, npts) -> (npts, jpol, ipol, nvars)
+        utemp = utemp.transpose(3, 1, 2, 0)
+    if dtype is not None:
+        utemp = np.require(utemp, dtype=dtype, requirements=["F_CONTIGUOUS"])
+    return utemp
+
+
+def _get_vertical_utemp(utemp, dtype=np.float64):
+    """
+    The displacement of the vertical component of a reordered merged
+    element as ``(npts, jpol, ipol, 3)`` array with the ``s``, an all zero
+    ``phi``, and the ``z`` component as expected by the strain and
+    interpolation routines. The vertical component is always stored in the
+    last two variables.
+
+    Always returns a new array - the input is never modified as it might
+    be buffered.
+    """
+    utemp_z = np.zeros(utemp.shape[:3] + (3,), dtype=dtype, order="F")
+    utemp_z[:, :, :, 0] = utemp[:, :, :, -2]
+    utemp_z[:, :, :, 2] = utemp[:, :, :, -1]
+    return utemp_z
@@ -0,0 +1,390 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Spatial index to quickly find the element containing a point in the
+(s, z) plane of an AxiSEM mesh.
+
+The index is a uniform grid over the meridional plane. Each cell stores the
+ids of all elements whose (slightly padded) bounding box overlaps the cell.
+A query thus only has to test the few elements in a single cell instead of
+walking a kd-tree and testing the nearest neighbours one after the other.
+
+Also contains a small LRU cache for already located elements.
+
+:copyright:
+    The Instaseis Development Team (instaseis@googlegroups.com), 2026
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+from collections import OrderedDict
+import hashlib
+import os
+import threading
+
+import numpy as np
+
+from .. import finite_elem_mapping
+
+
+class ElementIndex(object):
+    """
+    Uniform grid index over the elements of a mesh.
+
+    :param corner_points: The corner points of all elements with the shape
+        ``(nelem, 4, 2)``.
+    :type corner_points: :class:`numpy.ndarray`
+    :param eltypes: The element types of all elements.
+    :type eltypes: :class:`numpy.ndarray`
+    :param bounding_boxes: The bounding boxes of all elements with the shape
+        ``(nelem, 4)``: ``s_min, s_max, z_min, z_max``. Should be computed
+        from all GLL points and not just the corner points as curved
+        elements bulge out between their corners.
+    :type bounding_boxes: :class:`numpy.ndarray`
+    :param cell_size: The edge length of the grid cells. Defaults to the
+        median extent of the elements.
+    :type cell_size: float, optional
+    """
+    # Bump if the layout of the saved index changes.
+    VERSION = 1
+    # Relative padding of the bounding boxes.
+    PADDING = 0.02
+    # Upper limit for the number of grid cells.
+    MAX_CELLS = 4 * 1024 ** 2
+
+    def __init__(self, corner_points, eltypes, bounding_boxes,
+                 cell_size=None, _grid=None):
+        self.corner_points = np.require(corner_points, dtype=np.float64)
+        self.eltypes = np.asarray(eltypes)
+        self.midpoints = self.corner_points.mean(axis=1)
+
+        if _grid is not None:
+            self._set_grid(**_grid)
+            return
+
+        bb = np.array(bounding_boxes, dtype=np.float64)
+        pad_s = (bb[:, 1] - bb[:, 0]) * self.PADDING
+        pad_z = (bb[:, 3] - bb[:, 2]) * self.PADDING
+        bb[:, 0] -= pad_s
+        bb[:, 1] += pad_s
+        bb[:, 2] -= pad_z
+        bb[:, 3] += pad_z
+
+        s_min, s_max = bb[:, 0].min(), bb[:, 1].max()
+        z_min, z_max = bb[:, 2].min(), bb[:, 3].max()
+
+        if cell_size is None:
+            cell_size = np.median(np.maximum(bb[:, 1] - bb[:, 0],
+                                             bb[:, 3] - bb[:, 2]))
+        # Limit the total number of cells.
+        min_cell_size = np.sqrt((s_max - s_min) * (z_max - z_min) /
+                                self.MAX_CELLS)
+        cell_size = max(float(cell_size), min_cell_size)
+
+        ns = int(np.ceil((s_max - s_min) / cell_size)) + 1
+        nz = int(np.ceil((z_max - z_min) / cell_size)) + 1
+
+        # Range of cells covered by each element.
+        is0 = np.floor((bb[:, 0] - s_min) / cell_size).astype(np.int64)
+        is1 = np.floor((bb[:, 1] - s_min) / cell_size).astype(np.int64)
+        iz0 = np.floor((bb[:, 2] - z_min) / cell_size).astype(np.int64)
+        iz1 = np.floor((bb[:, 3] - z_min) / cell_size).astype(np.int64)
+
+        # Expand to one entry per (element, cell) pair without a Python
+        # loop over all elements.
+        n_s = is1 - is0 + 1
+        n_z = iz1 - iz0 + 1
+        count = n_s * n_z
+        elem = np.repeat(np.arange(len(bb), dtype=np.int64), count)
+        local = np.arange(count.sum(), dtype=np.int64) - \
+            np.repeat(np.cumsum(count) - count, count)
+        cell_s = is0[elem] + local // n_z[elem]
+        cell_z = iz0[elem] + local % n_z[elem]
+        cell = cell_s * nz + cell_z
+
+        order = np.argsort(cell, kind="mergesort")
+        offsets = np.searchsorted(cell[order], np.arange(ns * nz + 1))
+
+        self._set_grid(origin=np.array([s_min, z_min]),
+                       cell_size=cell_size, shape=np.array([ns, nz]),
+                       offsets=offsets, elements=elem[order])
+
+    def _set_grid(self, origin, cell_size, shape, offsets, elements):
+        self.origin = np.asarray(origin, dtype=np.float64)
+        self.cell_size = float(cell_size)
+        self.shape = tuple(int(_i) for _i in shape)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.elements = np.asarray(elements, dtype=np.int64)
+
+    @classmethod
+    def from_mesh(cls, mesh):
+        """
+        Build the index for a :class:`~instaseis.database_interfaces.mesh.Mesh`
+        object of a ``displ_only`` database.
+        """
+        m = mesh.f["Mesh"]
+        # Use the in-memory arrays if available.
+        if not mesh.read_on_demand:
+            fem_mesh = mesh.fem_mesh
+            eltypes = mesh.eltypes
+            mesh_s = mesh.mesh_S
+            mesh_z = mesh.mesh_Z
+            sem_mesh = mesh.sem_mesh
+        else:
+            fem_mesh = m["fem_mesh"][:]
+            eltypes = m["eltype"][:]
+            mesh_s = m["mesh_S"][:]
+            mesh_z = m["mesh_Z"][:]
+            sem_mesh = m["sem_mesh"][:]
+
+        corner_ids = fem_mesh[:, :4]
+        corner_points = np.empty((len(corner_ids), 4, 2), dtype=np.float64)
+        corner_points[:, :, 0] = mesh_s[corner_ids]
+        corner_points[:, :, 1] = mesh_z[corner_ids]
+
+        gll_ids = sem_mesh.reshape(len(sem_mesh), -1)
+        gll_s = mesh_s[gll_ids]
+        gll_z = mesh_z[gll_ids]
+        bounding_boxes = np.array([gll_s.min(axis=1), gll_s.max(axis=1),
+                                   gll_z.min(axis=1), gll_z.max(axis=1)]).T
+
+        return cls(corner_points=corner_points, eltypes=eltypes,
+                   bounding_boxes=bounding_boxes)
+
+    @classmethod
+    def from_mesh_cached(cls, mesh, cache_dir):
+        """
+        Load the index for the mesh from the cache directory. If it does
+        not yet exist it will be built and written there.
+        """
+        filename = os.path.join(cache_dir, "element_index_%s.npz" %
+                                _mesh_fingerprint(mesh.filename))
+        if os.path.exists(filename):
+            try:
+                return cls.load(filename)
+            except Exception:  # pragma: no cover
+                # Corrupt or outdated - just rebuild it.
+                pass
+
+        index = cls.from_mesh(mesh)
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        index.save(filename)
+        return index
+
+    def save(self, filename):
+        """
+        Save the index to a ``.npz`` file.
+        """
+        # Write to a temporary file first so concurrent readers never see
+        # a partially written index.
+        tmp_filename = filename + ".%i.tmp" % os.getpid()
+        with open(tmp_filename, "wb") as fh:
+            np.savez(fh, version=self.VERSION,
+                     corner_points=self.corner_points, eltypes=self.eltypes,
+                     origin=self.origin, cell_size=self.cell_size,
+                     shape=np.array(self.shape), offsets=self.offsets,
+                     elements=self.elements)
+        os.rename(tmp_filename, filename)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Load an index previously stored with :meth:`save`.
+        """
+        with np.load(filename) as data:
+            if int(data["version"]) != cls.VERSION:
+                raise ValueError("Incompatible element index version.")
+            return cls(corner_points=data["corner_points"],
+                       eltypes=data["eltypes"], bounding_boxes=None,
+                       _grid={"origin": data["origin"],
+                              "cell_size": data["cell_size"],
+                              "shape": data["shape"],
+                              "offsets": data["offsets"],
+                              "elements": data["elements"]})
+
+    def candidates(self, s, z):
+        """
+        Ids of all elements that might contain the point, sorted by the
+        distance of their midpoints to the point.
+        """
+        i_s = int(np.floor((s - self.origin[0]) / self.cell_size))
+        i_z = int(np.floor((z - self.origin[1]) / self.cell_size))
+        if not (0 <= i_s < self.shape[0] and 0 <= i_z < self.shape[1]):
+            return np.empty(0, dtype=np.int64)
+        cell = i_s * self.shape[1] + i_z
+        elems = self.elements[self.offsets[cell]:self.offsets[cell + 1]]
+        if len(elems) > 1:
+            dist = (self.midpoints[elems, 0] - s) ** 2 + \
+                (self.midpoints[elems, 1] - z) ** 2
+            elems = elems[np.argsort(dist)]
+        return elems
+
+    def locate_point(self, s, z, tolerance=1E-3):
+        """
+        Find the element containing a single point.
+
+        :returns: ``(id_elem, xi, eta)``. ``id_elem`` is ``-1`` if no
+            element could be found.
+        """
+        for idx in self.candidates(s, z):
+            isin, xi, eta = finite_elem_mapping.inside_element(
+                s, z, self.corner_points[idx], self.eltypes[idx],
+                tolerance=tolerance)
+            if isin:
+                return int(idx), xi, eta
+        return -1, None, None
+
+    def locate(self, s, z, tolerance=1E-3):
+        """
+        Find the elements containing many points.
+
+        The cells of all points are computed at once and the points are
+        grouped by cell so the candidates of each cell are only gathered and
+        sorted once.
+
+        :param s: The s coordinates of the points.
+        :param z: The z coordinates of the points.
+
+        :returns: Three arrays ``(id_elem, xi, eta)``. ``id_elem`` is ``-1``
+            for all points no element could be found for.
+        """
+        s = np.atleast_1d(np.asarray(s, dtype=np.float64))
+        z = np.atleast_1d(np.asarray(z, dtype=np.float64))
+        ids = np.empty(len(s), dtype=np.int64)
+        ids.fill(-1)
+        xi = np.empty(len(s), dtype=np.float64)
+        xi.fill(np.nan)
+        eta = xi.copy()
+
+        # Cells of all points inside of the grid.
+        i_s = np.floor((s - self.origin[0]) / self.cell_size)
+        i_z = np.floor((z - self.origin[1]) / self.cell_size)
+        points = np.nonzero((i_s >= 0) & (i_s < self.shape[0]) &
+                            (i_z >= 0) & (i_z < self.shape[1]))[0]
+        if not len(points):
+            return ids, xi, eta
+        cells = i_s[points].astype(np.int64) * self.shape[1] + \
+            i_z[points].astype(np.int64)
+
+        # Group the points by cell.
+        order = np.argsort(cells, kind="mergesort")
+        points = points[order]
+        cells = cells[order]
+        bounds = np.nonzero(np.diff(cells))[0] + 1
+
+        for group, cell in zip(np.split(points, bounds),
+                               cells[np.concatenate([[0], bounds])]):
+            elems = self.elements[self.offsets[cell]:self.offsets[cell + 1]]
+            if not len(elems):
+                continue
+            # Candidates of each point sorted by the distance of their
+            # midpoints to the point.
+            dist = (self.midpoints[elems, 0] - s[group, np.newaxis]) ** 2 + \
+                (self.midpoints[elems, 1] - z[group, np.newaxis]) ** 2
+            candidates = elems[np.argsort(dist, axis=1)]
+            for _i, _candidates in zip(group, candidates):
+                for idx in _candidates:
+                    isin, _xi, _eta = finite_elem_mapping.inside_element(
+                        s[_i], z[_i], self.corner_points[idx],
+                        self.eltypes[idx], tolerance=tolerance)
+                    if isin:
+                        ids[_i] = idx
+                        xi[_i] = _xi
+                        eta[_i] = _eta
+                        break
+        return ids, xi, eta
+
+
+class ElementInfoCache(object):
+    """
+    Bounded LRU cache mapping quantized (s, z) coordinates to element
+    information.
+
+    Points closer than about ``quantum_in_m`` to a previously located point
+    share its element information, including the location in the
+    reference element. Safe to use from multiple threads.
+
+    :param max_items: The maximum number of cached items. ``0`` disables
+        the cache.
+    :type max_items: int
+    :param quantum_in_m: The grid spacing used to quantize the coordinates.
+    :type quantum_in_m: float
+    """
+    def __init__(self, max_items=10000, quantum_in_m=1E-3):
+        self.max_items = int(max_items)
+        self.quantum_in_m = float(quantum_in_m)
+        self._cache = OrderedDict()
+        self._hits = 0
+        self._fails = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._cache)
+
+    def _key(self, s, z):
+        return (int(round(s / self.quantum_in_m)),
+                int(round(z / self.quantum_in_m)))
+
+    def get(self, s, z):
+        """
+        Return the cached item for the coordinates or ``None``.
+        """
+        key = self._key(s, z)
+        with self._lock:
+            value = self._cache.pop(key, None)
+            if value is None:
+                self._fails += 1
+                return None
+            self._hits += 1
+            self._cache[key] = value
+        return value
+
+    def add(self, s, z, value):
+        """
+        Add an item and evict the least recently used ones if necessary.
+        """
+        if self.max_items <= 0:
+            return
+        key = self._key(s, z)
+        with self._lock:
+            self._cache[key] = value
+            while len(self._cache) > self.max_items:
+                self._cache.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._fails
+
+    @property
+    def efficiency(self):
+        """
+        Return the fraction of calls to the get() routine that returned an
+        item.
+        """
+        if (self._hits + self._fails) == 0:
+            return 0.0
+        else:
+            return float(self._hits) / float(self._hits + self._fails)
+
+
+def _mesh_fingerprint(filename):
+    """
+    Cheap fingerprint of a mesh file to identify cached indices.
+    """
+    stat = os.stat(filename)
+    key = "%s-%i-%i" % (os.path.abspath(filename), stat.st_size,
+                        int(stat.st_mtime))
+    return hashlib.md5(key.encode()).hexdigest()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Reading and writing lists of buffered elements, e.g. to warm up the buffers
+of a server with the elements that were hot when it was last shut down.
+
+An element log is a text file with one element per line in the order the
+elements were accessed, oldest first::
+
+    # kind id_elem
+    strain 1234
+    displacement 12
+
+``kind`` is the kind of buffer the element is stored in. Empty lines and
+lines starting with ``#`` are ignored.
+
+An access log written by :class:`AccessRecorder` has one tab separated line
+per access of a buffer with the columns in :data:`ACCESS_LOG_COLUMNS`:
+
+* ``timestamp``: Unix time of the access.
+* ``mesh``: The file of the mesh relative to the database directory.
+* ``kind`` and ``id_elem``: As above.
+* ``hit``: ``1`` if the element was in the buffer, ``0`` otherwise.
+* ``nbytes``: The size of the element in the buffer.
+* ``io_time`` and ``compute_time``: Seconds spent reading the element from
+  the database file and processing it after a miss.
+
+Access logs can be used wherever an element log is expected.
+
+:copyright:
+    The Instaseis Development Team (instaseis@googlegroups.com), 2026
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import collections
+import io
+import os
+import threading
+import time
+
+
+KINDS = ("strain", "displacement")
+
+ACCESS_LOG_COLUMNS = ("timestamp", "mesh", "kind", "id_elem", "hit",
+                      "nbytes", "io_time", "compute_time")
+
+Access = collections.namedtuple("Access", ACCESS_LOG_COLUMNS)
+
+
+class AccessRecorder(object):
+    """
+    Appends every access of the buffers of a database to an access log.
+
+    Safe to use from many threads. Every line is written with a single call
+    so many processes can append to the same file.
+
+    :param filename: The access log. Appended to if it exists.
+    :type filename: str
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self._lock = threading.Lock()
+        # Line buffered.
+        self._fh = io.open(filename, "at", buffering=1)
+        if self._fh.tell() == 0:
+            self._fh.write("# %s\n" % "\t".join(ACCESS_LOG_COLUMNS))
+
+    def record(self, mesh, kind, id_elem, hit, nbytes, io_time=0.0,
+               compute_time=0.0):
+        line = "%.6f\t%s\t%s\t%i\t%i\t%i\t%.6f\t%.6f\n" % (
+            time.time(), mesh, kind, id_elem, bool(hit), nbytes, io_time,
+            compute_time)
+        with self._lock:
+            self._fh.write(line)
+
+    def close(self):
+        with self._lock:
+            self._fh.close()
+
+
+def read_access_log(filename):
+    """
+    Read an access log written by :class:`AccessRecorder`.
+
+    :returns: A list of :class:`Access` tuples in the order of the accesses.
+    """
+    accesses = []
+    with io.open(filename, "rt") as fh:
+        for line_number, line in enumerate(fh, 1):
+            if not line.strip() or line.startswith("#"):
+                continue
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) != len(ACCESS_LOG_COLUMNS):
+                raise ValueError("Invalid line %i in access log '%s': %s" % (
+                    line_number, filename, line.strip()))
+            accesses.append(Access(
+                timestamp=float(parts[0]), mesh=parts[1], kind=parts[2],
+                id_elem=int(parts[3]), hit=bool(int(parts[4])),
+                nbytes=int(parts[5]), io_time=float(parts[6]),
+                compute_time=float(parts[7])))
+    return accesses
+
+
+def read_element_log(filename):
+    """
+    Read an element log or the elements of an access log.
+
+    :returns: A list of ``(kind, id_elem)`` tuples, oldest first.
+    """
+    elements = []
+    with io.open(filename, "rt") as fh:
+        for line_number, line in enumerate(fh, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if "\t" in line:
+                # Access log.
+                parts = line.split("\t")[2:4]
+            else:
+                parts = line.split()
+            if len(parts) != 2 or parts[0] not in KINDS or \
+                    not parts[1].isdigit():
+                raise ValueError("Invalid line %i in element log '%s': %s" % (
+                    line_number, filename, line))
+            elements.append((parts[0], int(parts[1])))
+    return elements
+
+
+def write_element_log(filename, elements):
+    """
+    Write an element log. The file is replaced atomically so a concurrent
+    reader never sees a partially written file.
+
+    :param elements: ``(kind, id_elem)`` tuples, oldest first.
+    """
+    temp_filename = filename + ".tmp"
+    with io.open(temp_filename, "wt") as fh:
+        fh.write("# kind id_elem\n")
+        for kind, id_elem in elements:
+            if kind not in KINDS:
+                raise ValueError("Unknown element kind '%s'." % kind)
+            fh.write("%s %i\n" % (kind, id_elem))
+    os.rename(temp_filename, filename)
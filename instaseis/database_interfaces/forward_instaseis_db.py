@@ -55,20 +55,24 @@ class ForwardInstaseisDB(BaseNetCDFInstaseisDB):
         m1_m = mesh.Mesh(
             files["MZZ"], full_parse=True, strain_buffer_size_in_mb=0,
             displ_buffer_size_in_mb=self.buffer_size_in_mb,
-            read_on_demand=self.read_on_demand)
+            read_on_demand=self.read_on_demand,
+            cache_manager=self.cache_manager)
         m2_m = mesh.Mesh(
             files["MXX_P_MYY"], full_parse=False, strain_buffer_size_in_mb=0,
             displ_buffer_size_in_mb=self.buffer_size_in_mb,
-            read_on_demand=self.read_on_demand)
+            read_on_demand=self.read_on_demand,
+            cache_manager=self.cache_manager)
         m3_m = mesh.Mesh(
             files["MXZ_MYZ"], full_parse=False, strain_buffer_size_in_mb=0,
             displ_buffer_size_in_mb=self.buffer_size_in_mb,
-            read_on_demand=self.read_on_demand)
+            read_on_demand=self.read_on_demand,
+            cache_manager=self.cache_manager)
         m4_m = mesh.Mesh(
             files["MXY_MXX_M_MYY"], full_parse=False,
             strain_buffer_size_in_mb=0,
             displ_buffer_size_in_mb=self.buffer_size_in_mb,
-            read_on_demand=self.read_on_demand)
+            read_on_demand=self.read_on_demand,
+            cache_manager=self.cache_manager)
         self.parsed_mesh = m1_m
 
         MeshCollection_fwd = collections.namedtuple(
@@ -77,6 +81,11 @@ class ForwardInstaseisDB(BaseNetCDFInstaseisDB):
 
         self._is_reciprocal = False
 
+    def _get_element_reads(self, source, components):
+        if not isinstance(source, Source):
+            return []
+        return [(_i, "displacement") for _i in self.meshes]
+
     def _get_data(self, source, receiver, components, coordinates,
                   element_info):
         ei = element_info
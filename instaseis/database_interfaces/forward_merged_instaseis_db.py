@@ -16,8 +16,10 @@ from __future__ import (absolute_import, division, print_function,
 
 import collections
 import numpy as np
+import timeit
 
-from .base_netcdf_instaseis_db import BaseNetCDFInstaseisDB
+from .base_netcdf_instaseis_db import (BaseNetCDFInstaseisDB,
+                                       _reorder_merged_utemp)
 from . import mesh
 from .. import rotations, spectral_basis
 from ..source import Source
@@ -60,11 +62,25 @@ class ForwardMergedInstaseisDB(BaseNetCDFInstaseisDB):
             filename, full_parse=True,
             strain_buffer_size_in_mb=self.buffer_size_in_mb,
             displ_buffer_size_in_mb=self.buffer_size_in_mb,
-            read_on_demand=self.read_on_demand))
+            read_on_demand=self.read_on_demand,
+            cache_manager=self.cache_manager))
         self.parsed_mesh = self.meshes.merged
 
         self._is_reciprocal = False
 
+    def _get_element_reads(self, source, components):
+        if not isinstance(source, Source):
+            return []
+        return [(self.meshes.merged, "displacement")]
+
+    def _read_element_data(self, mesh, kind, id_elem, gll_point_ids):
+        with mesh.reading():
+            utemp = mesh.f["MergedSnapshots"][id_elem]
+        # Reordered and converted once here so every buffer hit can be
+        # used as it is.
+        return _reorder_merged_utemp(utemp, mesh.merged_layout,
+                                     dtype=self.dtype)
+
     def _get_data(self, source, receiver, components, coordinates,
                   element_info):
         ei = element_info
@@ -88,94 +104,58 @@ class ForwardMergedInstaseisDB(BaseNetCDFInstaseisDB):
             raise NotImplementedError
 
         # Get from netcdf file or buffer.
-        if ei.id_elem not in self.parsed_mesh.displ_buffer:
-            utemp = self.meshes.merged.f["MergedSnapshots"][ei.id_elem]
-
-            # utemp is currently (nvars, jpol, ipol, npts)
-            # 1. Roll to (npts, nvar, jpol, ipol)
-            utemp = np.rollaxis(utemp, 3, 0)
-            # 2. Roll to (npts, jpol, nvar, ipol)
-            utemp = np.rollaxis(utemp, 2, 1)
-            # 3. Roll to (npts, jpol, ipol, nvar)
-            utemp = np.rollaxis(utemp, 3, 2)
-
-            self.parsed_mesh.displ_buffer.add(ei.id_elem, utemp)
-        else:
-            utemp = self.parsed_mesh.displ_buffer.get(ei.id_elem)
-
-        displ_1 = np.zeros((utemp.shape[0], 3), order="F")
-        displ_2 = np.zeros((utemp.shape[0], 3), order="F")
-        displ_3 = np.zeros((utemp.shape[0], 3), order="F")
-        displ_4 = np.zeros((utemp.shape[0], 3), order="F")
-
-        # Now just fill them all.
-        # displ_1 is generated from MZZ which has only two displacement
-        # components.
-        displ_1[:, 0] = spectral_basis.lagrange_interpol_2D_td(
-            points1=ei.col_points_xi, points2=ei.col_points_eta,
-            coefficients=utemp[:, :, :, 0], x1=ei.xi, x2=ei.eta)
-        displ_1[:, 2] = spectral_basis.lagrange_interpol_2D_td(
-            points1=ei.col_points_xi, points2=ei.col_points_eta,
-            coefficients=utemp[:, :, :, 1], x1=ei.xi, x2=ei.eta)
-        # displ_2 is generated from MXX+MYY which has only two displacement
-        # components.
-        displ_2[:, 0] = spectral_basis.lagrange_interpol_2D_td(
-            points1=ei.col_points_xi, points2=ei.col_points_eta,
-            coefficients=utemp[:, :, :, 2], x1=ei.xi, x2=ei.eta)
-        displ_2[:, 2] = spectral_basis.lagrange_interpol_2D_td(
-            points1=ei.col_points_xi, points2=ei.col_points_eta,
-            coefficients=utemp[:, :, :, 3], x1=ei.xi, x2=ei.eta)
-        # displ_3 is generated from MXZ/MYZ which has three displacement
-        # components.
-        displ_3[:, 0] = spectral_basis.lagrange_interpol_2D_td(
-            points1=ei.col_points_xi, points2=ei.col_points_eta,
-            coefficients=utemp[:, :, :, 4], x1=ei.xi, x2=ei.eta)
-        displ_3[:, 1] = spectral_basis.lagrange_interpol_2D_td(
-            points1=ei.col_points_xi, points2=ei.col_points_eta,
-            coefficients=utemp[:, :, :, 5], x1=ei.xi, x2=ei.eta)
-        displ_3[:, 2] = spectral_basis.lagrange_interpol_2D_td(
-            points1=ei.col_points_xi, points2=ei.col_points_eta,
-            coefficients=utemp[:, :, :, 6], x1=ei.xi, x2=ei.eta)
-        # displ_3 is generated from MXY/MXX-MYY which has three displacement
-        # components.
-        displ_4[:, 0] = spectral_basis.lagrange_interpol_2D_td(
-            points1=ei.col_points_xi, points2=ei.col_points_eta,
-            coefficients=utemp[:, :, :, 7], x1=ei.xi, x2=ei.eta)
-        displ_4[:, 1] = spectral_basis.lagrange_interpol_2D_td(
-            points1=ei.col_points_xi, points2=ei.col_points_eta,
-            coefficients=utemp[:, :, :, 8], x1=ei.xi, x2=ei.eta)
-        displ_4[:, 2] = spectral_basis.lagrange_interpol_2D_td(
-            points1=ei.col_points_xi, points2=ei.col_points_eta,
-            coefficients=utemp[:, :, :, 9], x1=ei.xi, x2=ei.eta)
+        utemp = self.parsed_mesh.displ_buffer.lookup(ei.id_elem)
+        if utemp is None:
+            start_time = timeit.default_timer()
+            io_start = self.meshes.merged.io_time
+            utemp = self._load_element_data(
+                self.meshes.merged, "displacement", ei.id_elem, None)
+
+            self.parsed_mesh.displ_buffer.add(
+                ei.id_elem, utemp,
+                cost=timeit.default_timer() - start_time)
+            self._record_access(self.parsed_mesh, "displacement",
+                                ei.id_elem, utemp, start_time=start_time,
+                                io_start=io_start)
+        elif self.access_recorder is not None:
+            self._record_access(self.parsed_mesh, "displacement",
+                                ei.id_elem, utemp)
+
+        # Interpolate all ten components in a single call:
+        # 0-1: MZZ (s, z), 2-3: MXX+MYY (s, z), 4-6: MXZ/MYZ (s, phi, z),
+        # and 7-9: MXY/MXX-MYY (s, phi, z).
+        displ = spectral_basis.lagrange_interpol_2D_td_multi(
+            ei.col_points_xi, ei.col_points_eta, utemp, [ei.xi], [ei.eta],
+            dtype=self.dtype)[:, :, 0]
 
         mij = source.tensor / self.parsed_mesh.amplitude
         # mij is [m_rr, m_tt, m_pp, m_rt, m_rp, m_tp]
         # final is in s, phi, z coordinates
-        final = np.zeros((displ_1.shape[0], 3), dtype="float64")
+        final = np.zeros((displ.shape[0], 3), dtype="float64")
 
-        final[:, 0] += displ_1[:, 0] * mij[0]
-        final[:, 2] += displ_1[:, 2] * mij[0]
+        final[:, 0] += displ[:, 0] * mij[0]
+        final[:, 2] += displ[:, 1] * mij[0]
 
-        final[:, 0] += displ_2[:, 0] * (mij[1] + mij[2])
-        final[:, 2] += displ_2[:, 2] * (mij[1] + mij[2])
+        final[:, 0] += displ[:, 2] * (mij[1] + mij[2])
+        final[:, 2] += displ[:, 3] * (mij[1] + mij[2])
 
         fac_1 = mij[3] * np.cos(coordinates.phi) + \
             mij[4] * np.sin(coordinates.phi)
         fac_2 = -mij[3] * np.sin(coordinates.phi) + \
             mij[4] * np.cos(coordinates.phi)
 
-        final[:, 0] += displ_3[:, 0] * fac_1
-        final[:, 1] += displ_3[:, 1] * fac_2
-        final[:, 2] += displ_3[:, 2] * fac_1
+        final[:, 0] += displ[:, 4] * fac_1
+        final[:, 1] += displ[:, 5] * fac_2
+        final[:, 2] += displ[:, 6] * fac_1
 
         fac_1 = (mij[1] - mij[2]) * np.cos(2 * coordinates.phi) \
             + 2 * mij[5] * np.sin(2 * coordinates.phi)
         fac_2 = -(mij[1] - mij[2]) * np.sin(2 * coordinates.phi) \
             + 2 * mij[5] * np.cos(2 * coordinates.phi)
 
-        final[:, 0] += displ_4[:, 0] * fac_1
-        final[:, 1] += displ_4[:, 1] * fac_2
-        final[:, 2] += displ_4[:, 2] * fac_1
+        final[:, 0] += displ[:, 7] * fac_1
+        final[:, 1] += displ[:, 8] * fac_2
+        final[:, 2] += displ[:, 9] * fac_1
 
         rotmesh_colat = np.arctan2(coordinates.s, coordinates.z)
 
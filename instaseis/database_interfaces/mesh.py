@@ -13,6 +13,34 @@ instead of
 
 * HDF5 -> h5py
 
+Concurrency
+-----------
+
+A database object can be shared by many threads, e.g. the worker threads of
+the server:
+
+* h5py serializes all calls into the HDF5 library with a process-wide lock
+  so the file handles can be shared. Additionally, each :class:`Mesh` has
+  a ``lock`` that is held while reading all data of one element so reads of
+  different threads do not interleave. Acquire it with
+  :meth:`Mesh.reading` which also accounts the time per thread.
+* :class:`CacheManager` (and thus every :class:`Buffer`) has no global
+  lock. The uncompressed items are spread over a number of stripes by the
+  hash of their keys and each stripe has its own lock, so lookups and
+  inserts of different items usually do not contend. Every use stamps an
+  item with a tick of a global counter which keeps the eviction order
+  exact across stripes. The memory accounting, the compressed tier, and the
+  statistics of each :class:`Buffer` have separate small locks, and only
+  one thread evicts at a time. Locks are always acquired in the order
+  eviction lock, stripe lock, then accounting or compressed tier lock.
+  None of them is held while reading, computing, compressing, or
+  decompressing items. Use :meth:`Buffer.lookup` instead of the ``in``
+  operator followed by :meth:`Buffer.get` as another thread might evict
+  the item in between. Two threads missing the same item at the same time
+  will both compute it and the second one replaces the first which is
+  harmless.
+* The numerical routines hold no global state and are reentrant.
+
 
 :copyright:
     Lion Krischer (krischer@geophysik.uni-muenchen.de), 2014
@@ -25,6 +53,12 @@ from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
 from collections import OrderedDict
+import contextlib
+import heapq
+import itertools
+import threading
+import timeit
+import zlib
 
 import h5py
 import numpy as np
@@ -32,60 +66,674 @@ from obspy import UTCDateTime
 from scipy.spatial import cKDTree
 
 
+def _get_nbytes(value):
+    # Works with single arrays and iterables of arrays.
+    try:
+        return value.nbytes
+    except Exception:
+        return sum(_i.nbytes for _i in value if _i is not None)
+
+
+def _truncate_mantissa(array, mantissa_bits):
+    """
+    Copy of a floating point array with all but the highest
+    ``mantissa_bits`` bits of the mantissa set to zero. The relative error
+    of each value is below ``2 ** -mantissa_bits`` and the result
+    compresses much better.
+    """
+    n_bits = {4: 23, 8: 52}.get(array.dtype.itemsize)
+    if array.dtype.kind != "f" or n_bits is None or \
+            mantissa_bits >= n_bits:
+        return array
+    int_type = np.uint32 if array.dtype.itemsize == 4 else np.uint64
+    mask = int_type(~((1 << (n_bits - mantissa_bits)) - 1) &
+                    ((1 << (8 * array.dtype.itemsize)) - 1))
+    # Copies in the same memory order.
+    truncated = array.copy(order="K")
+    view = truncated.view(int_type)
+    view &= mask
+    return truncated
+
+
+def _compress(value, level, mantissa_bits):
+    """
+    Compress an array or an iterable of arrays (some of which might be
+    ``None``) as stored in a :class:`CacheManager`.
+
+    :returns: ``(compressed, nbytes)``
+    """
+    is_array = isinstance(value, np.ndarray)
+    arrays = [value] if is_array else list(value)
+    parts = []
+    nbytes = 0
+    for array in arrays:
+        if array is None:
+            parts.append(None)
+            continue
+        if mantissa_bits is not None:
+            array = _truncate_mantissa(array, mantissa_bits)
+        # Keep Fortran ordered arrays Fortran ordered.
+        order = "F" if array.flags.f_contiguous and \
+            not array.flags.c_contiguous else "C"
+        data = zlib.compress(array.tobytes(order=order), level)
+        nbytes += len(data)
+        parts.append((data, array.dtype.str, array.shape, order))
+    container = None if is_array else type(value)
+    return (container, parts), nbytes
+
+
+def _decompress(compressed):
+    """
+    Inverse of :func:`_compress`. The returned arrays are read-only.
+    """
+    container, parts = compressed
+    arrays = []
+    for part in parts:
+        if part is None:
+            arrays.append(None)
+            continue
+        data, dtype, shape, order = part
+        arrays.append(np.frombuffer(zlib.decompress(data),
+                                    dtype=dtype).reshape(shape, order=order))
+    if container is None:
+        return arrays[0]
+    return container(arrays)
+
+
+class _Stripe(object):
+    """
+    A part of the uncompressed tier of a :class:`CacheManager` with its own
+    lock and access statistics.
+
+    :param score: Function returning the eviction score of an item. If
+        given, the items are additionally kept in a heap ordered by
+        ``(score, tick)``. Otherwise they are evicted in the order of
+        :attr:`items`.
+    """
+    __slots__ = ("lock", "items", "score", "heap", "hits",
+                 "compressed_hits", "fails")
+
+    def __init__(self, score=None):
+        self.lock = threading.Lock()
+        # Maps keys to [value, nbytes, kind, hits, cost, tick], least
+        # recently used first.
+        self.items = OrderedDict()
+        self.score = score
+        # Entries (score, tick, key). Every use pushes a new entry so
+        # entries of items that have been used or removed since are
+        # outdated and simply skipped once they reach the top.
+        self.heap = []
+        # Number of accesses per kind.
+        self.hits = {}
+        self.compressed_hits = {}
+        self.fails = {}
+
+    def push(self, key, item):
+        """
+        Add the current state of an item to the heap.
+        """
+        if self.score is None:
+            return
+        heapq.heappush(self.heap, (self.score(item), item[5], key))
+        # Drop outdated entries once they dominate the heap.
+        if len(self.heap) > 2 * len(self.items) + 64:
+            self.heap = [(self.score(_v), _v[5], _k)
+                         for _k, _v in self.items.items()]
+            heapq.heapify(self.heap)
+
+    def lowest(self):
+        """
+        ``(score, tick, key)`` of the item to evict first or ``None`` if the
+        stripe is empty.
+        """
+        if self.score is None:
+            if not self.items:
+                return None
+            key = next(iter(self.items))
+            tick = self.items[key][5]
+            return (tick, tick, key)
+        heap = self.heap
+        while heap:
+            _, tick, key = heap[0]
+            item = self.items.get(key)
+            if item is not None and item[5] == tick:
+                return heap[0]
+            heapq.heappop(heap)
+        return None
+
+    def record_access(self, kind, hit):
+        if hit == "compressed":
+            stats = self.compressed_hits
+        elif hit:
+            stats = self.hits
+        else:
+            stats = self.fails
+        stats[kind] = stats.get(kind, 0) + 1
+
+
+class CacheManager(object):
+    """
+    Memory-limited cache shared by any number of :class:`Buffer` objects.
+
+    All buffers attached to the same manager share a single memory budget.
+    Memory use and hit rates are also tracked per kind of buffer (e.g.
+    ``"strain"`` and ``"displacement"``).
+
+    Supported eviction policies:
+
+    * ``"lru"``: Remove the least recently used items first.
+    * ``"lfu"``: Remove the least frequently used items first. Ties are
+      broken by recency.
+    * ``"cost"``: Remove the items that are cheapest to recompute per byte
+      first. The cost of an item is the time it took to read and compute it
+      as passed to :meth:`add`, weighted by the number of times it has
+      been used.
+
+    With ``compressed_size_in_mb`` evicted items are compressed and kept in
+    a second, compressed tier of that size before they are finally dropped
+    in least recently used order. Decompressing an item is much faster
+    than reading it from disc again. Items found in the compressed tier are
+    moved back to the uncompressed one.
+
+    The uncompressed items are spread over ``stripes`` parts by the hash of
+    their keys, each with its own lock, so threads accessing different
+    items rarely wait for each other. See the module documentation for
+    details.
+
+    :param max_size_in_mb: The memory budget in MB.
+    :type max_size_in_mb: float
+    :param policy: The eviction policy.
+    :type policy: str
+    :param compressed_size_in_mb: The memory budget of the compressed tier
+        in MB. Disabled if ``0``.
+    :type compressed_size_in_mb: float
+    :param compression_level: The zlib compression level.
+    :type compression_level: int
+    :param mantissa_bits: If given, only this many bits of the mantissa of
+        floating point arrays are kept in the compressed tier. The relative
+        error of each value is then below ``2 ** -mantissa_bits`` and the
+        data compresses much better. Lossless by default.
+    :type mantissa_bits: int
+    :param stripes: The number of independently locked parts of the
+        uncompressed tier.
+    :type stripes: int
+    """
+    POLICIES = ("lru", "lfu", "cost")
+
+    def __init__(self, max_size_in_mb=100, policy="lru",
+                 compressed_size_in_mb=0, compression_level=1,
+                 mantissa_bits=None, stripes=16):
+        if policy not in self.POLICIES:
+            raise ValueError("Unknown cache policy '%s'. Available: %s" % (
+                policy, ", ".join(self.POLICIES)))
+        if mantissa_bits is not None and mantissa_bits < 1:
+            raise ValueError("mantissa_bits must be at least 1.")
+        if stripes < 1:
+            raise ValueError("stripes must be at least 1.")
+        self._max_size_in_bytes = max_size_in_mb * 1024 ** 2
+        self.policy = policy
+        self._stripes = [
+            _Stripe(score=None if policy == "lru" else self._score)
+            for _ in range(stripes)]
+        # Every use of an item stamps it with the next tick so the recency
+        # of items in different stripes can be compared. Calling next() on
+        # it is atomic in CPython.
+        self._clock = itertools.count()
+        # Guards the sizes below.
+        self._size_lock = threading.Lock()
+        self._total_size = 0
+        self._namespace_sizes = {}
+        self._kind_sizes = {}
+        # Only one thread evicts at a time.
+        self._evict_lock = threading.Lock()
+
+        self._max_compressed_size_in_bytes = compressed_size_in_mb * 1024 ** 2
+        self.compression_level = compression_level
+        self.mantissa_bits = mantissa_bits
+        # Guards the compressed tier.
+        self._compressed_lock = threading.Lock()
+        self._compressed_size = 0
+        # Maps keys to [compressed, nbytes, kind, hits, cost,
+        # uncompressed nbytes].
+        self._compressed = OrderedDict()
+
+    @property
+    def compression_enabled(self):
+        return self._max_compressed_size_in_bytes > 0
+
+    def _stripe(self, key):
+        return self._stripes[hash(key) % len(self._stripes)]
+
+    def __contains__(self, key):
+        return self.tier(key) is not None
+
+    def __len__(self):
+        n = 0
+        for stripe in self._stripes:
+            with stripe.lock:
+                n += len(stripe.items)
+        return n
+
+    def keys(self, namespace=None):
+        """
+        The keys of all items, least recently used first. Items in the
+        compressed tier come before the uncompressed ones.
+        """
+        with self._compressed_lock:
+            keys = [_k for _k in self._compressed
+                    if namespace is None or _k[0] == namespace]
+        items = []
+        for stripe in self._stripes:
+            with stripe.lock:
+                items.extend((_v[5], _k) for _k, _v in stripe.items.items()
+                             if namespace is None or _k[0] == namespace)
+        return keys + [_i[1] for _i in sorted(items)]
+
+    def tier(self, key):
+        """
+        The tier an item is stored in: ``"uncompressed"``, ``"compressed"``,
+        or ``None`` if it is not cached.
+        """
+        stripe = self._stripe(key)
+        with stripe.lock:
+            if key in stripe.items:
+                return "uncompressed"
+        with self._compressed_lock:
+            if key in self._compressed:
+                return "compressed"
+        return None
+
+    def record_access(self, kind, hit, key=None):
+        """
+        Record a buffer hit or miss for the statistics of a kind.
+
+        :param hit: ``True``, ``False``, or the tier of the hit as returned
+            by :meth:`tier`.
+        :param key: The key of the accessed item. Only used to pick the
+            stripe the access is recorded in.
+        """
+        stripe = self._stripe(key)
+        with stripe.lock:
+            stripe.record_access(kind, hit)
+
+    def get(self, key):
+        """
+        Return an item and mark it as used.
+        """
+        stripe = self._stripe(key)
+        with stripe.lock:
+            if key in stripe.items:
+                return self._touch(stripe, key)
+        item = self._pop_compressed(key)
+        if item is None:
+            raise KeyError(key)
+        return self._restore(key, item)
+
+    def lookup(self, key, kind="default"):
+        """
+        Atomically return an item and mark it as used or return ``None`` if
+        it is not cached. Counts towards the statistics of the kind.
+        """
+        return self._lookup(key, kind)[0]
+
+    def _lookup(self, key, kind):
+        """
+        :meth:`lookup` that also returns the tier the item was found in.
+        """
+        stripe = self._stripe(key)
+        with stripe.lock:
+            if key in stripe.items:
+                stripe.record_access(kind, True)
+                return self._touch(stripe, key), "uncompressed"
+        item = self._pop_compressed(key) if self.compression_enabled \
+            else None
+        tier = "compressed" if item is not None else None
+        with stripe.lock:
+            stripe.record_access(kind, tier or False)
+        if item is None:
+            return None, None
+        return self._restore(key, item), tier
+
+    def _restore(self, key, item):
+        """
+        Decompress an item removed from the compressed tier and move it
+        back to the uncompressed one.
+        """
+        value = _decompress(item[0])
+        self.add(key, value, kind=item[2], cost=item[4], _hits=item[3] + 1)
+        return value
+
+    def _touch(self, stripe, key):
+        item = stripe.items.pop(key)
+        item[3] += 1
+        item[5] = next(self._clock)
+        stripe.items[key] = item
+        stripe.push(key, item)
+        return item[0]
+
+    def add(self, key, value, kind="default", cost=None, _hits=0):
+        """
+        Add an item and evict others until the memory budget is satisfied.
+
+        :param key: The key. Must be a tuple whose first item identifies
+            the buffer the item belongs to.
+        :param value: The array or an iterable of arrays to store.
+        :param kind: The kind of data for the accounting.
+        :param cost: The cost to recreate the item, e.g. the time in seconds
+            it took to read and compute it.
+        """
+        nbytes = _get_nbytes(value)
+        stripe = self._stripe(key)
+        with stripe.lock:
+            old = stripe.items.pop(key, None)
+            item = [value, nbytes, kind, _hits, float(cost or 0.0),
+                    next(self._clock)]
+            stripe.items[key] = item
+            stripe.push(key, item)
+            with self._size_lock:
+                if old is not None:
+                    self._account(key, old[2], -old[1])
+                self._account(key, kind, nbytes)
+            self._pop_compressed(key)
+
+        evicted = self._evict()
+        if self.compression_enabled:
+            for evicted_key, item in evicted:
+                self._add_compressed(evicted_key, item)
+
+    def _account(self, key, kind, nbytes):
+        self._total_size += nbytes
+        self._namespace_sizes[key[0]] = \
+            self._namespace_sizes.get(key[0], 0) + nbytes
+        self._kind_sizes[kind] = self._kind_sizes.get(kind, 0) + nbytes
+
+    def _over_budget(self):
+        with self._size_lock:
+            return self._total_size > self._max_size_in_bytes
+
+    def _evict(self):
+        """
+        Evict items until the memory budget is satisfied.
+
+        Each stripe knows its item to evict first: the head of its ordered
+        items for LRU, the top of its heap otherwise. The lowest of them is
+        evicted, so choosing an item only costs a look at every stripe. An
+        item used in the mean time is not evicted and the choice repeated.
+
+        :returns: A list of ``(key, item)`` tuples of the evicted items.
+        """
+        evicted = []
+        if not self._over_budget():
+            return evicted
+        with self._evict_lock:
+            while self._over_budget():
+                lowest = None
+                for stripe in self._stripes:
+                    with stripe.lock:
+                        candidate = stripe.lowest()
+                    # Ties are broken by recency.
+                    if candidate is not None and (
+                            lowest is None or candidate[:2] < lowest[:2]):
+                        lowest = candidate
+                if lowest is None:  # pragma: no cover
+                    break
+                item = self._remove(lowest[2], lowest[1])
+                if item is not None:
+                    evicted.append((lowest[2], item))
+        return evicted
+
+    def _score(self, item):
+        """
+        Items with the lowest score are evicted first.
+        """
+        if self.policy == "lfu":
+            return item[3]
+        elif self.policy == "cost":
+            return item[4] * (1 + item[3]) / max(item[1], 1)
+        return item[5]
+
+    def _remove(self, key, tick=None):
+        """
+        Remove an uncompressed item unless it has been used since ``tick``.
+
+        :returns: The removed item or ``None``.
+        """
+        stripe = self._stripe(key)
+        with stripe.lock:
+            item = stripe.items.get(key)
+            if item is None or (tick is not None and item[5] != tick):
+                return None
+            del stripe.items[key]
+            with self._size_lock:
+                self._account(key, item[2], -item[1])
+        return item
+
+    def _add_compressed(self, key, item):
+        """
+        Compress an evicted item and add it to the compressed tier.
+        """
+        compressed, nbytes = _compress(
+            item[0], level=self.compression_level,
+            mantissa_bits=self.mantissa_bits)
+        if nbytes > self._max_compressed_size_in_bytes:
+            return
+        stripe = self._stripe(key)
+        with stripe.lock:
+            # Might have been added again in the mean time.
+            if key in stripe.items:
+                return
+            with self._compressed_lock:
+                self._remove_compressed(key)
+                self._compressed[key] = [compressed, nbytes, item[2],
+                                         item[3], item[4], item[1]]
+                self._compressed_size += nbytes
+                while self._compressed_size > \
+                        self._max_compressed_size_in_bytes:
+                    self._remove_compressed(next(iter(self._compressed)))
+
+    def _pop_compressed(self, key):
+        with self._compressed_lock:
+            return self._remove_compressed(key)
+
+    def _remove_compressed(self, key):
+        item = self._compressed.pop(key, None)
+        if item is not None:
+            self._compressed_size -= item[1]
+        return item
+
+    def clear(self, namespace=None):
+        """
+        Remove all items or only the ones of a single buffer.
+        """
+        for stripe in self._stripes:
+            with stripe.lock:
+                for key in list(stripe.items.keys()):
+                    if namespace is None or key[0] == namespace:
+                        item = stripe.items.pop(key)
+                        with self._size_lock:
+                            self._account(key, item[2], -item[1])
+                if namespace is None:
+                    stripe.heap = []
+        with self._compressed_lock:
+            for key in list(self._compressed.keys()):
+                if namespace is None or key[0] == namespace:
+                    self._remove_compressed(key)
+
+    def get_size_mb(self, namespace=None):
+        with self._size_lock:
+            if namespace is None:
+                size = self._total_size
+            else:
+                size = self._namespace_sizes.get(namespace, 0)
+        return float(size) / 1024 ** 2
+
+    def get_compressed_size_mb(self, namespace=None):
+        return float(self._get_compressed_sizes(namespace)[0]) / 1024 ** 2
+
+    def _get_compressed_sizes(self, namespace=None):
+        """
+        Compressed and uncompressed size of the items in the compressed
+        tier.
+        """
+        with self._compressed_lock:
+            items = [_v for _k, _v in self._compressed.items()
+                     if namespace is None or _k[0] == namespace]
+        return (sum(_i[1] for _i in items), sum(_i[5] for _i in items))
+
+    def get_compression_ratio(self, namespace=None):
+        """
+        Uncompressed size of all items in the compressed tier divided by
+        their compressed size.
+        """
+        compressed, uncompressed = self._get_compressed_sizes(namespace)
+        return float(uncompressed) / compressed if compressed else 0.0
+
+    def get_statistics(self):
+        """
+        Memory use and hit rates per kind of buffer.
+
+        ``"hits"`` are the hits in the uncompressed tier,
+        ``"compressed_hits"`` the ones in the compressed tier, and
+        ``"efficiency"`` is the hit rate of both tiers together. The
+        ``"compression_ratio"`` is the uncompressed size of all items in
+        the compressed tier divided by their compressed size.
+        """
+        hits = {}
+        compressed_hits = {}
+        fails = {}
+        items = {}
+        for stripe in self._stripes:
+            with stripe.lock:
+                for total, counts in ((hits, stripe.hits),
+                                      (compressed_hits,
+                                       stripe.compressed_hits),
+                                      (fails, stripe.fails)):
+                    for kind, n in counts.items():
+                        total[kind] = total.get(kind, 0) + n
+                for item in stripe.items.values():
+                    items[item[2]] = items.get(item[2], 0) + 1
+        with self._size_lock:
+            kind_sizes = dict(self._kind_sizes)
+        with self._compressed_lock:
+            all_compressed = list(self._compressed.values())
+
+        stats = {}
+        for kind in set(kind_sizes) | set(hits) | set(fails) | \
+                set(compressed_hits):
+            n_hits = hits.get(kind, 0)
+            n_compressed_hits = compressed_hits.get(kind, 0)
+            n_fails = fails.get(kind, 0)
+            total = n_hits + n_compressed_hits + n_fails
+            compressed = [_i for _i in all_compressed if _i[2] == kind]
+            compressed_size = sum(_i[1] for _i in compressed)
+            stats[kind] = {
+                "size_in_mb": float(kind_sizes.get(kind, 0)) / 1024 ** 2,
+                "items": items.get(kind, 0),
+                "hits": n_hits,
+                "misses": n_fails,
+                "efficiency": float(n_hits + n_compressed_hits) / total
+                if total else 0.0,
+                "hit_rate": float(n_hits) / total if total else 0.0,
+                "compressed_size_in_mb": float(compressed_size) / 1024 ** 2,
+                "compressed_items": len(compressed),
+                "compressed_hits": n_compressed_hits,
+                "compressed_hit_rate": float(n_compressed_hits) / total
+                if total else 0.0,
+                "compression_ratio": float(sum(
+                    _i[5] for _i in compressed)) / compressed_size
+                if compressed_size else 0.0}
+        return stats
+
+
 class Buffer(object):
     """
     A simple memory-limited buffer with a dictionary-like interface.
     Implemented as a kind of priority queue where priority is highest for
     recently accessed items. Thus the "stalest" items are removed first once
     the memory limit it reached.
+
+    If a :class:`CacheManager` is passed, the buffer stores its items there
+    and shares the memory budget and eviction policy of the manager with all
+    other buffers attached to it - ``max_size_in_mb`` is ignored in that
+    case. This is also the only way to get a compressed tier.
     """
-    def __init__(self, max_size_in_mb=100):
-        self._max_size_in_bytes = max_size_in_mb * 1024 ** 2
-        self._total_size = 0
-        self._buffer = OrderedDict()
+    _namespace_counter = itertools.count()
+
+    def __init__(self, max_size_in_mb=100, manager=None, kind="default"):
+        if manager is None:
+            manager = CacheManager(max_size_in_mb=max_size_in_mb)
+        self._manager = manager
+        self._kind = kind
+        self._namespace = next(Buffer._namespace_counter)
         self._hits = 0
+        self._compressed_hits = 0
         self._fails = 0
+        # Only guards the statistics of this buffer.
+        self._lock = threading.Lock()
+
+    @property
+    def _total_size(self):
+        with self._manager._size_lock:
+            return self._manager._namespace_sizes.get(self._namespace, 0)
+
+    def _count(self, hit):
+        with self._lock:
+            if hit == "compressed":
+                self._compressed_hits += 1
+            elif hit:
+                self._hits += 1
+            else:
+                self._fails += 1
 
     def __contains__(self, key):
-        contains = key in self._buffer
-        if contains:
-            self._hits += 1
-        else:
-            self._fails += 1
-        return contains
+        key = (self._namespace, key)
+        tier = self._manager.tier(key)
+        self._count(tier)
+        self._manager.record_access(self._kind, tier, key=key)
+        return tier is not None
 
-    def get(self, key):
+    def lookup(self, key):
         """
         Return an item from the buffer and move it to the end, so it is removed
-        last.
+        last. Returns ``None`` if the item is not in the buffer.
+
+        Unlike the ``in`` operator followed by :meth:`get` this is safe when
+        the buffer is shared between threads.
         """
-        value = self._buffer.pop(key)
-        self._buffer[key] = value
+        value, tier = self._manager._lookup((self._namespace, key),
+                                            kind=self._kind)
+        self._count(tier or False)
         return value
 
-    def _get_nbytes(self, value):
-        # Works with single arrays and iterables of arrays.
-        try:
-            return value.nbytes
-        except Exception:
-            return sum(_i.nbytes for _i in value if _i is not None)
+    def get(self, key):
+        """
+        Return an item from the buffer and move it to the end, so it is removed
+        last.
+        """
+        return self._manager.get((self._namespace, key))
 
-    def add(self, key, value):
+    def add(self, key, value, cost=None):
         """
         Add an item to the buffer and make sure that the buffer does not exceed
         the maximum size in memory.
+
+        :param cost: Optional cost to recreate the item, only used by the
+            cost-aware eviction policy of the :class:`CacheManager`.
         """
-        self._buffer[key] = value
-        # Assuming value is a numpy array
-        self._total_size += self._get_nbytes(value)
+        self._manager.add((self._namespace, key), value, kind=self._kind,
+                          cost=cost)
 
-        # Remove existing values, until the size limit is fulfilled.
-        while self._total_size > self._max_size_in_bytes:
-            _, v = self._buffer.popitem(last=False)
-            self._total_size -= self._get_nbytes(v)
+    def clear(self):
+        self._manager.clear(namespace=self._namespace)
+
+    def keys(self):
+        """
+        The keys of all items in the buffer, least recently used first.
+        """
+        return [_k[1] for _k in self._manager.keys(namespace=self._namespace)]
 
     def get_size_mb(self):
-        return float(self._total_size) / 1024 ** 2
+        return self._manager.get_size_mb(namespace=self._namespace)
 
     @property
     def efficiency(self):
@@ -93,10 +741,34 @@ class Buffer(object):
         Return the fraction of calls to the __contains__() routine that
         returned True.
         """
-        if (self._hits + self._fails) == 0:
+        hits = self._hits + self._compressed_hits
+        if (hits + self._fails) == 0:
             return 0.0
         else:
-            return float(self._hits) / float(self._hits + self._fails)
+            return float(hits) / float(hits + self._fails)
+
+    def get_statistics(self):
+        """
+        Hit rates of both tiers, the memory use, and the compression ratio
+        of this buffer.
+        """
+        with self._lock:
+            hits = self._hits
+            compressed_hits = self._compressed_hits
+            fails = self._fails
+        total = hits + compressed_hits + fails
+        return {
+            "hits": hits,
+            "compressed_hits": compressed_hits,
+            "misses": fails,
+            "hit_rate": float(hits) / total if total else 0.0,
+            "compressed_hit_rate": float(compressed_hits) / total
+            if total else 0.0,
+            "size_in_mb": self.get_size_mb(),
+            "compressed_size_in_mb":
+                self._manager.get_compressed_size_mb(self._namespace),
+            "compression_ratio":
+                self._manager.get_compression_ratio(self._namespace)}
 
 
 def get_time_axis(ds, ndumps):
@@ -125,14 +797,61 @@ class Mesh(object):
 
     def __init__(self, filename, full_parse=False,
                  strain_buffer_size_in_mb=0, displ_buffer_size_in_mb=0,
-                 read_on_demand=True):
+                 read_on_demand=True, cache_manager=None):
         self.f = h5py.File(filename, "r")
         self.filename = filename
         self.read_on_demand = read_on_demand
+        # Held while reading the data of one element.
+        self.lock = threading.RLock()
+        self._io_time = threading.local()
         self._parse(full_parse=full_parse)
         self._find_time_axis()
-        self.strain_buffer = Buffer(strain_buffer_size_in_mb)
-        self.displ_buffer = Buffer(displ_buffer_size_in_mb)
+        self._find_merged_layout()
+        # With a cache manager the buffer sizes are ignored and all buffers
+        # share the budget of the manager.
+        self.strain_buffer = Buffer(strain_buffer_size_in_mb,
+                                    manager=cache_manager, kind="strain")
+        self.displ_buffer = Buffer(displ_buffer_size_in_mb,
+                                   manager=cache_manager, kind="displacement")
+
+    @contextlib.contextmanager
+    def reading(self):
+        """
+        Context manager holding the lock while reading the data of one
+        element. The time, including the time waiting for the lock, is added
+        to :attr:`io_time`.
+        """
+        start_time = timeit.default_timer()
+        with self.lock:
+            yield
+        self._io_time.value = self.io_time + \
+            timeit.default_timer() - start_time
+
+    @property
+    def io_time(self):
+        """
+        Total time in seconds the current thread spent reading elements.
+        """
+        return getattr(self._io_time, "value", 0.0)
+
+    def load_into_memory(self):
+        """
+        Replace all attributes still referring to datasets in the file by
+        arrays in memory.
+        """
+        for key, value in list(self.__dict__.items()):
+            if isinstance(value, h5py.Dataset):
+                setattr(self, key, value[:])
+
+    def reopen(self):
+        """
+        Open the file again, e.g. in a process forked after the mesh has been
+        opened. HDF5 file handles must not be shared between processes.
+
+        Call :meth:`load_into_memory` before forking - otherwise some
+        attributes still refer to the file opened in the parent process.
+        """
+        self.f = h5py.File(self.filename, "r")
 
     def _get_str_attr(self, name):
         attr = self.f.attrs[name]
@@ -143,6 +862,27 @@ class Mesh(object):
         except Exception:
             return attr
 
+    def _find_merged_layout(self):
+        """
+        Merged databases store each element either as ``(nvars, jpol, ipol,
+        npts)`` (layout ``"c"``) or as ``(nvars, ipol, jpol, npts)`` (layout
+        ``"fortran"``) which is ``(npts, jpol, ipol, nvars)`` in Fortran
+        order.
+        """
+        if "MergedSnapshots" not in self.f:
+            self.merged_layout = None
+            return
+        layout = self.f["MergedSnapshots"].attrs.get("layout", "c")
+        if isinstance(layout, np.ndarray):
+            layout = layout[0]
+        try:
+            layout = layout.decode()
+        except AttributeError:
+            pass
+        if layout not in ("c", "fortran"):  # pragma: no cover
+            raise NotImplementedError("Unknown layout '%s'." % layout)
+        self.merged_layout = layout
+
     def _find_time_axis(self):
         # Merged databases are always the same and don't have a Snapshots key.
         if "Snapshots" not in self.f:
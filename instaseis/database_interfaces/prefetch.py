@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Reading the data of elements ahead of their use on a background thread.
+
+If the elements needed for a number of source-receiver pairs are known in
+advance, e.g. for batches or finite sources, the next few elements can be
+read from the files while the strain and the interpolation of the current
+one are computed.
+
+:copyright:
+    The Instaseis Development Team (instaseis@googlegroups.com), 2026
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import threading
+
+
+class ElementPrefetcher(object):
+    """
+    Reads upcoming elements on a background thread.
+
+    The work is split into steps, e.g. one per element or source, and the
+    caller announces the step it is working on with :meth:`advance`. The
+    background thread reads the elements of at most ``depth`` steps ahead
+    and keeps the data until it is taken with :meth:`take` or the caller
+    moves past its step, so at most ``depth`` steps are held in memory.
+
+    :param read: Called on the background thread with the arguments of a
+        task. Returns the data or ``None`` if there is nothing to read,
+        e.g. because the element is already buffered.
+    :param tasks: ``(step, key, args)`` tuples ordered by step. Only the
+        first task of each key is read.
+    :param depth: The number of steps to read ahead.
+    :type depth: int
+    """
+    def __init__(self, read, tasks, depth=4):
+        if depth < 1:
+            raise ValueError("depth must be at least 1.")
+        self.depth = depth
+        self._read = read
+        self._tasks = []
+        self._steps = {}
+        for step, key, args in tasks:
+            if key in self._steps:
+                continue
+            self._steps[key] = step
+            self._tasks.append((step, key, args))
+        self._positions = dict((key, _i) for _i, (_, key, _) in
+                               enumerate(self._tasks))
+        self._data = {}
+        # Position of the next task to be read and step of the caller.
+        self._next = 0
+        self._step = None
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run,
+                                        name="ElementPrefetcher")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _in_window(self, step):
+        return self._step is not None and step < self._step + self.depth
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._closed and \
+                        self._next < len(self._tasks) and \
+                        not self._in_window(self._tasks[self._next][0]):
+                    self._condition.wait()
+                if self._closed or self._next >= len(self._tasks):
+                    return
+                step, key, args = self._tasks[self._next]
+                # The caller already moved past it.
+                if step < self._step:
+                    self._next += 1
+                    self._condition.notify_all()
+                    continue
+
+            try:
+                data = self._read(*args)
+            except Exception:
+                # The caller reads the element itself and gets the error
+                # there.
+                data = None
+
+            with self._condition:
+                if data is not None and step >= self._step:
+                    self._data[key] = data
+                self._next += 1
+                self._condition.notify_all()
+
+    def advance(self, step):
+        """
+        Announce the step the caller is working on. Data of earlier steps
+        that has not been taken is dropped.
+        """
+        with self._condition:
+            self._step = step
+            for key in [_k for _k in self._data if self._steps[_k] < step]:
+                del self._data[key]
+            self._condition.notify_all()
+
+    def take(self, key):
+        """
+        Take the data of an element, waiting for it if it is about to be
+        read.
+
+        :returns: The data or ``None`` if it has not been read ahead. The
+            caller has to read it itself in that case.
+        """
+        with self._condition:
+            position = self._positions.get(key)
+            if position is None:
+                return None
+            while not self._closed and key not in self._data and \
+                    self._next <= position and \
+                    self._in_window(self._tasks[position][0]):
+                self._condition.wait()
+            return self._data.pop(key, None)
+
+    def close(self):
+        """
+        Stop reading and drop all data.
+        """
+        with self._condition:
+            self._closed = True
+            self._data.clear()
+            self._condition.notify_all()
+        self._thread.join()
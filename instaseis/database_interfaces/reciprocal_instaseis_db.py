@@ -17,7 +17,8 @@ from __future__ import (absolute_import, division, print_function,
 import collections
 import numpy as np
 
-from .base_netcdf_instaseis_db import BaseNetCDFInstaseisDB
+from .base_netcdf_instaseis_db import (BaseNetCDFInstaseisDB,
+                                       _interpolate_strain_batch)
 from . import mesh
 from .. import rotations
 from ..source import Source, ForceSource
@@ -69,19 +70,22 @@ class ReciprocalInstaseisDB(BaseNetCDFInstaseisDB):
                 px_file, full_parse=True,
                 strain_buffer_size_in_mb=self.buffer_size_in_mb,
                 displ_buffer_size_in_mb=self.buffer_size_in_mb,
-                read_on_demand=self.read_on_demand)
+                read_on_demand=self.read_on_demand,
+                cache_manager=self.cache_manager)
             pz_m = mesh.Mesh(
                 pz_file, full_parse=False,
                 strain_buffer_size_in_mb=self.buffer_size_in_mb,
                 displ_buffer_size_in_mb=self.buffer_size_in_mb,
-                read_on_demand=self.read_on_demand)
+                read_on_demand=self.read_on_demand,
+                cache_manager=self.cache_manager)
             self.parsed_mesh = px_m
         elif x_exists:
             px_m = mesh.Mesh(
                 px_file, full_parse=True,
                 strain_buffer_size_in_mb=self.buffer_size_in_mb,
                 displ_buffer_size_in_mb=self.buffer_size_in_mb,
-                read_on_demand=self.read_on_demand)
+                read_on_demand=self.read_on_demand,
+                cache_manager=self.cache_manager)
             pz_m = None
             self.parsed_mesh = px_m
         elif z_exists:
@@ -90,7 +94,8 @@ class ReciprocalInstaseisDB(BaseNetCDFInstaseisDB):
                 pz_file, full_parse=True,
                 strain_buffer_size_in_mb=self.buffer_size_in_mb,
                 displ_buffer_size_in_mb=self.buffer_size_in_mb,
-                read_on_demand=self.read_on_demand)
+                read_on_demand=self.read_on_demand,
+                cache_manager=self.cache_manager)
             self.parsed_mesh = pz_m
         else:
             # Should not happen.
@@ -276,3 +281,60 @@ class ReciprocalInstaseisDB(BaseNetCDFInstaseisDB):
             raise NotImplementedError
 
         return data
+
+    def _get_element_reads(self, source, components):
+        kind = "strain" if isinstance(source, Source) else "displacement"
+        reads = []
+        if "Z" in components:
+            reads.append((self.meshes.pz, kind))
+        if any(comp in components for comp in ['N', 'E', 'R', 'T']):
+            reads.append((self.meshes.px, kind))
+        return reads
+
+    def _get_data_batch(self, sources, receivers, components, coordinates,
+                        element_infos):
+        # Only moment tensor sources in displ_only databases profit from
+        # processing the whole element at once.
+        if self.info.dump_type != "displ_only" or \
+                not all(isinstance(_i, Source) for _i in sources):
+            return BaseNetCDFInstaseisDB._get_data_batch(
+                self, sources=sources, receivers=receivers,
+                components=components, coordinates=coordinates,
+                element_infos=element_infos)
+
+        ei = element_infos[0]
+
+        if not self.read_on_demand:
+            mesh_mu = self.parsed_mesh.mesh_mu
+        else:
+            mesh_mu = self.parsed_mesh.f["Mesh"]["mesh_mu"]
+        npol = self.info.spatial_order
+        mu = mesh_mu[ei.gll_point_ids[npol // 2, npol // 2]]
+
+        if ei.axis:
+            G = self.parsed_mesh.G2  # NOQA
+            GT = self.parsed_mesh.G1T  # NOQA
+        else:
+            G = self.parsed_mesh.G2  # NOQA
+            GT = self.parsed_mesh.G2T  # NOQA
+
+        strains = {"Z": None, "X": None}
+        for name, m, requested in (
+                ("Z", self.meshes.pz, "Z" in components),
+                ("X", self.meshes.px, any(comp in components
+                                          for comp in ['N', 'E', 'R', 'T']))):
+            if not requested:
+                continue
+            strain = self._get_element_strain(
+                m, ei.id_elem, ei.gll_point_ids, G, GT, ei.col_points_xi,
+                ei.col_points_eta, ei.corner_points, ei.eltype, ei.axis)
+            strains[name] = _interpolate_strain_batch(
+                strain, ei.col_points_xi, ei.col_points_eta,
+                [_i.xi for _i in element_infos],
+                [_i.eta for _i in element_infos],
+                flip_sign=m.excitation_type != "monopole", dtype=self.dtype)
+
+        return self._contract_moment_tensors(
+            sources=sources, receivers=receivers, components=components,
+            coordinates=coordinates, mu=mu, strain_x=strains["X"],
+            strain_z=strains["Z"])
@@ -16,8 +16,13 @@ from __future__ import (absolute_import, division, print_function,
 
 import collections
 import numpy as np
+import timeit
 
-from .base_netcdf_instaseis_db import BaseNetCDFInstaseisDB
+from .base_netcdf_instaseis_db import (BaseNetCDFInstaseisDB,
+                                       _get_vertical_utemp,
+                                       _interpolate_strain,
+                                       _interpolate_strain_batch,
+                                       _reorder_merged_utemp)
 from . import mesh
 from .. import rotations, sem_derivatives, spectral_basis
 from ..source import Source, ForceSource
@@ -60,7 +65,8 @@ class ReciprocalMergedInstaseisDB(BaseNetCDFInstaseisDB):
             filename, full_parse=True,
             strain_buffer_size_in_mb=self.buffer_size_in_mb,
             displ_buffer_size_in_mb=self.buffer_size_in_mb,
-            read_on_demand=self.read_on_demand))
+            read_on_demand=self.read_on_demand,
+            cache_manager=self.cache_manager))
         self.parsed_mesh = self.meshes.merged
 
         self._is_reciprocal = True
@@ -223,122 +229,214 @@ class ReciprocalMergedInstaseisDB(BaseNetCDFInstaseisDB):
 
         return data
 
-    def _get_and_reorder_utemp(self, id_elem):
-        # We can now read it in a single go!
-        utemp = self.meshes.merged.f["MergedSnapshots"][id_elem]
+    def _get_data_batch(self, sources, receivers, components, coordinates,
+                        element_infos):
+        # Only moment tensor sources profit from processing the whole
+        # element at once.
+        if self.info.dump_type != "displ_only" or \
+                not all(isinstance(_i, Source) for _i in sources):
+            return BaseNetCDFInstaseisDB._get_data_batch(
+                self, sources=sources, receivers=receivers,
+                components=components, coordinates=coordinates,
+                element_infos=element_infos)
 
-        # utemp is currently (nvars, jpol, ipol, npts)
-        # 1. Roll to (npts, nvar, jpol, ipol)
-        utemp = np.rollaxis(utemp, 3, 0)
-        # 2. Roll to (npts, jpol, nvar, ipol)
-        utemp = np.rollaxis(utemp, 2, 1)
-        # 3. Roll to (npts, jpol, ipol, nvar)
-        utemp = np.rollaxis(utemp, 3, 2)
+        ei = element_infos[0]
 
-        return utemp
+        if not self.read_on_demand:
+            mesh_mu = self.parsed_mesh.mesh_mu
+        else:
+            mesh_mu = self.parsed_mesh.f["Mesh"]["mesh_mu"]
+        npol = self.info.spatial_order
+        mu = mesh_mu[ei.gll_point_ids[npol // 2, npol // 2]]
+
+        if ei.axis:
+            G = self.parsed_mesh.G2  # NOQA
+            GT = self.parsed_mesh.G1T  # NOQA
+        else:
+            G = self.parsed_mesh.G2  # NOQA
+            GT = self.parsed_mesh.G2T  # NOQA
+
+        strain_x, strain_z = self._get_element_strain(
+            ei.id_elem, G, GT, ei.col_points_xi, ei.col_points_eta,
+            ei.corner_points, ei.eltype, ei.axis)
+
+        xi = [_i.xi for _i in element_infos]
+        eta = [_i.eta for _i in element_infos]
+        if strain_x is not None:
+            strain_x = _interpolate_strain_batch(
+                strain_x, ei.col_points_xi, ei.col_points_eta, xi, eta,
+                flip_sign=True, dtype=self.dtype)
+        if strain_z is not None:
+            strain_z = _interpolate_strain_batch(
+                strain_z, ei.col_points_xi, ei.col_points_eta, xi, eta,
+                flip_sign=False, dtype=self.dtype)
+
+        return self._contract_moment_tensors(
+            sources=sources, receivers=receivers, components=components,
+            coordinates=coordinates, mu=mu, strain_x=strain_x,
+            strain_z=strain_z)
+
+    def _get_element_reads(self, source, components):
+        kind = "strain" if isinstance(source, Source) else "displacement"
+        return [(self.meshes.merged, kind)]
+
+    def _read_element_data(self, mesh, kind, id_elem, gll_point_ids):
+        # We can now read it in a single go!
+        with mesh.reading():
+            utemp = mesh.f["MergedSnapshots"][id_elem]
+        # Reordered and converted once here so every buffer hit can be
+        # used as it is.
+        return _reorder_merged_utemp(utemp, mesh.merged_layout,
+                                     dtype=self.dtype)
+
+    def _get_and_reorder_utemp(self, id_elem, kind="displacement"):
+        return self._load_element_data(self.meshes.merged, kind, id_elem,
+                                       None)
 
     def _get_strain_interp(  # NOQA
             self, id_elem, gll_point_ids, G, GT, col_points_xi, col_points_eta,
             corner_points, eltype, axis, xi, eta):
-        mesh = self.meshes.merged
-        if id_elem not in mesh.strain_buffer:
-            utemp = self._get_and_reorder_utemp(id_elem)
+        strain_x, strain_z = self._get_element_strain(
+            id_elem, G, GT, col_points_xi, col_points_eta, corner_points,
+            eltype, axis)
+
+        if strain_x is not None:
+            strain_x = _interpolate_strain(
+                strain_x, col_points_xi, col_points_eta, xi, eta,
+                flip_sign=True, dtype=self.dtype)
+        if strain_z is not None:
+            strain_z = _interpolate_strain(
+                strain_z, col_points_xi, col_points_eta, xi, eta,
+                flip_sign=False, dtype=self.dtype)
+
+        return strain_x, strain_z
+
+    def _get_element_strain(self, id_elem, G, GT, col_points_xi,  # NOQA
+                            col_points_eta, corner_points, eltype, axis):
+        """
+        Get the strain of the horizontal and the vertical component at all
+        GLL points of an element. Either one might be ``None`` if not
+        available in the database.
 
-            strain_fct_map = {
-                "monopole": sem_derivatives.strain_monopole_td,
-                "dipole": sem_derivatives.strain_dipole_td,
-                "quadpole": sem_derivatives.strain_quadpole_td}
-
-            # We want the cache to work - thus we always have to
-            # calculate both! Also I/O is the slow part here.
-
-            # Horizontal component is available if we have 3 or 5 components.
-            if utemp.shape[-1] >= 3:
-                utemp_x = utemp[:, :, :, :3]
-                utemp_x = np.require(utemp_x, requirements=["F"],
-                                     dtype=np.float64)
-                strain_x = strain_fct_map["dipole"](
-                    utemp_x, G, GT, col_points_xi, col_points_eta,
-                    mesh.npol, mesh.ndumps, corner_points, eltype, axis)
-            else:
-                strain_x = None
-
-            # Vertical component is available if we have 2 or 5 components.
-            if utemp.shape[-1] in (2, 5):
-                # Vertical expects disp_s at index 0 and disp_z at index 2.
-                # Expand if only vertical.
-                _s = list(utemp.shape)
-                if _s[-1] == 2:
-                    _s[-1] = 3
-                    utemp_new = np.zeros(_s, dtype=utemp.dtype)
-                    utemp_new[:, :, :, 0] = utemp[:, :, :, 0]
-                    utemp_new[:, :, :, 2] = utemp[:, :, :, 1]
-                    utemp_z = utemp_new
-                # Reform all others.
-                else:
-                    utemp_z = utemp[:, :, :, -3:]
-                    utemp_z[:, :, :, 0] = utemp_z[:, :, :, 1]
-                    utemp_z[:, :, :, 1][:] = 0
-                    utemp_z = np.require(utemp_z, requirements=["F"],
-                                         dtype=np.float64)
-
-                strain_z = strain_fct_map["monopole"](
-                    utemp_z, G, GT, col_points_xi, col_points_eta,
-                    mesh.npol, mesh.ndumps, corner_points, eltype, axis)
+        The strain is taken from the buffer, the on-disc strain cache, or
+        computed from the displacement, in that order.
+        """
+        mesh = self.meshes.merged
+        strain = mesh.strain_buffer.lookup(id_elem)
+        if strain is None:
+            start_time = timeit.default_timer()
+            io_start = mesh.io_time
+            nvars = mesh.f["MergedSnapshots"].shape[1]
+            has_x = nvars >= 3
+            has_z = nvars in (2, 5)
+            shape = (mesh.ndumps, mesh.npol + 1, mesh.npol + 1, 6)
+            disk_cache = self._get_disk_strain_cache(
+                mesh=mesh, shapes=[shape] * (int(has_x) + int(has_z)))
+
+            cached = None
+            if disk_cache is not None:
+                cached = disk_cache.get(id_elem)
+            if cached is not None:
+                strain_x = cached.pop(0) if has_x else None
+                strain_z = cached.pop(0) if has_z else None
             else:
-                strain_z = None
-
-            mesh.strain_buffer.add(id_elem, (strain_x, strain_z))
+                strain_x, strain_z = self._compute_element_strain(
+                    id_elem, G, GT, col_points_xi, col_points_eta,
+                    corner_points, eltype, axis)
+                if disk_cache is not None:
+                    disk_cache.add(id_elem, [_i for _i in (strain_x, strain_z)
+                                             if _i is not None])
+
+            mesh.strain_buffer.add(
+                id_elem, (strain_x, strain_z),
+                cost=timeit.default_timer() - start_time)
+            self._record_access(mesh, "strain", id_elem,
+                                (strain_x, strain_z), start_time=start_time,
+                                io_start=io_start)
         else:
-            strain_x, strain_z = mesh.strain_buffer.get(id_elem)
-
-        all_strains = {}
-        for name, strain in (("strain_x", strain_x), ("strain_z", strain_z)):
-            if strain is None:
-                all_strains[name] = None
-                continue
-            final_strain = np.empty((strain.shape[0], 6), order="F")
+            strain_x, strain_z = strain
+            if self.access_recorder is not None:
+                self._record_access(mesh, "strain", id_elem, strain)
 
-            for i in range(6):
-                final_strain[:, i] = spectral_basis.lagrange_interpol_2D_td(
-                    col_points_xi, col_points_eta, strain[:, :, :, i], xi, eta)
+        return strain_x, strain_z
 
-            if not name == "strain_z":
-                final_strain[:, 3] *= -1.0
-                final_strain[:, 5] *= -1.0
-
-            all_strains[name] = final_strain
-
-        return all_strains["strain_x"], all_strains["strain_z"]
+    def _compute_element_strain(self, id_elem, G, GT, col_points_xi,  # NOQA
+                                col_points_eta, corner_points, eltype, axis):
+        """
+        Read the displacement of an element and compute the strain of the
+        horizontal and the vertical component at all its GLL points.
+        """
+        mesh = self.meshes.merged
+        return _compute_merged_strain(
+            self._get_and_reorder_utemp(id_elem, kind="strain"), G, GT,
+            col_points_xi,
+            col_points_eta, mesh.npol, mesh.ndumps, corner_points, eltype,
+            axis, dtype=self.dtype)
 
     def _get_displacement(self, id_elem, gll_point_ids,
                           col_points_xi, col_points_eta, xi, eta):
         mesh = self.meshes.merged
-        if id_elem not in mesh.displ_buffer:
+        utemp = mesh.displ_buffer.lookup(id_elem)
+        if utemp is None:
+            start_time = timeit.default_timer()
+            io_start = mesh.io_time
             utemp = self._get_and_reorder_utemp(id_elem)
-            mesh.displ_buffer.add(id_elem, utemp)
-        else:
-            utemp = mesh.displ_buffer.get(id_elem)
-
-        final_displacement_x = np.empty((utemp.shape[0], 3), order="F")
-        utemp_x = utemp[:, :, :, :3]
-        utemp_x = np.require(utemp_x, requirements=["F"],
-                             dtype=np.float64)
-        for i in range(3):
-            final_displacement_x[:, i] = \
-                spectral_basis.lagrange_interpol_2D_td(
-                    col_points_xi, col_points_eta,
-                    utemp_x[:, :, :, i], xi, eta)
-
-        utemp_z = utemp[:, :, :, -3:]
-        utemp_z[:, :, :, 0] = utemp_z[:, :, :, 1]
-        utemp_z[:, :, :, 1][:] = 0
-        utemp_z = np.require(utemp_z, requirements=["F"], dtype=np.float64)
-        final_displacement_z = np.empty((utemp.shape[0], 3), order="F")
-        for i in range(3):
-            final_displacement_z[:, i] = \
-                spectral_basis.lagrange_interpol_2D_td(
-                    col_points_xi, col_points_eta,
-                    utemp_z[:, :, :, i], xi, eta)
+            mesh.displ_buffer.add(
+                id_elem, utemp,
+                cost=timeit.default_timer() - start_time)
+            self._record_access(mesh, "displacement", id_elem, utemp,
+                                start_time=start_time, io_start=io_start)
+        elif self.access_recorder is not None:
+            self._record_access(mesh, "displacement", id_elem, utemp)
+
+        final_displacement_x = spectral_basis.lagrange_interpol_2D_td_multi(
+            col_points_xi, col_points_eta, utemp[:, :, :, :3], [xi], [eta],
+            dtype=self.dtype)[:, :, 0]
+
+        utemp_z = _get_vertical_utemp(utemp, dtype=self.dtype)
+        final_displacement_z = spectral_basis.lagrange_interpol_2D_td_multi(
+            col_points_xi, col_points_eta, utemp_z, [xi], [eta],
+            dtype=self.dtype)[:, :, 0]
 
         return final_displacement_x, final_displacement_z
+
+
+def _compute_merged_strain(utemp, G, GT, col_points_xi,  # NOQA
+                           col_points_eta, npol, ndumps, corner_points,
+                           eltype, axis, dtype=np.float64):
+    """
+    Compute the strain of the horizontal and the vertical component at all
+    GLL points of an element from its reordered merged displacement. Either
+    one is ``None`` if not available.
+
+    :param dtype: The precision of the strain computation.
+    """
+    strain_fct_map = {
+        "monopole": sem_derivatives.strain_monopole_td,
+        "dipole": sem_derivatives.strain_dipole_td,
+        "quadpole": sem_derivatives.strain_quadpole_td}
+
+    # We want the cache to work - thus we always have to
+    # calculate both! Also I/O is the slow part here.
+
+    # Horizontal component is available if we have 3 or 5 components.
+    if utemp.shape[-1] >= 3:
+        utemp_x = utemp[:, :, :, :3]
+        utemp_x = np.require(utemp_x, requirements=["F"], dtype=dtype)
+        strain_x = strain_fct_map["dipole"](
+            utemp_x, G, GT, col_points_xi, col_points_eta,
+            npol, ndumps, corner_points, eltype, axis, dtype=dtype)
+    else:
+        strain_x = None
+
+    # Vertical component is available if we have 2 or 5 components.
+    if utemp.shape[-1] in (2, 5):
+        # Vertical expects disp_s at index 0 and disp_z at index 2.
+        utemp_z = _get_vertical_utemp(utemp, dtype=dtype)
+        strain_z = strain_fct_map["monopole"](
+            utemp_z, G, GT, col_points_xi, col_points_eta,
+            npol, ndumps, corner_points, eltype, axis, dtype=dtype)
+    else:
+        strain_z = None
+
+    return strain_x, strain_z
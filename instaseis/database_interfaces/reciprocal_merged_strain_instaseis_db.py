@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Reciprocal merged Instaseis database with precomputed strain.
+
+Created with ``python -m instaseis.scripts.repack_db --method strain``. In
+addition to the ``/MergedSnapshots`` array of a normal merged database, the
+file contains a ``/MergedStrain`` array with the strain at all GLL points of
+every element, so the strain no longer has to be computed from the
+displacement during the seismogram extraction.
+
+:copyright:
+    The Instaseis Development Team (instaseis@googlegroups.com), 2026
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import numpy as np
+
+from .reciprocal_merged_instaseis_db import ReciprocalMergedInstaseisDB
+
+
+class ReciprocalMergedStrainInstaseisDB(ReciprocalMergedInstaseisDB):
+    """
+    Reciprocal merged Instaseis database with precomputed strain.
+    """
+    def _compute_element_strain(self, id_elem, G, GT, col_points_xi,  # NOQA
+                                col_points_eta, corner_points, eltype, axis):
+        """
+        Read the precomputed strain of the horizontal and the vertical
+        component at all GLL points of an element.
+        """
+        return self._load_element_data(self.meshes.merged, "strain",
+                                       id_elem, None)
+
+    def _read_element_data(self, mesh, kind, id_elem, gll_point_ids):
+        if kind != "strain":
+            return ReciprocalMergedInstaseisDB._read_element_data(
+                self, mesh, kind, id_elem, gll_point_ids)
+        nvars = mesh.f["MergedSnapshots"].shape[1]
+        with mesh.reading():
+            data = mesh.f["MergedStrain"][id_elem]
+        return unpack_strain(data, has_x=nvars >= 3, has_z=nvars in (2, 5),
+                             dtype=self.dtype)
+
+    def _get_disk_strain_cache(self, mesh, shapes):
+        # Reading the strain from the database is as fast as reading it
+        # from the cache.
+        return None
+
+
+def pack_strain(strain_x, strain_z):
+    """
+    Pack the strain of an element to the layout of the ``/MergedStrain``
+    array.
+
+    :param strain_x: The strain of the horizontal component with the shape
+        ``(npts, npol + 1, npol + 1, 6)`` or ``None``.
+    :param strain_z: The strain of the vertical component or ``None``.
+    :returns: Array with the shape ``(6 * ncomps, jpol, ipol, npts)``.
+    """
+    return np.concatenate([np.transpose(_i, (3, 1, 2, 0))
+                           for _i in (strain_x, strain_z) if _i is not None])
+
+
+def unpack_strain(data, has_x, has_z, dtype=np.float64):
+    """
+    Inverse of :func:`pack_strain`.
+
+    :param dtype: The data type of the returned strain.
+
+    :returns: ``(strain_x, strain_z)``, either one might be ``None``.
+    """
+    strains = []
+    for _i in range(data.shape[0] // 6):
+        strains.append(np.require(
+            np.transpose(data[_i * 6:(_i + 1) * 6], (3, 1, 2, 0)),
+            dtype=dtype, requirements=["F"]))
+    strain_x = strains.pop(0) if has_x else None
+    strain_z = strains.pop(0) if has_z else None
+    return strain_x, strain_z
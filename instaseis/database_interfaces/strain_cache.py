@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Persistent on-disc cache of the strain computed from the displacement of
+``displ_only`` databases.
+
+Computing the strain at all GLL points of an element is expensive and the
+in-memory buffers lose it on eviction or when the process ends. This cache
+stores the strain of each element in a fixed-size slot of a memory mapped
+file so it survives restarts and can be shared by all processes on a
+machine.
+
+Files per cached mesh, all prefixed by ``strain_cache_<identity>``:
+
+* ``.dat``: The slots with the flattened arrays of one element each.
+* ``_index.npy``: Maps element ids to slots, ``-1`` if not cached.
+* ``_owners.npy``: Maps slots to element ids. The last item is the slot
+  that will be used next - slots are reused in a ring once the cache is
+  full.
+
+:copyright:
+    The Instaseis Development Team (instaseis@googlegroups.com), 2026
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import hashlib
+import os
+import threading
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+from .element_index import _mesh_fingerprint
+
+
+class _FileLock(object):
+    """
+    Exclusive lock between processes. Does nothing on systems without
+    ``fcntl``.
+
+    The lock file is opened anew every time as locks are bound to the open
+    file and would otherwise be shared by forked processes.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self._fh = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self._fh = open(self.filename, "a")
+            fcntl.flock(self._fh.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *args):
+        if self._fh is not None:
+            fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+            self._fh.close()
+            self._fh = None
+
+
+class DiskStrainCache(object):
+    """
+    Memory mapped on-disc cache of per-element arrays with a size limit.
+
+    Each item is a list of arrays with fixed shapes and a common data type.
+    Once the cache is full, the least recently added items are replaced.
+
+    :param cache_dir: The directory to store the cache files in.
+    :type cache_dir: str
+    :param mesh_filename: The file of the mesh. Used to identify the
+        database - a changed file will not use an outdated cache.
+    :type mesh_filename: str
+    :param n_elements: The number of elements in the mesh.
+    :type n_elements: int
+    :param shapes: The shapes of the arrays of each item.
+    :type shapes: list of tuple
+    :param dtype: The data type of the arrays.
+    :type dtype: :class:`numpy.dtype`
+    :param max_size_in_mb: The maximum size of the data file in MB.
+    :type max_size_in_mb: float
+    """
+    VERSION = 1
+
+    def __init__(self, cache_dir, mesh_filename, n_elements, shapes,
+                 dtype=np.float64, max_size_in_mb=1000):
+        self.shapes = [tuple(int(_j) for _j in _i) for _i in shapes]
+        self.dtype = np.dtype(dtype)
+        self._sizes = [int(np.prod(_i)) for _i in self.shapes]
+        self.slot_size = sum(self._sizes)
+        self.n_elements = int(n_elements)
+        self.n_slots = int(max_size_in_mb * 1024 ** 2 //
+                           (self.slot_size * self.dtype.itemsize))
+        self._hits = 0
+        self._fails = 0
+        self._lock = threading.Lock()
+
+        identity = hashlib.md5(("%s-%i-%s-%i-%s" % (
+            _mesh_fingerprint(mesh_filename), self.VERSION,
+            str(self.shapes), self.n_elements,
+            self.dtype.str)).encode()).hexdigest()
+        prefix = os.path.join(cache_dir, "strain_cache_%s" % identity)
+        self.filename = prefix + ".dat"
+
+        if self.n_slots < 1:
+            self._data = None
+            return
+
+        if not os.path.exists(cache_dir):
+            try:
+                os.makedirs(cache_dir)
+            except OSError:  # pragma: no cover
+                # Might have been created by another process in the mean
+                # time.
+                if not os.path.isdir(cache_dir):
+                    raise
+
+        self._file_lock = _FileLock(prefix + ".lock")
+        with self._file_lock:
+            self._open(prefix)
+
+    def _open(self, prefix):
+        index_filename = prefix + "_index.npy"
+        owners_filename = prefix + "_owners.npy"
+        data_shape = (self.n_slots, self.slot_size)
+
+        try:
+            index = np.lib.format.open_memmap(index_filename, mode="r+")
+            owners = np.lib.format.open_memmap(owners_filename, mode="r+")
+            data = np.memmap(self.filename, dtype=self.dtype, mode="r+")
+            if index.shape != (self.n_elements,) or \
+                    owners.shape != (self.n_slots + 1,) or \
+                    data.size != self.n_slots * self.slot_size:
+                raise ValueError
+            data = data.reshape(data_shape)
+        except Exception:
+            # Does not yet exist or has a different size - start from
+            # scratch.
+            index = np.lib.format.open_memmap(
+                index_filename, mode="w+", dtype=np.int64,
+                shape=(self.n_elements,))
+            index[:] = -1
+            owners = np.lib.format.open_memmap(
+                owners_filename, mode="w+", dtype=np.int64,
+                shape=(self.n_slots + 1,))
+            owners[:] = -1
+            owners[-1] = 0
+            data = np.memmap(self.filename, dtype=self.dtype, mode="w+",
+                             shape=data_shape)
+
+        self._index = index
+        self._owners = owners
+        self._data = data
+
+    @property
+    def enabled(self):
+        return self._data is not None
+
+    def __len__(self):
+        if not self.enabled:
+            return 0
+        return int((self._owners[:-1] >= 0).sum())
+
+    def get(self, id_elem):
+        """
+        Return a list with copies of the arrays of an element or ``None`` if
+        it is not cached.
+        """
+        id_elem = int(id_elem)
+        if not self.enabled:
+            self._fails += 1
+            return None
+        slot = int(self._index[id_elem])
+        if slot < 0:
+            self._fails += 1
+            return None
+        data = np.array(self._data[slot])
+        # Another process might have reused the slot while copying. It
+        # always invalidates the index before writing new data.
+        if self._index[id_elem] != slot or self._owners[slot] != id_elem:
+            self._fails += 1
+            return None
+        self._hits += 1
+
+        arrays = []
+        start = 0
+        for shape, size in zip(self.shapes, self._sizes):
+            arrays.append(data[start:start + size].reshape(shape))
+            start += size
+        return arrays
+
+    def add(self, id_elem, arrays):
+        """
+        Store the arrays of an element.
+        """
+        if not self.enabled:
+            return
+        id_elem = int(id_elem)
+        if [_i.shape for _i in arrays] != self.shapes:
+            raise ValueError("Expected arrays with shapes %s." %
+                             str(self.shapes))
+
+        with self._lock, self._file_lock:
+            if self._index[id_elem] >= 0:
+                return
+            slot = int(self._owners[-1])
+            # Invalidate the previous owner first so it can never be read
+            # with partially written data.
+            previous = self._owners[slot]
+            if previous >= 0:
+                self._index[previous] = -1
+            self._owners[slot] = -1
+
+            start = 0
+            for array, size in zip(arrays, self._sizes):
+                self._data[slot, start:start + size] = array.ravel()
+                start += size
+
+            self._owners[slot] = id_elem
+            self._index[id_elem] = slot
+            self._owners[-1] = (slot + 1) % self.n_slots
+
+    def flush(self):
+        """
+        Write all changes to disc.
+        """
+        if self.enabled:
+            self._data.flush()
+            self._index.flush()
+            self._owners.flush()
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._fails
+
+    @property
+    def efficiency(self):
+        """
+        Return the fraction of calls to the get() routine that returned an
+        item.
+        """
+        if (self._hits + self._fails) == 0:
+            return 0.0
+        else:
+            return float(self._hits) / float(self._hits + self._fails)
@@ -163,6 +163,34 @@ def io_chunker(arr):
     return idx
 
 
+def plan_reads(ids, max_gap=0):
+    """
+    Plan reading the items with the given indices from an array in as few
+    contiguous ranges as possible.
+
+    Neighbouring indices with at most ``max_gap`` unneeded items between
+    them are read in one range.
+
+    :param ids: The indices, in any order.
+    :param max_gap: The largest gap to read over.
+    :returns: ``(ranges, positions)`` with ``ranges`` a list of
+        ``(start, stop)`` tuples in ascending order and ``positions`` the
+        position of each index in the concatenation of all ranges.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    if not len(ids):
+        return [], np.empty(0, dtype=np.int64)
+    s_ids = np.unique(ids)
+    breaks = np.where(np.diff(s_ids) > max_gap + 1)[0] + 1
+    starts = s_ids[np.concatenate([[0], breaks])]
+    stops = s_ids[np.concatenate([breaks - 1, [len(s_ids) - 1]])] + 1
+    offsets = np.concatenate([[0], np.cumsum(stops - starts)[:-1]])
+
+    r = np.searchsorted(starts, ids, side="right") - 1
+    positions = offsets[r] + ids - starts[r]
+    return [(int(_a), int(_b)) for _a, _b in zip(starts, stops)], positions
+
+
 def rfftfreq(n, d=1.0):  # pragma: no cover
     """
     Polyfill for numpy's rfftfreq() for numpy versions that don't have it.
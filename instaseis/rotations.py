@@ -199,6 +199,169 @@ def rotate_vector_xyz_src_to_xyz_rec(vec, srclon, srccolat, reclon, reccolat):
     return np.dot(rotmat, vec)
 
 
+def _voigt_to_matrix_array(mt):
+    """
+    Convert N symmetric tensors in voigt notation with shape (N, 6) to an
+    array of matrices of shape (N, 3, 3).
+    """
+    mt = np.asarray(mt)
+    A = np.empty((mt.shape[0], 3, 3), dtype=mt.dtype)  # NOQA
+    for (i, j), k in zip(((0, 0), (1, 1), (2, 2), (1, 2), (0, 2), (0, 1)),
+                         range(6)):
+        A[:, i, j] = mt[:, k]
+        A[:, j, i] = mt[:, k]
+    return A
+
+
+def _matrix_to_voigt_array(B):  # NOQA
+    return np.array([B[:, 0, 0], B[:, 1, 1], B[:, 2, 2],
+                     B[:, 1, 2], B[:, 0, 2], B[:, 0, 1]]).T
+
+
+def _rotation_matrix_array(phi, theta):
+    """
+    Rotation matrices from TNM 2007 eq 14 for arrays of phi and theta with
+    the shape (N, 3, 3).
+    """
+    ct = np.cos(theta)
+    cp = np.cos(phi)
+    st = np.sin(theta)
+    sp = np.sin(phi)
+
+    R = np.empty((len(phi), 3, 3), dtype=np.float64)  # NOQA
+    R[:, 0, 0] = ct * cp
+    R[:, 0, 1] = -sp
+    R[:, 0, 2] = st * cp
+    R[:, 1, 0] = ct * sp
+    R[:, 1, 1] = cp
+    R[:, 1, 2] = st * sp
+    R[:, 2, 0] = -st
+    R[:, 2, 1] = 0.0
+    R[:, 2, 2] = ct
+    return R
+
+
+def rotate_frame_rd_array(x, y, z, phi, theta):
+    """
+    Array version of :func:`rotate_frame_rd`. All arguments can be arrays of
+    the same length N, the results are three arrays of length N.
+    """
+    x, y, z, phi, theta = np.broadcast_arrays(
+        *[np.asarray(_i, dtype=np.float64) for _i in (x, y, z, phi, theta)])
+    phi = np.deg2rad(phi)
+    theta = np.deg2rad(theta)
+    # first rotation (longitude)
+    xp_cp = x * np.cos(phi) + y * np.sin(phi)
+    yp_cp = -x * np.sin(phi) + y * np.cos(phi)
+    zp_cp = z
+
+    # second rotation (colat)
+    xp = xp_cp * np.cos(theta) - zp_cp * np.sin(theta)
+    yp = yp_cp
+    zp = xp_cp * np.sin(theta) + zp_cp * np.cos(theta)
+
+    srd = np.sqrt(xp ** 2 + yp ** 2)
+    zrd = zp
+    phi_cp = np.arctan2(yp, xp)
+    phird = np.where(phi_cp < 0.0, 2.0 * np.pi + phi_cp, phi_cp)
+    return srd, phird, zrd
+
+
+def rotate_symm_tensor_voigt_xyz_earth_to_xyz_src_array(mt, phi, theta):
+    """
+    Array version of :func:`rotate_symm_tensor_voigt_xyz_earth_to_xyz_src`.
+
+    :param mt: N tensors in voigt notation with shape (N, 6).
+    :param phi: N longitudes in radian.
+    :param theta: N colatitudes in radian.
+    :returns: The rotated tensors with shape (N, 6).
+    """
+    # Same as in the scalar version: quad precision for stability.
+    A = np.require(_voigt_to_matrix_array(mt), dtype=np.float128)  # NOQA
+    R = np.require(_rotation_matrix_array(  # NOQA
+        np.atleast_1d(phi), np.atleast_1d(theta)), dtype=np.float128)
+
+    B = np.matmul(np.matmul(R.transpose(0, 2, 1), A), R)  # NOQA
+
+    return np.require(_matrix_to_voigt_array(B), dtype=np.float64)
+
+
+def rotate_symm_tensor_voigt_xyz_src_to_xyz_earth_array(mt, phi, theta):
+    """
+    Array version of :func:`rotate_symm_tensor_voigt_xyz_src_to_xyz_earth`.
+
+    :param mt: N tensors in voigt notation with shape (N, 6).
+    :param phi: N longitudes in radian.
+    :param theta: N colatitudes in radian.
+    :returns: The rotated tensors with shape (N, 6).
+    """
+    A = _voigt_to_matrix_array(mt)  # NOQA
+    R = _rotation_matrix_array(np.atleast_1d(phi),  # NOQA
+                               np.atleast_1d(theta))
+
+    B = np.matmul(np.matmul(R, A), R.transpose(0, 2, 1))  # NOQA
+    return _matrix_to_voigt_array(B)
+
+
+def rotate_symm_tensor_voigt_xyz_to_src_array(mt, phi):
+    """
+    Array version of :func:`rotate_symm_tensor_voigt_xyz_to_src`.
+
+    :param mt: N tensors in voigt notation with shape (N, 6).
+    :param phi: N angles in radian.
+    :returns: The rotated tensors with shape (N, 6).
+    """
+    mt = np.asarray(mt, dtype=np.float64)
+    cp = np.cos(phi)
+    sp = np.sin(phi)
+    cp2 = cp ** 2
+    sp2 = sp ** 2
+    cs = cp * sp
+
+    # Explicit form of R.A.Rt with R a rotation around the z axis.
+    return np.array([
+        cp2 * mt[:, 0] + sp2 * mt[:, 1] + 2 * cs * mt[:, 5],
+        sp2 * mt[:, 0] + cp2 * mt[:, 1] - 2 * cs * mt[:, 5],
+        mt[:, 2],
+        -sp * mt[:, 4] + cp * mt[:, 3],
+        cp * mt[:, 4] + sp * mt[:, 3],
+        cs * (mt[:, 1] - mt[:, 0]) + (cp2 - sp2) * mt[:, 5]]).T
+
+
+def rotate_vector_xyz_earth_to_xyz_src_array(vec, phi, theta):
+    """
+    Array version of :func:`rotate_vector_xyz_earth_to_xyz_src` for N
+    vectors with shape (N, 3).
+    """
+    return rotate_vector_xyz_earth_to_xyz_src(np.asarray(vec).T,
+                                              phi, theta).T
+
+
+def rotate_vector_xyz_src_to_xyz_earth_array(vec, phi, theta):
+    """
+    Array version of :func:`rotate_vector_xyz_src_to_xyz_earth` for N
+    vectors with shape (N, 3).
+    """
+    return rotate_vector_xyz_src_to_xyz_earth(np.asarray(vec).T,
+                                              phi, theta).T
+
+
+def rotate_vector_xyz_to_src_array(vec, phi):
+    """
+    Array version of :func:`rotate_vector_xyz_to_src` for N vectors with
+    shape (N, 3).
+    """
+    return rotate_vector_xyz_to_src(np.asarray(vec).T, phi).T
+
+
+def rotate_vector_src_to_xyz_array(vec, phi):
+    """
+    Array version of :func:`rotate_vector_src_to_xyz` for N vectors with
+    shape (N, 3).
+    """
+    return rotate_vector_src_to_xyz(np.asarray(vec).T, phi).T
+
+
 def coord_transform_lat_lon_depth_to_xyz(latitude, longitude, depth_in_m,
                                          planet_radius=6371e3):
     """
@@ -3,7 +3,8 @@
 """
 Repacking Instaseis databases.
 
-Requires click, netCDF4, and numpy.
+Requires click, netCDF4, and numpy. The ``strain`` method additionally
+requires h5py.
 
 :copyright:
     Lion Krischer (krischer@geophysik.uni-muenchen.de), 2016
@@ -11,10 +12,15 @@ Requires click, netCDF4, and numpy.
     GNU Lesser General Public License, Version 3 [non-commercial/academic use]
     (http://www.gnu.org/copyleft/lgpl.html)
 """
+import collections
 import contextlib
+import json
 import math
+import multiprocessing
 import os
 import sys
+import timeit
+import zlib
 
 import click
 import netCDF4
@@ -30,34 +36,232 @@ else:
 
 __netcdf_version = tuple(int(i) for i in netCDF4.__version__.split("."))
 
+# Approximate size of the blocks of elements merged at once.
+BLOCK_SIZE_IN_MB = 64
+# Approximate size of the blocks copied at once when repacking a file.
+COPY_SIZE_IN_MB = 8
+
 
 @contextlib.contextmanager
 def dummy_progressbar(iterator, *args, **kwargs):
     yield iterator
 
 
+def _checksum(data):
+    return zlib.crc32(np.ascontiguousarray(np.ma.getdata(data)).tobytes()) \
+        & 0xffffffff
+
+
+class RepackCheckpoint(object):
+    """
+    Sidecar file next to an output file that records all completed blocks
+    so an interrupted repacking run can be resumed.
+
+    The file is written with the description of the run in its first line
+    before the output file is created and is only ever appended to
+    afterwards. Each following line records a completed block with the
+    checksum of its data. A block that has been interrupted while being
+    recorded cannot be parsed or does not match its checksum and is simply
+    written again. The last line of a successful run marks it as complete
+    and the checkpoint is kept so the output can still be verified.
+
+    :param output_filename: The output file of the run.
+    :param input_filenames: All input files of the run.
+    :param options: All options that influence the output.
+    """
+    def __init__(self, output_filename, input_filenames, options):
+        self.filename = output_filename + ".checkpoint"
+        self.header = {
+            "inputs": [[os.path.abspath(_i), os.path.getsize(_i),
+                        os.path.getmtime(_i)]
+                       for _i in sorted(input_filenames)],
+            "options": options}
+        self.setup_done = False
+        self.complete = False
+        self.blocks = {}
+        # Whether or not an existing checkpoint belongs to the same run.
+        self.matches = True
+
+        if not os.path.exists(self.filename):
+            return
+
+        with open(self.filename, "r") as fh:
+            lines = fh.read().splitlines()
+        if not lines or json.loads(lines[0]) != \
+                json.loads(json.dumps(self.header)):
+            self.matches = False
+            return
+        for line in lines[1:]:
+            items = line.split()
+            if items == ["setup"]:
+                self.setup_done = True
+                continue
+            if items == ["complete"]:
+                self.complete = True
+                continue
+            try:
+                name, axis, start, stop, checksum = items
+                self.blocks[(name, int(axis), int(start), int(stop))] = \
+                    int(checksum)
+            except ValueError:
+                continue
+
+    @property
+    def exists(self):
+        return os.path.exists(self.filename)
+
+    def _write(self, line, mode="a"):
+        with open(self.filename, mode) as fh:
+            fh.write(line + "\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+
+    def begin(self):
+        """
+        Start a new run. Must be called before the output file is created.
+        """
+        self._write(json.dumps(self.header), mode="w")
+        self.setup_done = False
+        self.complete = False
+        self.blocks = {}
+        self.matches = True
+
+    def mark_setup_done(self):
+        """
+        Record that everything but the blocks has been written.
+        """
+        self._write("setup")
+        self.setup_done = True
+
+    def mark_complete(self):
+        """
+        Record that the output has been completely written and verified.
+        """
+        self._write("complete")
+        self.complete = True
+
+    def add(self, name, axis, start, stop, data):
+        """
+        Record a written block.
+
+        :param name: The full path of the variable.
+        :param axis: The axis of the variable the block is a slice of.
+        :param data: The written data.
+        """
+        checksum = _checksum(data)
+        self._write("%s %i %i %i %i" % (name, axis, start, stop, checksum))
+        self.blocks[(name, axis, start, stop)] = checksum
+
+    def is_complete(self, variable, name, axis, start, stop):
+        """
+        Whether or not a block has been recorded and still has the recorded
+        checksum in the output file.
+        """
+        key = (name, axis, start, stop)
+        if key not in self.blocks:
+            return False
+        return _checksum(_read_slice(variable, axis, start, stop)) == \
+            self.blocks[key]
+
+    def verify(self, output_filename):
+        """
+        Compare the checksums of all recorded blocks with the data in the
+        output file.
+        """
+        corrupt = []
+        with netCDF4.Dataset(output_filename, "r", format="NETCDF4") as f:
+            for (name, axis, start, stop), checksum in \
+                    sorted(self.blocks.items()):
+                variable = f
+                for _i in name.strip("/").split("/"):
+                    variable = variable[_i]
+                data = _read_slice(variable, axis, start, stop)
+                if _checksum(data) != checksum:
+                    corrupt.append("%s[%i:%i]" % (name, start, stop))
+        if corrupt:
+            raise ValueError("Checksum mismatch for: %s. Run again with "
+                             "`--resume` to rewrite them." %
+                             ", ".join(corrupt))
+
+
+def _read_slice(variable, axis, start, stop):
+    index = [slice(None)] * len(variable.shape)
+    index[axis] = slice(start, stop)
+    return variable[tuple(index)]
+
+
 def repack_file(input_filename, output_filename, contiguous,
-                compression_level, transpose, quiet=False):
+                compression_level, transpose, quiet=False, resume=False):
     """
     Transposes all data in the "/Snapshots" group.
 
     :param input_filename: The input filename.
     :param output_filename: The output filename.
+    :param resume: Resume an interrupted run.
     """
     assert os.path.exists(input_filename)
-    assert not os.path.exists(output_filename)
+
+    checkpoint = RepackCheckpoint(
+        output_filename=output_filename, input_filenames=[input_filename],
+        options={"contiguous": contiguous, "transpose": transpose,
+                 "compression_level": compression_level})
+    mode = _get_output_mode(output_filename, checkpoint, resume)
+    if mode is None:
+        if not quiet:
+            click.echo(click.style("\tAlready complete.", fg="blue"))
+        return
 
     with netCDF4.Dataset(input_filename, "r", format="NETCDF4") as f_in, \
-            netCDF4.Dataset(output_filename, "w", format="NETCDF4") as f_out:
+            netCDF4.Dataset(output_filename, mode, format="NETCDF4") as f_out:
         recursive_copy(src=f_in, dst=f_out, contiguous=contiguous,
                        compression_level=compression_level, quiet=quiet,
-                       transpose=transpose)
+                       transpose=transpose, checkpoint=checkpoint)
 
+    checkpoint.verify(output_filename)
+    checkpoint.mark_complete()
 
-def recursive_copy(src, dst, contiguous, compression_level, transpose, quiet):
+
+def _get_output_mode(output_filename, checkpoint, resume):
+    """
+    Mode to open the output file with - only existing files with a
+    checkpoint can be resumed. ``None`` if the file is already complete and
+    still verifies.
+
+    The checkpoint is started before a new output file is created so every
+    output file written by this script has one.
+    """
+    if not os.path.exists(output_filename):
+        checkpoint.begin()
+        return "w"
+    if not resume:
+        raise ValueError("Output file '%s' already exists." % output_filename)
+    if not checkpoint.exists:
+        raise ValueError("Output file '%s' has no checkpoint file so it can "
+                         "neither be resumed nor verified. Remove it and run "
+                         "again." % output_filename)
+    if not checkpoint.matches:
+        raise ValueError("Checkpoint file '%s' belongs to a different run." %
+                         checkpoint.filename)
+    if checkpoint.complete:
+        checkpoint.verify(output_filename)
+        return None
+    if not checkpoint.setup_done and not checkpoint.blocks:
+        # Interrupted before anything has been recorded - the output might
+        # not even be a valid file.
+        checkpoint.begin()
+        return "w"
+    return "a"
+
+
+def recursive_copy(src, dst, contiguous, compression_level, transpose, quiet,
+                   checkpoint=None):
     """
     Recursively copy the whole file and transpose the all /Snapshots
     variables while at it..
+
+    Existing dimensions and variables are reused so an interrupted copy can
+    be resumed - blocks of the snapshots recorded in the checkpoint are
+    skipped.
     """
     if src.path == "/Seismograms":
         return
@@ -86,6 +290,8 @@ def recursive_copy(src, dst, contiguous, compression_level, transpose, quiet):
         items = list(reversed(items))
 
     for name, dimension in items:
+        if name in dst.dimensions:
+            continue
         dst.createDimension(name, len(
             dimension) if not dimension.isunlimited() else None)
 
@@ -128,9 +334,13 @@ def recursive_copy(src, dst, contiguous, compression_level, transpose, quiet):
         if is_snap and transpose:
             dimensions = list(reversed(dimensions))
 
-        x = dst.createVariable(name, variable.datatype, dimensions,
-                               chunksizes=chunksizes, contiguous=contiguous,
-                               zlib=zlib, complevel=compression_level)
+        if name in dst.variables:
+            x = dst.variables[name]
+        else:
+            x = dst.createVariable(name, variable.datatype, dimensions,
+                                   chunksizes=chunksizes,
+                                   contiguous=contiguous, zlib=zlib,
+                                   complevel=compression_level)
         # Non-snapshots variables are just copied in a single go.
         if not is_snap or not name.startswith("disp_"):
             if not quiet:
@@ -149,7 +359,7 @@ def recursive_copy(src, dst, contiguous, compression_level, transpose, quiet):
 
             # Copy around 8 Megabytes at a time. This seems to be the
             # sweet spot at least on my laptop.
-            factor = int((8 * 1024 * 1024 / 4) / npts)
+            factor = max(int((COPY_SIZE_IN_MB * 1024 * 1024 / 4) / npts), 1)
             s = int(math.ceil(num_elems / float(factor)))
 
             if quiet:
@@ -157,29 +367,46 @@ def recursive_copy(src, dst, contiguous, compression_level, transpose, quiet):
             else:
                 pbar = click.progressbar
 
+            # The axis of the elements in the output.
+            if transpose:
+                axis = 0 if time_axis == 0 else 1
+            else:
+                axis = 1 if time_axis == 0 else 0
+            path = "%s/%s" % (src.path.rstrip("/"), name)
+
             with pbar(range(s), length=s, label="\t  ") as idx:
                 for _i in idx:
-                    _s = slice(_i * factor, _i * factor + factor)
+                    start = _i * factor
+                    stop = min(start + factor, num_elems)
+                    if checkpoint is not None and checkpoint.is_complete(
+                            variable=dst.variables[x.name], name=path,
+                            axis=axis, start=start, stop=stop):
+                        continue
+                    _s = slice(start, stop)
+                    if time_axis == 0:
+                        data = src.variables[x.name][:, _s]
+                    else:
+                        data = src.variables[x.name][_s, :]
                     if transpose:
-                        if time_axis == 0:
-                            dst.variables[x.name][_s, :] = \
-                                src.variables[x.name][:, _s].T
-                        else:
-                            dst.variables[x.name][:, _s] = \
-                                src.variables[x.name][_s, :].T
+                        data = data.T
+                    if axis == 0:
+                        dst.variables[x.name][_s, :] = data
                     else:
-                        if time_axis == 0:
-                            dst.variables[x.name][:, _s] = \
-                                src.variables[x.name][:, _s]
-                        else:
-                            dst.variables[x.name][_s, :] = \
-                                src.variables[x.name][_s, :]
+                        dst.variables[x.name][:, _s] = data
+                    if checkpoint is not None:
+                        # Make sure the data is on disc before recording it.
+                        dst.sync()
+                        checkpoint.add(name=path, axis=axis, start=start,
+                                       stop=stop, data=data)
 
     for src_group in src.groups.values():
-        dst_group = dst.createGroup(src_group.name)
+        if src_group.name in dst.groups:
+            dst_group = dst.groups[src_group.name]
+        else:
+            dst_group = dst.createGroup(src_group.name)
         recursive_copy(src=src_group, dst=dst_group, contiguous=contiguous,
                        compression_level=compression_level, quiet=quiet,
-                       transpose=transpose)
+                       transpose=transpose, checkpoint=checkpoint)
 
 
 def recursive_copy_no_snapshots_no_seismograms_no_surface(
@@ -244,11 +471,23 @@ def recursive_copy_no_snapshots_no_seismograms_no_surface(
 
 
 def merge_files(filenames, output_folder, contiguous, compression_level,
-                quiet):
+                quiet, strain_dtype=None, processes=1, resume=False,
+                layout="c"):
     """
     Completely unroll and merge both files to a single database.
+
+    :param strain_dtype: If given, also precompute the strain of all
+        elements and store it with this dtype. Only possible for reciprocal
+        databases.
+    :param processes: The number of processes reading the input files.
+    :param resume: Resume an interrupted run.
+    :param layout: The layout of each element in the file. ``"c"`` stores
+        it as ``(nvars, jpol, ipol, npts)``, ``"fortran"`` as ``(nvars,
+        ipol, jpol, npts)`` which can be passed to the Fortran routines
+        without reordering it first.
     """
     assert len(filenames) in (1, 2, 4)
+    assert layout in ("c", "fortran")
 
     files = {}
     for file in filenames:
@@ -262,18 +501,38 @@ def merge_files(filenames, output_folder, contiguous, compression_level,
     keys = sorted(files.keys())
     assert (keys == ["PX"]) or (keys == ["PZ"]) or (keys == ["PX", "PZ"]) or \
         (keys == ["MXX_P_MYY", "MXY_MXX_M_MYY", "MXZ_MYZ", "MZZ"])
+    if strain_dtype is not None and "PX" not in keys and "PZ" not in keys:
+        raise ValueError("The strain can only be precomputed for reciprocal "
+                         "databases.")
 
     output = os.path.join(output_folder, "merged_output.nc4")
-    assert not os.path.exists(output)
+    checkpoint = RepackCheckpoint(
+        output_filename=output, input_filenames=list(files.values()),
+        options={"contiguous": contiguous, "strain_dtype": strain_dtype,
+                 "compression_level": compression_level, "layout": layout})
+    mode = _get_output_mode(output, checkpoint, resume)
+    if mode is None:
+        if not quiet:
+            click.echo(click.style("\tAlready complete.", fg="blue"))
+        return
+
+    # Start the workers before opening any file so they do not inherit
+    # open HDF5 handles.
+    pool = multiprocessing.Pool(processes) if processes > 1 else None
 
     input_files = {}
     try:
         for key, value in files.items():
             input_files[key] = netCDF4.Dataset(value, "r", format="NETCDF4")
-        out = netCDF4.Dataset(output, "w", format="NETCDF4")
+        out = netCDF4.Dataset(output, mode, format="NETCDF4")
         _merge_files(input=input_files, out=out, contiguous=contiguous,
-                     compression_level=compression_level, quiet=quiet)
+                     compression_level=compression_level, quiet=quiet,
+                     filenames=files, pool=pool, processes=processes,
+                     checkpoint=checkpoint, layout=layout)
     finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
         for filename in input_files.values():
             try:
                 filename.close()
@@ -284,10 +543,208 @@ def merge_files(filenames, output_folder, contiguous, compression_level,
         except Exception:
             pass
 
+    checkpoint.verify(output)
 
-def _merge_files(input, out, contiguous, compression_level, quiet):
-    # First copy everything non-snapshot related.
+    if strain_dtype is not None:
+        add_strain(filename=output, dtype=strain_dtype,
+                   contiguous=contiguous,
+                   compression_level=compression_level, quiet=quiet)
+
+    checkpoint.mark_complete()
+
+
+def add_strain(filename, dtype, contiguous, compression_level, quiet):
+    """
+    Compute the strain at all GLL points of every element of a merged
+    reciprocal database and store it in the "/MergedStrain" array.
+    """
+    # Imported here as h5py must not be imported before netCDF4 if both
+    # come with their own HDF5 library. netCDF4 does not support float16
+    # so the array is written with h5py.
+    import h5py
+    from instaseis.database_interfaces.base_netcdf_instaseis_db import \
+        _reorder_merged_utemp
+    from instaseis.database_interfaces.reciprocal_merged_instaseis_db \
+        import _compute_merged_strain
+    from instaseis.database_interfaces.reciprocal_merged_strain_instaseis_db \
+        import pack_strain
+
+    with h5py.File(filename, "r+") as f:
+        npol = f.attrs["npol"][0]
+        ndumps = f.attrs["number of strain dumps"][0]
+
+        mesh = f["Mesh"]
+        gll_points = mesh["gll"][:]
+        glj_points = mesh["glj"][:]
+        G1 = mesh["G1"][:].T  # NOQA
+        G2 = mesh["G2"][:].T  # NOQA
+        G1T = np.require(G1.transpose(), requirements=["F_CONTIGUOUS"])  # NOQA
+        G2T = np.require(G2.transpose(), requirements=["F_CONTIGUOUS"])  # NOQA
+        fem_mesh = mesh["fem_mesh"][:]
+        eltypes = mesh["eltype"][:]
+        axes = mesh["axis"][:]
+        mesh_S = mesh["mesh_S"][:]
+        mesh_Z = mesh["mesh_Z"][:]
+
+        displ = f["MergedSnapshots"]
+        layout = displ.attrs.get("layout", "c")
+        if not isinstance(layout, str_type):
+            layout = layout[0]
+        if isinstance(layout, bytes):
+            layout = layout.decode()
+        nelem, nvars = displ.shape[:2]
+        ncomps = int(nvars >= 3) + int(nvars in (2, 5))
+        shape = (nelem, 6 * ncomps, npol + 1, npol + 1, ndumps)
+
+        if contiguous:
+            kwargs = {}
+        else:
+            # Each chunk is exactly the data from one element.
+            kwargs = {"chunks": (1,) + shape[1:], "compression": "gzip",
+                      "compression_opts": compression_level}
+
+        # Might exist from an interrupted run.
+        if "MergedStrain" in f:
+            del f["MergedStrain"]
+        strain = f.create_dataset("MergedStrain", shape=shape, dtype=dtype,
+                                  **kwargs)
+
+        if not quiet:
+            click.echo(click.style("\tCreating '/MergedStrain'...",
+                                   fg="blue"))
+            pbar = click.progressbar
+        else:
+            pbar = dummy_progressbar
+
+        corner_points = np.empty((4, 2), dtype=np.float64)
+        with pbar(range(nelem), length=nelem, label="\t  ") as indices:
+            for elem_id in indices:
+                axis = bool(axes[elem_id])
+                if axis:
+                    G, GT, col_points_xi = G2, G1T, glj_points  # NOQA
+                else:
+                    G, GT, col_points_xi = G2, G2T, gll_points  # NOQA
+                corner_point_ids = fem_mesh[elem_id][:4]
+                corner_points[:, 0] = mesh_S[corner_point_ids]
+                corner_points[:, 1] = mesh_Z[corner_point_ids]
+
+                strain_x, strain_z = _compute_merged_strain(
+                    _reorder_merged_utemp(displ[elem_id], layout), G, GT,
+                    col_points_xi,
+                    gll_points, npol, ndumps, corner_points,
+                    eltypes[elem_id], axis)
+                strain[elem_id] = pack_strain(strain_x, strain_z)
+
+
+def _merge_files(input, out, contiguous, compression_level, quiet,
+                 filenames=None, pool=None, processes=1, checkpoint=None,
+                 layout="c"):
     c_db = list(input.values())[0]
+
+    # Get all the snapshots from the other databases.
+    variables = _get_merged_variables(input)
+    meshes = [input[key]["Snapshots"][name] for key, name in variables]
+
+    time_axis = np.argmin(meshes[0].shape)
+
+    dtype = meshes[0].dtype
+
+    nelem = c_db.getncattr("nelem_kwf_global")
+
+    # We also re-sort the elements to follow the traversal of a kd-tree in
+    # the same fashion instaseis uses it - this should allow for even faster
+    # I/O for spatially adjacent elements.
+
+    # Get the midpoints for each element.
+    s_mp = c_db["Mesh"]["mp_mesh_S"][:]
+    z_mp = c_db["Mesh"]["mp_mesh_Z"][:]
+
+    # Fill kd-tree.
+    midpoints = np.empty((s_mp.shape[0], 2), dtype=s_mp.dtype)
+    midpoints[:, 0] = s_mp[:]
+    midpoints[:, 1] = z_mp[:]
+    kdtree = cKDTree(data=midpoints)
+
+    # This is now the order in which we will write the indices.
+    inds = kdtree.indices
+
+    # Make sure all indices are available.
+    assert list(range(nelem)) == sorted(inds)
+
+    sem_mesh = c_db["Mesh"]["sem_mesh"][:].copy()
+
+    # Everything but the actual data - already done when resuming.
+    if checkpoint is None or not checkpoint.setup_done:
+        _setup_merged_file(c_db=c_db, out=out, inds=inds,
+                           nvars=len(meshes), dtype=dtype, layout=layout,
+                           contiguous=contiguous,
+                           compression_level=compression_level,
+                           quiet=quiet)
+        if checkpoint is not None:
+            out.sync()
+            checkpoint.mark_setup_done()
+
+    x = out["MergedSnapshots"]
+
+    # Process blocks of consecutive elements of the new file so each chunk
+    # is written exactly once and the displacement is read in large slabs.
+    new_sem_mesh = sem_mesh[inds]
+    element_size = np.dtype(dtype).itemsize * int(np.prod(x.shape[1:]))
+    elements_per_block = max(1, int(BLOCK_SIZE_IN_MB * 1024 ** 2 //
+                                    element_size))
+    blocks = [(_i, min(_i + elements_per_block, nelem))
+              for _i in range(0, nelem, elements_per_block)]
+    if checkpoint is not None:
+        blocks = [(start, stop) for start, stop in blocks
+                  if not checkpoint.is_complete(
+                      variable=x, name="/MergedSnapshots", axis=0,
+                      start=start, stop=stop)]
+
+    if pool is None:
+        results = (_read_block(
+            datasets=input, variables=variables,
+            gll_point_ids=new_sem_mesh[start:stop], time_axis=time_axis,
+            dtype=dtype, layout=layout) for start, stop in blocks)
+    else:
+        results = _imap_bounded(
+            pool=pool, func=_read_block_in_worker,
+            iterable=((filenames, variables, new_sem_mesh[start:stop],
+                       time_axis, dtype, layout) for start, stop in blocks),
+            max_pending=2 * processes)
+
+    if not quiet:
+        click.echo(click.style("\tCreating '/MergedSnapshots'...", fg="blue"))
+        pbar = click.progressbar
+    else:
+        pbar = dummy_progressbar
+
+    start_time = timeit.default_timer()
+    with pbar(blocks, length=len(blocks), label="\t  ") as b:
+        for (start, stop), block in zip(b, results):
+            x[start:stop] = block
+            if checkpoint is not None:
+                # Make sure the data is on disc before recording it.
+                out.sync()
+                checkpoint.add(name="/MergedSnapshots", axis=0, start=start,
+                               stop=stop, data=block)
+
+    if not quiet:
+        duration = timeit.default_timer() - start_time
+        count = sum(stop - start for start, stop in blocks)
+        size = count * element_size / 1024.0 ** 2
+        click.echo(click.style(
+            "\tMerged %i elements (%.1f MB) in %.1f seconds (%.1f MB/s)." % (
+                count, size, duration, size / max(duration, 1E-6)),
+            fg="blue"))
+
+
+def _setup_merged_file(c_db, out, inds, nvars, dtype, layout, contiguous,
+                       compression_level, quiet):
+    """
+    Create the structure of a merged file and copy and resort everything
+    but the displacement.
+    """
+    # First copy everything non-snapshot related.
     recursive_copy_no_snapshots_no_seismograms_no_surface(
         src=c_db, dst=out, quiet=quiet, contiguous=contiguous,
         compression_level=compression_level)
@@ -324,53 +781,20 @@ def _merge_files(input, out, contiguous, compression_level, quiet):
             datatype=data.dtype)
         d[:] = data[:]
 
-    # Get all the snapshots from the other databases.
-    if "PX" in input and "PZ" in input:
-        meshes = [
-            input["PX"]["Snapshots"]["disp_s"],
-            input["PX"]["Snapshots"]["disp_p"],
-            input["PX"]["Snapshots"]["disp_z"],
-            input["PZ"]["Snapshots"]["disp_s"],
-            input["PZ"]["Snapshots"]["disp_z"]]
-    elif "PX" in input and "PZ" not in input:
-        meshes = [
-            input["PX"]["Snapshots"]["disp_s"],
-            input["PX"]["Snapshots"]["disp_p"],
-            input["PX"]["Snapshots"]["disp_z"]]
-    elif "PZ" in input and "PX" not in input:
-        meshes = [
-            input["PZ"]["Snapshots"]["disp_s"],
-            input["PZ"]["Snapshots"]["disp_z"]]
-    elif "MXX_P_MYY" in input and "MXY_MXX_M_MYY" in input and \
-            "MXZ_MYZ" in input and "MZZ" in input:
-        meshes = [
-            input["MZZ"]["Snapshots"]["disp_s"],
-            input["MZZ"]["Snapshots"]["disp_z"],
-            input["MXX_P_MYY"]["Snapshots"]["disp_s"],
-            input["MXX_P_MYY"]["Snapshots"]["disp_z"],
-            input["MXZ_MYZ"]["Snapshots"]["disp_s"],
-            input["MXZ_MYZ"]["Snapshots"]["disp_p"],
-            input["MXZ_MYZ"]["Snapshots"]["disp_z"],
-            input["MXY_MXX_M_MYY"]["Snapshots"]["disp_s"],
-            input["MXY_MXX_M_MYY"]["Snapshots"]["disp_p"],
-            input["MXY_MXX_M_MYY"]["Snapshots"]["disp_z"]]
-    else:  # pragma: no cover
-        raise NotImplementedError
-
-    time_axis = np.argmin(meshes[0].shape)
-
-    dtype = meshes[0].dtype
-
     # Create new dimensions.
     dim_ipol = out.createDimension("ipol", 5)
     dim_jpol = out.createDimension("jpol", 5)
-    dim_nvars = out.createDimension("nvars", len(meshes))
+    dim_nvars = out.createDimension("nvars", nvars)
     nelem = out.getncattr("nelem_kwf_global")
     dim_elements = out.createDimension("elements", nelem)
 
     # New dimensions for the 5D Array.
-    dims = (dim_elements, dim_nvars, dim_jpol, dim_ipol,
-            out.dimensions["snapshots"])
+    if layout == "fortran":
+        dims = (dim_elements, dim_nvars, dim_ipol, dim_jpol,
+                out.dimensions["snapshots"])
+    else:
+        dims = (dim_elements, dim_nvars, dim_jpol, dim_ipol,
+                out.dimensions["snapshots"])
     dimensions = [_i.name for _i in dims]
 
     if contiguous:
@@ -388,77 +812,114 @@ def _merge_files(input, out, contiguous, compression_level, quiet):
         zlib=zlib,
         chunksizes=chunksizes,
         datatype=dtype)
+    if __netcdf_version >= (1, 2, 3):
+        x.setncattr_string("layout", layout)
+    else:
+        x.setncattr("layout", layout)
 
-    utemp = np.zeros([_i.size for _i in dims[1:]], dtype=dtype, order="C")
+    # Resort and write the new order to the file.
+    for name in ["sem_mesh", "fem_mesh", "mp_mesh_S", "mp_mesh_Z", "eltype",
+                 "axis"]:
+        out["Mesh"][name][:] = c_db["Mesh"][name][:][inds]
 
-    # We also re-sort the elements to follow the traversal of a kd-tree in
-    # the same fashion instaseis uses it - this should allow for even faster
-    # I/O for spatially adjacent elements.
 
-    # Get the midpoints for each element.
-    s_mp = c_db["Mesh"]["mp_mesh_S"][:]
-    z_mp = c_db["Mesh"]["mp_mesh_Z"][:]
+def _get_merged_variables(input):
+    """
+    Returns the ``(key, name)`` pairs of all variables of a merged database
+    in the order they are stored in it.
+    """
+    if "PX" in input and "PZ" in input:
+        return [("PX", "disp_s"), ("PX", "disp_p"), ("PX", "disp_z"),
+                ("PZ", "disp_s"), ("PZ", "disp_z")]
+    elif "PX" in input and "PZ" not in input:
+        return [("PX", "disp_s"), ("PX", "disp_p"), ("PX", "disp_z")]
+    elif "PZ" in input and "PX" not in input:
+        return [("PZ", "disp_s"), ("PZ", "disp_z")]
+    elif "MXX_P_MYY" in input and "MXY_MXX_M_MYY" in input and \
+            "MXZ_MYZ" in input and "MZZ" in input:
+        return [("MZZ", "disp_s"), ("MZZ", "disp_z"),
+                ("MXX_P_MYY", "disp_s"), ("MXX_P_MYY", "disp_z"),
+                ("MXZ_MYZ", "disp_s"), ("MXZ_MYZ", "disp_p"),
+                ("MXZ_MYZ", "disp_z"),
+                ("MXY_MXX_M_MYY", "disp_s"), ("MXY_MXX_M_MYY", "disp_p"),
+                ("MXY_MXX_M_MYY", "disp_z")]
+    else:  # pragma: no cover
+        raise NotImplementedError
 
-    # Fill kd-tree.
-    midpoints = np.empty((s_mp.shape[0], 2), dtype=s_mp.dtype)
-    midpoints[:, 0] = s_mp[:]
-    midpoints[:, 1] = z_mp[:]
-    kdtree = cKDTree(data=midpoints)
 
-    # This is now the order in which we will write the indices.
-    inds = kdtree.indices
+def _read_block(datasets, variables, gll_point_ids, time_axis, dtype,
+                layout="c"):
+    """
+    Read the displacement of a block of elements in the layout of the
+    "/MergedSnapshots" array.
+
+    :param datasets: The open input files.
+    :param variables: The ``(key, name)`` pairs of the variables to read.
+    :param gll_point_ids: The GLL point ids of the elements with the shape
+        ``(nelem, ipol, jpol)``.
+    :param layout: The layout of the elements in the output.
+    """
+    # The ids in the order of the output.
+    if layout == "fortran":
+        ids = gll_point_ids
+    else:
+        ids = gll_point_ids.transpose(0, 2, 1)
+    unique_ids = np.unique(ids)
+
+    # Read a single contiguous slab with all points unless they are spread
+    # out too much.
+    first, last = unique_ids[0], unique_ids[-1] + 1
+    if (last - first) <= 4 * len(unique_ids):
+        index = slice(first, last)
+        positions = ids - first
+    else:
+        index = unique_ids
+        positions = np.searchsorted(unique_ids, ids)
+
+    block = None
+    for i, (key, name) in enumerate(variables):
+        var = datasets[key]["Snapshots"][name]
+        if time_axis == 0:
+            data = var[:, index].T
+        else:
+            data = var[index, :]
+        if block is None:
+            block = np.empty(ids.shape[:1] + (len(variables),) +
+                             ids.shape[1:] + data.shape[-1:], dtype=dtype)
+        block[:, i] = data[positions]
+    return block
 
-    # Make sure all indices are available.
-    assert list(range(nelem)) == sorted(inds)
 
-    sem_mesh = c_db["Mesh"]["sem_mesh"][:].copy()
+# Input files opened by each worker process.
+_WORKER_DATASETS = {}
 
-    # Resort and write the new order to the file.
-    out["Mesh"]["sem_mesh"][:] = sem_mesh[inds]
-    out["Mesh"]["fem_mesh"][:] = out["Mesh"]["fem_mesh"][:][inds]
 
-    # We'll also have to resort the midpoints.
-    out["Mesh"]["mp_mesh_S"][:] = c_db["Mesh"]["mp_mesh_S"][:][inds]
-    out["Mesh"]["mp_mesh_Z"][:] = c_db["Mesh"]["mp_mesh_Z"][:][inds]
-    # And a couple of other things.
-    out["Mesh"]["eltype"][:] = out["Mesh"]["eltype"][:][inds]
-    out["Mesh"]["axis"][:] = out["Mesh"]["axis"][:][inds]
+def _read_block_in_worker(args):
+    """
+    Call _read_block() in a worker process which opens the input files once.
+    """
+    filenames, variables, gll_point_ids, time_axis, dtype, layout = args
+    for key, filename in filenames.items():
+        if key not in _WORKER_DATASETS:
+            _WORKER_DATASETS[key] = netCDF4.Dataset(filename, "r",
+                                                    format="NETCDF4")
+    return _read_block(datasets=_WORKER_DATASETS, variables=variables,
+                       gll_point_ids=gll_point_ids, time_axis=time_axis,
+                       dtype=dtype, layout=layout)
 
-    if not quiet:
-        click.echo(click.style("\tCreating '/MergedSnapshots'...", fg="blue"))
-        pbar = click.progressbar
-    else:
-        pbar = dummy_progressbar
 
-    with pbar(range(nelem), length=nelem, label="\t  ") \
-            as indices:
-        for elem_id in indices:
-            # Get the old and new indices.
-            old_index = elem_id
-            new_index = np.where(inds == elem_id)[0][0]
-
-            gll_point_ids = sem_mesh[old_index]
-
-            # Load displacement from all GLL points.
-            for i, var in enumerate(meshes):
-                # The list of ids we have is unique but not sorted.
-                ids = gll_point_ids.flatten()
-                s_ids = np.sort(ids)
-                if time_axis == 0:
-                    temp = var[:, s_ids]
-                    for jpol in range(dim_jpol.size):
-                        for ipol in range(dim_ipol.size):
-                            idx = ipol * 5 + jpol
-                            utemp[i, jpol, ipol, :] = \
-                                temp[:, np.argwhere(s_ids == ids[idx])[0][0]]
-                else:
-                    temp = var[s_ids, :]
-                    for jpol in range(dim_jpol.size):
-                        for ipol in range(dim_ipol.size):
-                            idx = ipol * 5 + jpol
-                            utemp[i, jpol, ipol, :] = \
-                                temp[np.argwhere(s_ids == ids[idx])[0][0], :]
-            x[new_index] = utemp
+def _imap_bounded(pool, func, iterable, max_pending):
+    """
+    Like ``pool.imap()`` but with at most ``max_pending`` outstanding tasks
+    so finished results cannot pile up in memory.
+    """
+    pending = collections.deque()
+    for args in iterable:
+        pending.append(pool.apply_async(func, (args,)))
+        if len(pending) >= max_pending:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
 
 
 @click.command()
@@ -471,15 +932,40 @@ def _merge_files(input, out, contiguous, compression_level, quiet):
 @click.option("--compression_level",
               type=click.IntRange(1, 9), default=2,
               help="Compression level from 1 (fast) to 9 (slow).")
-@click.option('--method', type=click.Choice(["transpose", "repack", "merge"]),
+@click.option('--method', type=click.Choice(["transpose", "repack", "merge",
+                                            "strain"]),
               required=True,
               help="`transpose` will transpose the data arrays which "
                    "oftentimes results in faster extraction times. `repack` "
                    "will just repack the data and solve some compatibility "
                    "issues. `merge` will create a single much larger file "
-                   "which is much quicker to read but will take more space.")
+                   "which is much quicker to read but will take more space. "
+                   "`strain` is `merge` plus the precomputed strain of "
+                   "every element for reciprocal databases - this again "
+                   "takes a lot more space but seismograms are much "
+                   "cheaper to compute.")
+@click.option("--processes", type=click.IntRange(1, None), default=1,
+              help="Number of processes reading the input files for "
+                   "`--method merge` and `--method strain`.")
+@click.option("--layout", type=click.Choice(["c", "fortran"]), default="c",
+              help="Layout of the elements for `--method merge` and "
+                   "`--method strain`. `fortran` stores them in the order "
+                   "required by the Fortran routines which saves a copy "
+                   "of each element read from the file. Older versions of "
+                   "Instaseis cannot read such files.")
+@click.option("--resume", is_flag=True,
+              help="Resume an interrupted run of the `transpose`, `repack`, "
+                   "`merge`, or `strain` methods. Already written parts "
+                   "are verified and skipped. Relies on the `.checkpoint` "
+                   "file written next to each output file.")
+@click.option("--strain_dtype",
+              type=click.Choice(["float16", "float32", "float64"]),
+              default="float32",
+              help="Data type of the precomputed strain for `--method "
+                   "strain`.")
 def repack_database(input_folder, output_folder, contiguous,
-                    compression_level, method):
+                    compression_level, method, processes, layout, resume,
+                    strain_dtype):
     found_filenames = []
     for root, _, filenames in os.walk(input_folder, followlinks=True):
         for filename in sorted(filenames, reverse=True):
@@ -497,7 +983,7 @@ def repack_database(input_folder, output_folder, contiguous,
         if "ordered_output.nc4" in [os.path.basename(_i) for _i in
                                     found_filenames]:
             raise ValueError("ordered_output.nc4 already exists.")
-    else:
+    elif not (resume and os.path.exists(output_folder)):
         os.makedirs(output_folder)
 
     if method in ["transpose", "repack"]:
@@ -513,7 +999,9 @@ def repack_database(input_folder, output_folder, contiguous,
             output_filename = output_filename.replace(
                 "axisem_output.nc4", "ordered_output.nc4")
 
-            if not input_folder == output_folder:
+            if not input_folder == output_folder and not (
+                    resume and os.path.exists(
+                        os.path.dirname(output_filename))):
                 os.makedirs(os.path.dirname(output_filename))
 
             if method == "transpose":
@@ -525,11 +1013,14 @@ def repack_database(input_folder, output_folder, contiguous,
                         output_filename=output_filename,
                         contiguous=contiguous,
                         transpose=transpose,
-                        compression_level=compression_level)
-    elif method == "merge":
+                        compression_level=compression_level,
+                        resume=resume)
+    elif method in ["merge", "strain"]:
         merge_files(filenames=found_filenames, output_folder=output_folder,
                     contiguous=contiguous, compression_level=compression_level,
-                    quiet=False)
+                    quiet=False, processes=processes, resume=resume,
+                    layout=layout,
+                    strain_dtype=strain_dtype if method == "strain" else None)
     else:
         raise NotImplementedError
 
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Replay an access log against simulated buffers to find a good
+``buffer_size_in_mb`` and eviction policy.
+
+Record an access log by opening the database with the ``access_log``
+argument and run a representative workload, then:
+
+.. code-block:: bash
+
+    $ python -m instaseis.scripts.simulate_buffers access.log
+
+This prints the hit rate and the expected time spent reading and computing
+elements per access for a range of buffer sizes and all eviction policies.
+Each simulated buffer has the given size, like the per-mesh buffers of a
+database opened with ``buffer_size_in_mb``. With ``--shared`` all buffers
+share a single budget of that size, like with ``cache_size_in_mb``.
+
+The cost of a miss is the I/O and compute time recorded for the element, or
+the average miss of its buffer if it has never been missed in the log. Hits
+are assumed to be free.
+
+Requires click, Instaseis, and numpy.
+
+:copyright:
+    The Instaseis Development Team (instaseis@googlegroups.com), 2026
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import collections
+
+import click
+import numpy as np
+
+from instaseis.database_interfaces.element_log import read_access_log
+from instaseis.database_interfaces.mesh import CacheManager
+
+
+class _SimulatedItem(object):
+    """
+    Stands in for the data of an element in the simulated buffers.
+    """
+    __slots__ = ("nbytes",)
+
+    def __init__(self, nbytes):
+        self.nbytes = nbytes
+
+
+def get_miss_costs(accesses):
+    """
+    Estimate the cost of a miss for every element in an access log.
+
+    :returns: A dictionary mapping ``(mesh, kind, id_elem)`` to the time in
+        seconds it takes to read and compute the element.
+    """
+    costs = {}
+    buffer_costs = collections.defaultdict(list)
+    for a in accesses:
+        if not a.hit:
+            cost = a.io_time + a.compute_time
+            costs[(a.mesh, a.kind, a.id_elem)] = cost
+            buffer_costs[(a.mesh, a.kind)].append(cost)
+
+    all_costs = [_c for _v in buffer_costs.values() for _c in _v]
+    default = float(np.mean(all_costs)) if all_costs else 0.0
+    buffer_costs = dict((key, float(np.mean(value)))
+                        for key, value in buffer_costs.items())
+    for a in accesses:
+        key = (a.mesh, a.kind, a.id_elem)
+        if key not in costs:
+            costs[key] = buffer_costs.get((a.mesh, a.kind), default)
+    return costs
+
+
+def simulate(accesses, size_in_mb, policy="lru", shared=False,
+             costs=None):
+    """
+    Replay an access log against simulated buffers.
+
+    :param accesses: The accesses as returned by
+        :func:`~instaseis.database_interfaces.element_log.read_access_log`.
+    :param size_in_mb: The size of each buffer or, with ``shared``, of the
+        single cache shared by all buffers.
+    :param policy: The eviction policy, see
+        :class:`~instaseis.database_interfaces.mesh.CacheManager`.
+    :param shared: Simulate a single shared cache.
+    :param costs: The miss costs as returned by :func:`get_miss_costs`.
+        Computed from the accesses if not given.
+    :returns: A dictionary with the number of hits and misses, the hit rate,
+        and the mean and total time spent on misses.
+    """
+    if costs is None:
+        costs = get_miss_costs(accesses)
+
+    managers = {}
+    hits = 0
+    time = 0.0
+    for a in accesses:
+        namespace = (a.mesh, a.kind)
+        manager_key = None if shared else namespace
+        if manager_key not in managers:
+            managers[manager_key] = CacheManager(max_size_in_mb=size_in_mb,
+                                                 policy=policy)
+        manager = managers[manager_key]
+        key = (namespace, a.id_elem)
+        if manager.lookup(key, kind=a.kind) is not None:
+            hits += 1
+            continue
+        cost = costs[(a.mesh, a.kind, a.id_elem)]
+        time += cost
+        manager.add(key, _SimulatedItem(a.nbytes), kind=a.kind, cost=cost)
+
+    n = len(accesses)
+    return {
+        "hits": hits,
+        "misses": n - hits,
+        "hit_rate": float(hits) / n if n else 0.0,
+        "mean_latency_in_s": time / n if n else 0.0,
+        "total_time_in_s": time}
+
+
+def get_working_set_size_in_mb(accesses, shared=False):
+    """
+    Memory needed to never evict anything: the size of the largest buffer
+    or, with ``shared``, of all buffers.
+    """
+    sizes = collections.defaultdict(dict)
+    for a in accesses:
+        sizes[(a.mesh, a.kind)][a.id_elem] = a.nbytes
+    totals = [sum(_i.values()) for _i in sizes.values()] or [0]
+    return float(sum(totals) if shared else max(totals)) / 1024 ** 2
+
+
+@click.command(help="Replay an access log recorded with the `access_log` "
+                    "argument of a database against simulated buffers of "
+                    "different sizes and eviction policies.")
+@click.argument("access_log", type=click.Path(exists=True, dir_okay=False))
+@click.option("--size", "sizes", type=float, multiple=True,
+              help="Buffer size in MB to simulate. Can be given multiple "
+                   "times. Defaults to ten sizes up to the size of the "
+                   "working set.")
+@click.option("--policy", "policies", multiple=True,
+              type=click.Choice(CacheManager.POLICIES),
+              help="Eviction policy to simulate. Can be given multiple "
+                   "times. Defaults to all.")
+@click.option("--shared", is_flag=True,
+              help="Simulate a single cache shared by all buffers.")
+def simulate_buffers(access_log, sizes, policies, shared):
+    accesses = read_access_log(access_log)
+    if not accesses:
+        raise click.UsageError("The access log is empty.")
+
+    working_set = get_working_set_size_in_mb(accesses, shared=shared)
+    recorded_hits = sum(1 for _i in accesses if _i.hit)
+    click.echo("%i accesses of %i elements, recorded hit rate: %.1f %%" % (
+        len(accesses),
+        len(set((_i.mesh, _i.kind, _i.id_elem) for _i in accesses)),
+        100.0 * recorded_hits / len(accesses)))
+    click.echo("Working set: %.1f MB %s" % (
+        working_set, "in total" if shared else "in the largest buffer"))
+
+    if not sizes:
+        sizes = np.unique(np.round(np.logspace(
+            np.log10(max(working_set / 100.0, 1E-3)),
+            np.log10(max(working_set, 1E-3)), 10), 3))
+    policies = policies or CacheManager.POLICIES
+
+    costs = get_miss_costs(accesses)
+    click.echo("\n%-8s %12s %10s %18s %14s" % (
+        "policy", "size [MB]", "hit rate", "latency [ms/acc]", "total [s]"))
+    for policy in policies:
+        for size in sizes:
+            r = simulate(accesses, size_in_mb=size, policy=policy,
+                         shared=shared, costs=costs)
+            click.echo("%-8s %12.3f %9.1f%% %18.3f %14.3f" % (
+                policy, size, 100.0 * r["hit_rate"],
+                1000.0 * r["mean_latency_in_s"], r["total_time_in_s"]))
+
+
+if __name__ == "__main__":
+    simulate_buffers()
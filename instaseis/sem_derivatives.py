@@ -24,10 +24,25 @@ lib = load_lib()
 
 
 def _strain_td(u, G, GT, xi, eta, npol, nsamp, nodes, element_type,  # NOQA
-               axial, fct):
-    strain_tensor = np.zeros((nsamp, npol + 1, npol + 1, 6), np.float64,
+               axial, fct, dtype=np.float64):
+    """
+    Call one of the strain routines. With ``dtype=np.float32`` the single
+    precision version ``fct_sp`` of the routine is used - the displacement
+    and the returned strain are then single precision.
+    """
+    dtype = np.dtype(dtype)
+    if dtype == np.float32:
+        fct = getattr(lib, fct + "_sp")
+        c_type = C.c_float
+    elif dtype == np.float64:
+        fct = getattr(lib, fct)
+        c_type = C.c_double
+    else:
+        raise ValueError("dtype must be either float32 or float64.")
+
+    strain_tensor = np.zeros((nsamp, npol + 1, npol + 1, 6), dtype,
                              order="F")
-    u = np.require(u, dtype=np.float64, requirements=["F_CONTIGUOUS"])
+    u = np.require(u, dtype=dtype, requirements=["F_CONTIGUOUS"])
     G = np.require(G, dtype=np.float64, requirements=["F_CONTIGUOUS"])  # NOQA
     GT = np.require(GT, dtype=np.float64,  # NOQA
                     requirements=["F_CONTIGUOUS"])
@@ -36,7 +51,7 @@ def _strain_td(u, G, GT, xi, eta, npol, nsamp, nodes, element_type,  # NOQA
     nodes = np.require(nodes, dtype=np.float64, requirements=["F_CONTIGUOUS"])
 
     fct(
-        u.ctypes.data_as(C.POINTER(C.c_double)),
+        u.ctypes.data_as(C.POINTER(c_type)),
         G.ctypes.data_as(C.POINTER(C.c_double)),
         GT.ctypes.data_as(C.POINTER(C.c_double)),
         xi.ctypes.data_as(C.POINTER(C.c_double)),
@@ -46,24 +61,25 @@ def _strain_td(u, G, GT, xi, eta, npol, nsamp, nodes, element_type,  # NOQA
         nodes.ctypes.data_as(C.POINTER(C.c_double)),
         C.c_int(element_type),
         C.c_bool(axial),
-        strain_tensor.ctypes.data_as(C.POINTER(C.c_double)))
+        strain_tensor.ctypes.data_as(C.POINTER(c_type)))
 
     return strain_tensor
 
 
 def strain_monopole_td(u, G, GT, xi, eta, npol, nsamp, nodes,  # NOQA
-                       element_type, axial):
+                       element_type, axial, dtype=np.float64):
     return _strain_td(u, G, GT, xi, eta, npol, nsamp, nodes, element_type,
-                      axial, lib.strain_monopole_td)
+                      axial, "strain_monopole_td", dtype=dtype)
 
 
 def strain_dipole_td(u, G, GT, xi, eta, npol, nsamp, nodes,  # NOQA
-                     element_type, axial):
+                     element_type, axial, dtype=np.float64):
     return _strain_td(u, G, GT, xi, eta, npol, nsamp, nodes, element_type,
-                      axial, lib.strain_dipole_td)
+                      axial, "strain_dipole_td", dtype=dtype)
 
 
 def strain_quadpole_td(u, G, GT, xi, eta, npol, nsamp, nodes,  # NOQA
-                       element_type, axial):  # pragma: no cover
+                       element_type, axial,
+                       dtype=np.float64):  # pragma: no cover
     return _strain_td(u, G, GT, xi, eta, npol, nsamp, nodes, element_type,
-                      axial, lib.strain_quadpole_td)
+                      axial, "strain_quadpole_td", dtype=dtype)
@@ -25,6 +25,61 @@ if __name__ == "__main__":
                         help='Server port.')
     parser.add_argument('--buffer_size_in_mb', type=int,
                         default=100, help='Size of the buffer in MB')
+    parser.add_argument('--cache_size_in_mb', type=int, default=None,
+                        help='Share a single cache of this size between all '
+                             'buffers of the server. Overwrites '
+                             '--buffer_size_in_mb.')
+    parser.add_argument('--cache_policy', type=str, default='lru',
+                        choices=['lru', 'lfu', 'cost'],
+                        help='The eviction policy of the shared cache.')
+    parser.add_argument('--compressed_cache_size_in_mb', type=int, default=0,
+                        help='Keep items evicted from the shared cache '
+                             'compressed in a second tier of this size. '
+                             'Requires --cache_size_in_mb.')
+    parser.add_argument('--max_workers', type=int, default=None,
+                        help='The maximum number of workers extracting '
+                             'seismograms. Defaults to five times the number '
+                             'of CPUs.')
+    parser.add_argument('--worker_kind', type=str, default='thread',
+                        choices=['thread', 'process'],
+                        help='Use a pool of threads or processes.')
+    parser.add_argument('--max_queue_size', type=int, default=None,
+                        help='The maximum number of tasks waiting for a '
+                             'free worker. Any further request is rejected '
+                             'with HTTP 503. Unlimited by default.')
+    parser.add_argument('--num_processes', type=int, default=1,
+                        help='The number of server processes sharing the '
+                             'read-only parts of the database. 0 starts one '
+                             'process per CPU.')
+    parser.add_argument('--warm_up_file', type=str, default=None,
+                        help='Read the elements of this element log into the '
+                             'buffers before accepting requests.')
+    parser.add_argument('--warm_up_depth_range_in_m', type=float, nargs=2,
+                        default=None, metavar=('MIN', 'MAX'),
+                        help='Read all elements in this depth range into the '
+                             'buffers before accepting requests.')
+    parser.add_argument('--warm_up_distance_range_in_degree', type=float,
+                        nargs=2, default=None, metavar=('MIN', 'MAX'),
+                        help='Limit --warm_up_depth_range_in_m to this '
+                             'epicentral distance range.')
+    parser.add_argument('--hot_elements_file', type=str, default=None,
+                        help='Write the elements in the buffers to this '
+                             'element log at shutdown. Pass the same file '
+                             'to --warm_up_file to start warm next time.')
+    parser.add_argument('--locality_scheduling', action='store_true',
+                        help='Process the receivers of multi-receiver '
+                             'requests in the order of the mesh elements '
+                             'they require. Results are still returned in '
+                             'the requested order so finished ones are '
+                             'kept in memory until all earlier ones have '
+                             'been sent - up to --locality_window '
+                             'seismograms per request.')
+    parser.add_argument('--locality_window', type=int, default=64,
+                        help='Only reorder receivers within windows of '
+                             'this many consecutive receivers with '
+                             '--locality_scheduling. Larger windows give '
+                             'more buffer hits but need more memory and '
+                             'delay the first response bytes.')
     parser.add_argument('--max_size_of_finite_sources', type=int,
                         default=1000,
                         help='The maximum allowed number of point sources in '
@@ -46,5 +101,20 @@ if __name__ == "__main__":
 
     launch_io_loop(db_path=db_path, port=args.port,
                    buffer_size_in_mb=args.buffer_size_in_mb,
+                   cache_size_in_mb=args.cache_size_in_mb,
+                   cache_policy=args.cache_policy,
+                   compressed_cache_size_in_mb=(
+                       args.compressed_cache_size_in_mb),
+                   max_workers=args.max_workers,
+                   worker_kind=args.worker_kind,
+                   max_queue_size=args.max_queue_size,
+                   num_processes=args.num_processes,
+                   warm_up_file=args.warm_up_file,
+                   warm_up_depth_range_in_m=args.warm_up_depth_range_in_m,
+                   warm_up_distance_range_in_degree=(
+                       args.warm_up_distance_range_in_degree),
+                   hot_elements_file=args.hot_elements_file,
+                   locality_scheduling=args.locality_scheduling,
+                   locality_window=args.locality_window,
                    max_size_of_finite_sources=args.max_size_of_finite_sources,
                    quiet=args.quiet, log_level=args.log_level)
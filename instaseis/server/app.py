@@ -9,13 +9,21 @@ Server offering a REST API for Instaseis.
     GNU Lesser General Public License, Version 3 [non-commercial/academic use]
     (http://www.gnu.org/copyleft/lgpl.html)
 """
+import functools
 import logging
+import os
+import signal
 
 import tornado.gen
+import tornado.httpserver
 import tornado.ioloop
+import tornado.netutil
+import tornado.process
 import tornado.web
 
 from ..database_interfaces import find_and_open_files
+from ..database_interfaces.element_log import read_element_log
+from ..database_interfaces.mesh import CacheManager
 
 from .routes.coordinates import CoordinatesHandler
 from .routes.events import EventHandler
@@ -26,6 +34,7 @@ from .routes.seismograms import SeismogramsHandler
 from .routes.seismograms_raw import RawSeismogramsHandler
 from .routes.greens import GreensFunctionHandler
 from .routes.finite_source import FiniteSourceSeismogramsHandler
+from .util import WorkerPool, set_worker_pool
 
 
 # Bit of a hack: Add geojson to the content-types supported for gzipping.
@@ -54,11 +63,41 @@ def get_application():
     ], compress_response=True)
 
 
+def _open_db(db_path, buffer_size_in_mb, cache_size_in_mb, cache_policy,
+             compressed_cache_size_in_mb=0):
+    """
+    Open the database of the server. Module level function so it can be
+    pickled and called in worker processes.
+    """
+    if cache_size_in_mb is not None:
+        cache_manager = CacheManager(
+            max_size_in_mb=cache_size_in_mb, policy=cache_policy,
+            compressed_size_in_mb=compressed_cache_size_in_mb)
+    else:
+        cache_manager = None
+    return find_and_open_files(
+        path=db_path, buffer_size_in_mb=buffer_size_in_mb,
+        cache_manager=cache_manager)
+
+
 def launch_io_loop(db_path, port, buffer_size_in_mb, quiet, log_level,
                    max_size_of_finite_sources=1000,
                    station_coordinates_callback=None,
                    event_info_callback=None,
-                   travel_time_callback=None):  # pragma: no cover
+                   travel_time_callback=None,
+                   cache_size_in_mb=None,
+                   cache_policy="lru",
+                   compressed_cache_size_in_mb=0,
+                   max_workers=None,
+                   worker_kind="thread",
+                   max_queue_size=None,
+                   num_processes=1,
+                   warm_up_file=None,
+                   warm_up_depth_range_in_m=None,
+                   warm_up_distance_range_in_degree=None,
+                   hot_elements_file=None,
+                   locality_scheduling=False,
+                   locality_window=64):  # pragma: no cover
     """
     Launch the instaseis server.
 
@@ -79,10 +118,59 @@ def launch_io_loop(db_path, port, buffer_size_in_mb, quiet, log_level,
         information. If not given, certain requests will not be available.
     :param travel_time_callback: A callback function returning the travel
         time for certain seismic phase and a given source/receiver geometry.
+    :param cache_size_in_mb: If given, all strain and displacement buffers
+        of the server process share a single cache of this size which is a
+        hard limit for the buffer memory. ``buffer_size_in_mb`` is ignored
+        in that case.
+    :param cache_policy: The eviction policy of the shared cache. One of
+        ``"lru"``, ``"lfu"``, or ``"cost"``.
+    :param compressed_cache_size_in_mb: Size of the compressed tier of the
+        shared cache. Items evicted from the cache are compressed and kept
+        there before they are dropped. Only used with ``cache_size_in_mb``.
+    :param max_workers: The maximum number of workers extracting seismograms
+        and parsing source time functions and finite sources. Defaults to
+        five times the number of CPUs.
+    :param worker_kind: Either ``"thread"`` or ``"process"``. Each worker
+        process opens its own copy of the database with its own buffers.
+    :param max_queue_size: The maximum number of tasks waiting for a free
+        worker. Requests arriving when the queue is full are answered with
+        HTTP 503. Unlimited by default.
+    :param num_processes: The number of server processes. ``0`` starts one
+        process per CPU. The database is opened before forking the
+        processes and all read-only mesh data is shared between them. Each
+        process has its own buffers and worker pool.
+    :param warm_up_file: Element log, e.g. written with
+        ``hot_elements_file``, whose elements are read into the buffers
+        before the server accepts requests.
+    :param warm_up_depth_range_in_m: ``(min, max)`` depth range of the
+        elements to read into the buffers before the server accepts
+        requests. Source depths for reciprocal databases.
+    :param warm_up_distance_range_in_degree: ``(min, max)`` epicentral
+        distance range of the elements to read into the buffers. Only used
+        with ``warm_up_depth_range_in_m``.
+    :param hot_elements_file: Write the elements in the buffers to this
+        element log when the server shuts down so the next start can be
+        warmed up with them. With multiple server processes only the
+        first one writes the file.
+
+    :param locality_scheduling: Process the receivers of multi-receiver
+        requests in the order of the elements they require to maximize
+        buffer hits. The seismograms are still returned in the requested
+        order so finished ones might have to wait for earlier ones.
+    :param locality_window: Only receivers within windows of this many
+        consecutive receivers are reordered with ``locality_scheduling``.
+        At most that many finished seismograms are held in memory per
+        request until they can be sent.
+
+    Worker processes (``worker_kind="process"``) open their own copies of
+    the database and are not warmed up.
     """
     application = get_application()
-    application.db = find_and_open_files(
-        path=db_path, buffer_size_in_mb=buffer_size_in_mb)
+    db_opener = functools.partial(
+        _open_db, db_path=db_path, buffer_size_in_mb=buffer_size_in_mb,
+        cache_size_in_mb=cache_size_in_mb, cache_policy=cache_policy,
+        compressed_cache_size_in_mb=compressed_cache_size_in_mb)
+    application.db = db_opener()
     application.station_coordinates_callback = station_coordinates_callback
     application.event_info_callback = event_info_callback
 
@@ -95,6 +183,8 @@ def launch_io_loop(db_path, port, buffer_size_in_mb, quiet, log_level,
     # Set to None to allow arbitrarily sized finite sources. The calculation
     # might take very long then so be aware!
     application.max_size_of_finite_sources = int(max_size_of_finite_sources)
+    application.locality_scheduling = locality_scheduling
+    application.locality_window = int(locality_window)
 
     if not quiet:
         # Get all tornado loggers.
@@ -120,5 +210,80 @@ def launch_io_loop(db_path, port, buffer_size_in_mb, quiet, log_level,
         app_log.info("Successfully opened DB")
         app_log.info(str(application.db))
 
-    application.listen(port)
-    tornado.ioloop.IOLoop.instance().start()
+    # Before forking so all processes share the warm buffers.
+    _warm_up(application.db, warm_up_file=warm_up_file,
+             depth_range_in_m=warm_up_depth_range_in_m,
+             distance_range_in_degree=warm_up_distance_range_in_degree)
+
+    if num_processes == 1:
+        application.listen(port)
+    else:
+        # Load everything read-only before forking so all processes share
+        # the same memory pages. Only the file handles must not be shared.
+        application.db.load_shared_data()
+        sockets = tornado.netutil.bind_sockets(port)
+        tornado.process.fork_processes(num_processes)
+        application.db.reopen_files()
+        server = tornado.httpserver.HTTPServer(application)
+        server.add_sockets(sockets)
+
+    # Created after forking as threads and processes do not survive it.
+    set_worker_pool(WorkerPool(
+        max_workers=max_workers, kind=worker_kind,
+        max_queue_size=max_queue_size, db=application.db,
+        db_opener=db_opener))
+
+    io_loop = tornado.ioloop.IOLoop.instance()
+    # Only one process writes the hot elements.
+    if hot_elements_file is None or tornado.process.task_id():
+        io_loop.start()
+        return
+
+    # Stop the loop on SIGTERM as well so the hot elements are written.
+    def _stop(*args):
+        io_loop.add_callback_from_signal(io_loop.stop)
+    signal.signal(signal.SIGTERM, _stop)
+    try:
+        io_loop.start()
+    finally:
+        application.db.write_hot_elements(hot_elements_file)
+        logging.getLogger("tornado.application").info(
+            "Wrote %i hot elements to '%s'." % (
+                len(application.db.get_hot_elements()), hot_elements_file))
+
+
+def _warm_up(db, warm_up_file, depth_range_in_m,
+             distance_range_in_degree):  # pragma: no cover
+    """
+    Read the elements of an element log and/or a region into the buffers of
+    the database, logging the progress.
+    """
+    app_log = logging.getLogger("tornado.application")
+
+    def progress(done, total):
+        # Roughly every ten percent.
+        if done == total or done % max(total // 10, 1) == 0:
+            app_log.info("Warming up the buffers: %i of %i elements "
+                         "(%.0f%%)" % (done, total, 100.0 * done / total))
+
+    if warm_up_file is not None:
+        if os.path.exists(warm_up_file):
+            app_log.info("Warming up the buffers with '%s'." % warm_up_file)
+            db.preload_elements(read_element_log(warm_up_file),
+                                progress_callback=progress)
+        else:
+            app_log.warning("Warm up file '%s' does not exist." %
+                            warm_up_file)
+
+    if depth_range_in_m is not None:
+        min_distance, max_distance = distance_range_in_degree or (0.0, 180.0)
+        app_log.info("Warming up the buffers with all elements between "
+                     "%g and %g m depth and %g and %g degree distance." % (
+                         depth_range_in_m[0], depth_range_in_m[1],
+                         min_distance, max_distance))
+        db.preload_region(
+            min_depth_in_m=depth_range_in_m[0],
+            max_depth_in_m=depth_range_in_m[1],
+            min_distance_in_degree=min_distance,
+            max_distance_in_degree=max_distance,
+            progress_callback=progress)
@@ -567,9 +567,34 @@ class SeismogramsHandler(InstaseisTimeSeriesHandler):
         # we would like to raise an error.
         count = 0
 
+        # Optionally process the receivers in the order of the elements
+        # they require. The results are still streamed in the original
+        # order - each one waits in `pending` until all previous ones have
+        # been written. Only receivers within windows of consecutive ones
+        # are reordered which limits the number of pending results and
+        # makes sure the response is streamed right away.
+        order = range(len(receivers))
+        if self.application.locality_scheduling and len(receivers) > 1:
+            window = max(int(self.application.locality_window), 1)
+            try:
+                order = []
+                for start in range(0, len(receivers), window):
+                    chunk = receivers[start:start + window]
+                    order.extend(
+                        start + _i
+                        for _i in self.application.db.get_element_order(
+                            sources=[source] * len(chunk),
+                            receivers=chunk))
+            except Exception:
+                # Invalid geometries are reported below.
+                order = range(len(receivers))
+        pending = {}
+        next_index = 0
+
         # Loop over each receiver, get the synthetics and stream it to the
         # user.
-        for receiver in receivers:
+        for index in order:
+            receiver = receivers[index]
 
             # Check if the connection is still open. The connection_closed
             # flag is set by the on_connection_close() method. This is
@@ -587,50 +612,63 @@ class SeismogramsHandler(InstaseisTimeSeriesHandler):
                 args=args, source=source, receiver=receiver,
                 min_starttime=min_starttime, max_endtime=max_endtime)
             if time_values is None:
-                continue
-            starttime, endtime = time_values
-
-            # Validate the source-receiver geometry.
-            self.validate_geometry(source=source, receiver=receiver)
-
-            # Yield from the task. This enables a context switch and thus
-            # async behaviour.
-            response, mu = yield tornado.gen.Task(
-                _get_seismogram,
-                db=self.application.db, source=source, receiver=receiver,
-                components=list(args.components), units=args.units, dt=args.dt,
-                kernelwidth=args.kernelwidth, starttime=starttime,
-                endtime=endtime, scale=args.scale, format=args.format,
-                label=args.label)
-
-            # Check connection once again.
-            if self.connection_closed:  # pragma: no cover
-                self.flush()
-                self.finish()
-                return
-
-            # Set mu just from the first station.
-            if count == 0 and not isinstance(response, Exception):
-                self.set_header("Instaseis-Mu", "%f" % mu)
-
-            # If an exception is returned from the task, re-raise it here.
-            if isinstance(response, Exception):
-                raise response
-            # It might return a list, in that case each item is a bytestring
-            # of SAC file.
-            elif isinstance(response, list):
-                assert args.format == "saczip"
-                for filename, content in response:
-                    zip_file.writestr(filename, content)
-                for data in buf:
-                    self.write(data)
-            # Otherwise it contain MiniSEED which can just directly be
-            # streamed.
+                pending[index] = None
             else:
-                self.write(response)
-            self.flush()
+                starttime, endtime = time_values
+
+                # Validate the source-receiver geometry.
+                self.validate_geometry(source=source, receiver=receiver)
+
+                # Yield from the task. This enables a context switch and
+                # thus async behaviour.
+                response, mu = yield tornado.gen.Task(
+                    _get_seismogram,
+                    db=self.application.db, source=source,
+                    receiver=receiver, components=list(args.components),
+                    units=args.units, dt=args.dt,
+                    kernelwidth=args.kernelwidth, starttime=starttime,
+                    endtime=endtime, scale=args.scale, format=args.format,
+                    label=args.label)
+
+                # Check connection once again.
+                if self.connection_closed:  # pragma: no cover
+                    self.flush()
+                    self.finish()
+                    return
+
+                # If an exception is returned from the task, re-raise it
+                # here.
+                if isinstance(response, Exception):
+                    raise response
+                pending[index] = (response, mu)
+
+            # Write all results that are next in the original order.
+            while next_index in pending:
+                result = pending.pop(next_index)
+                next_index += 1
+                if result is None:
+                    continue
+                response, mu = result
+
+                # Set mu just from the first station.
+                if count == 0:
+                    self.set_header("Instaseis-Mu", "%f" % mu)
+
+                # It might return a list, in that case each item is a
+                # bytestring of SAC file.
+                if isinstance(response, list):
+                    assert args.format == "saczip"
+                    for filename, content in response:
+                        zip_file.writestr(filename, content)
+                    for data in buf:
+                        self.write(data)
+                # Otherwise it contain MiniSEED which can just directly be
+                # streamed.
+                else:
+                    self.write(response)
+                self.flush()
 
-            count += 1
+                count += 1
 
         # If nothing is written, raise an error. This should really only
         # happen with phase relative offsets with phases not coinciding with
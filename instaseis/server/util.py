@@ -7,8 +7,11 @@
     GNU Lesser General Public License, Version 3 [non-commercial/academic use]
     (http://www.gnu.org/copyleft/lgpl.html)
 """
+from concurrent import futures
+import importlib
 import io
 import math
+import multiprocessing
 import re
 import functools
 import threading
@@ -21,6 +24,9 @@ import numpy as np
 import obspy
 from obspy.geodetics import gps2dist_azimuth, locations2degrees
 from obspy.io.sac.util import utcdatetime_to_sac_nztimes
+import tornado.httputil
+import tornado.ioloop
+import tornado.log
 import tornado.web
 
 from .. import ForceSource, FiniteSource
@@ -32,17 +38,238 @@ from .. import __version__
 PHASE_OFFSET_PATTERN = re.compile(r"(^[A-Za-z0-9^]+)([\+-])([\deE\.\-\+]+$)")
 
 
+class _PicklableHTTPError(object):
+    """
+    HTTP errors lose their reason when pickled - this is used to send them
+    across process boundaries.
+    """
+    def __init__(self, error):
+        self.status_code = error.status_code
+        self.log_message = error.log_message
+        self.reason = error.reason
+
+    def to_http_error(self):
+        return tornado.web.HTTPError(self.status_code,
+                                     log_message=self.log_message,
+                                     reason=self.reason)
+
+
+def _convert_errors(value, convert):
+    if isinstance(value, tuple):
+        return tuple(_convert_errors(_i, convert) for _i in value)
+    return convert(value)
+
+
+class _RequestBody(object):
+    """
+    Picklable stand-in for a request of which only the body is needed.
+    """
+    def __init__(self, body):
+        self.body = body
+
+
+class _DatabasePlaceholder(object):
+    """
+    Stands in for the database when sending tasks to worker processes.
+    """
+    pass
+
+
+# The database of a worker process, opened on first use.
+_PROCESS_DB = None
+
+
+def _call_with_callback(func, kwargs):
+    """
+    Call a function reporting its result through a callback and return the
+    result instead.
+    """
+    results = []
+    func(callback=results.append, **kwargs)
+    if not results:  # pragma: no cover
+        raise ValueError("Function did not return a result.")
+    return results[0]
+
+
+def _call_in_process(module, name, kwargs, db_opener):
+    """
+    Entry point for functions executed in a worker process.
+    """
+    global _PROCESS_DB
+    for key, value in kwargs.items():
+        if isinstance(value, _DatabasePlaceholder):
+            if _PROCESS_DB is None:
+                _PROCESS_DB = db_opener()
+            kwargs[key] = _PROCESS_DB
+    func = getattr(importlib.import_module(module), name).__wrapped__
+    result = _call_with_callback(func, kwargs)
+
+    def convert(value):
+        if isinstance(value, tornado.web.HTTPError):
+            return _PicklableHTTPError(value)
+        return value
+
+    return _convert_errors(result, convert)
+
+
+class WorkerPool(object):
+    """
+    Bounded pool of workers executing the potentially expensive parts of the
+    requests.
+
+    :param max_workers: The maximum number of workers. Defaults to five
+        times the number of CPUs.
+    :type max_workers: int
+    :param kind: Either ``"thread"`` or ``"process"``. Each worker process
+        opens its own copy of the database, thus ``db`` and ``db_opener``
+        are required for process pools.
+    :type kind: str
+    :param max_queue_size: The maximum number of tasks waiting for a free
+        worker. Any further task is rejected with an HTTP 503 error.
+        ``None`` means no limit.
+    :type max_queue_size: int
+    :param db: The database of the server. Worker processes use their own
+        copy instead.
+    :param db_opener: Picklable callable returning a newly opened database.
+        Called once in each worker process.
+    """
+    def __init__(self, max_workers=None, kind="thread", max_queue_size=None,
+                 db=None, db_opener=None):
+        if max_workers is None:
+            max_workers = multiprocessing.cpu_count() * 5
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1.")
+        if kind == "thread":
+            self._executor = futures.ThreadPoolExecutor(
+                max_workers=max_workers)
+        elif kind == "process":
+            if db is None or db_opener is None:
+                raise ValueError("Process pools require 'db' and "
+                                 "'db_opener'.")
+            self._executor = futures.ProcessPoolExecutor(
+                max_workers=max_workers)
+        else:
+            raise ValueError("Unknown pool kind '%s'. Must be 'thread' or "
+                             "'process'." % kind)
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self.db = db
+        self.db_opener = db_opener
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self):
+        """
+        Number of currently running and waiting tasks.
+        """
+        return self._pending
+
+    def _task_done(self, future):
+        with self._lock:
+            self._pending -= 1
+
+    def submit(self, func, kwargs, callback):
+        """
+        Execute a function decorated with :func:`run_async` in the pool.
+        The callback is called with the result on the IOLoop of the caller.
+
+        Raises an HTTP 503 error if the queue is full.
+        """
+        with self._lock:
+            if self.max_queue_size is not None and \
+                    self._pending >= self.max_workers + self.max_queue_size:
+                msg = "Server is too busy. Please try again later."
+                raise tornado.web.HTTPError(503, log_message=msg, reason=msg)
+            self._pending += 1
+
+        try:
+            if self.kind == "thread":
+                future = self._executor.submit(_call_with_callback,
+                                               func.__wrapped__, kwargs)
+            else:
+                kwargs = self._make_picklable(kwargs)
+                future = self._executor.submit(
+                    _call_in_process, func.__module__, func.__name__,
+                    kwargs, self.db_opener)
+        except Exception:
+            self._task_done(None)
+            raise
+        future.add_done_callback(self._task_done)
+
+        io_loop = tornado.ioloop.IOLoop.current()
+
+        def done(future):
+            try:
+                result = future.result()
+            except Exception:
+                tornado.log.app_log.exception("Error in worker.")
+                msg = "Internal server error."
+                result = tornado.web.HTTPError(500, log_message=msg,
+                                               reason=msg)
+
+            def convert(value):
+                if isinstance(value, _PicklableHTTPError):
+                    return value.to_http_error()
+                return value
+
+            io_loop.add_callback(callback, _convert_errors(result, convert))
+
+        future.add_done_callback(done)
+        return future
+
+    def _make_picklable(self, kwargs):
+        kwargs = dict(kwargs)
+        for key, value in kwargs.items():
+            if value is self.db:
+                kwargs[key] = _DatabasePlaceholder()
+            elif isinstance(value, tornado.httputil.HTTPServerRequest):
+                kwargs[key] = _RequestBody(value.body)
+        return kwargs
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+_WORKER_POOL = None
+
+
+def get_worker_pool():
+    """
+    Get the worker pool of the server. Creates a thread pool with the default
+    settings if none has been set.
+    """
+    global _WORKER_POOL
+    if _WORKER_POOL is None:
+        _WORKER_POOL = WorkerPool()
+    return _WORKER_POOL
+
+
+def set_worker_pool(pool):
+    """
+    Set the worker pool of the server. The current pool is shut down after
+    its pending tasks finished.
+    """
+    global _WORKER_POOL
+    if _WORKER_POOL is not None and _WORKER_POOL is not pool:
+        _WORKER_POOL.shutdown(wait=True)
+    _WORKER_POOL = pool
+
+
 def run_async(func):
     """
-    Decorator executing a function in a thread.
+    Decorator executing a function in the worker pool of the server.
 
-    Adapted from http://stackoverflow.com/a/15952516/1657047
+    The function has to report its result by calling the ``callback``
+    keyword argument exactly once. All other arguments must be passed as
+    keyword arguments.
     """
     @functools.wraps(func)
-    def async_func(*args, **kwargs):
-        func_hl = threading.Thread(target=func, args=args, kwargs=kwargs)
-        func_hl.start()
-        return func_hl
+    def async_func(callback, **kwargs):
+        return get_worker_pool().submit(async_func, kwargs, callback)
+    # Not set by functools.wraps() on Python 2.
+    async_func.__wrapped__ = func
     return async_func
 
 
@@ -1360,11 +1360,6 @@ class FiniteSource(object):
 
             # finite_time_shift += ps.time_shift * ps.M0 / finite_m0
 
-            mij = rotations.rotate_symm_tensor_voigt_xyz_src_to_xyz_earth(
-                ps.tensor_voigt, np.deg2rad(ps.longitude),
-                np.deg2rad(ps.colatitude))
-            finite_mij += mij
-
             # sum sliprates with time shift applied
             sliprate_f = np.fft.rfft(ps.sliprate, n=nfft)
             sliprate_f *= np.exp(- 1j * rfftfreq(nfft) *
@@ -1372,6 +1367,13 @@ class FiniteSource(object):
             finite_sliprate += np.fft.irfft(sliprate_f)[:nsamp] \
                 * ps.M0 / finite_m0
 
+        finite_mij += rotations \
+            .rotate_symm_tensor_voigt_xyz_src_to_xyz_earth_array(
+                [ps.tensor_voigt for ps in self.pointsources],
+                np.deg2rad([ps.longitude for ps in self.pointsources]),
+                np.deg2rad([ps.colatitude for ps in self.pointsources])) \
+            .sum(axis=0)
+
         longitude = np.rad2deg(np.arctan2(y, x))
         colatitude = np.rad2deg(
             np.arccos(z / np.sqrt(x ** 2 + y ** 2 + z ** 2)))
@@ -23,12 +23,30 @@ from .helpers import load_lib
 lib = load_lib()
 
 
-def lagrange_interpol_2D_td(points1, points2, coefficients, x1, x2):  # NOQA
+def lagrange_interpol_2D_td(points1, points2, coefficients, x1, x2,  # NOQA
+                            dtype=np.float64):
+    """
+    Interpolate time dependent coefficients given at the tensor product of
+    two sets of points to ``(x1, x2)``.
+
+    With ``dtype=np.float32`` the coefficients and the returned
+    interpolant are single precision.
+    """
+    dtype = np.dtype(dtype)
+    if dtype == np.float32:
+        fct = lib.lagrange_interpol_2D_td_sp
+        c_type = C.c_float
+    elif dtype == np.float64:
+        fct = lib.lagrange_interpol_2D_td
+        c_type = C.c_double
+    else:
+        raise ValueError("dtype must be either float32 or float64.")
+
     points1 = np.require(points1, dtype=np.float64,
                          requirements=["F_CONTIGUOUS"])
     points2 = np.require(points2, dtype=np.float64,
                          requirements=["F_CONTIGUOUS"])
-    coefficients = np.require(coefficients, dtype=np.float64,
+    coefficients = np.require(coefficients, dtype=dtype,
                               requirements=["F_CONTIGUOUS"])
 
     # Should be safe enough. This was never raised while extracting a lot of
@@ -38,15 +56,81 @@ def lagrange_interpol_2D_td(points1, points2, coefficients, x1, x2):  # NOQA
     n = len(points1) - 1
     nsamp = coefficients.shape[0]
 
-    interpolant = np.zeros(nsamp, dtype="float64", order="F")
+    interpolant = np.zeros(nsamp, dtype=dtype, order="F")
 
-    lib.lagrange_interpol_2D_td(
+    fct(
         C.c_int(n),
         C.c_int(nsamp),
         points1.ctypes.data_as(C.POINTER(C.c_double)),
         points2.ctypes.data_as(C.POINTER(C.c_double)),
-        coefficients.ctypes.data_as(C.POINTER(C.c_double)),
+        coefficients.ctypes.data_as(C.POINTER(c_type)),
         C.c_double(x1),
         C.c_double(x2),
-        interpolant.ctypes.data_as(C.POINTER(C.c_double)))
+        interpolant.ctypes.data_as(C.POINTER(c_type)))
+    return interpolant
+
+
+def lagrange_interpol_2D_td_multi(points1, points2, coefficients,  # NOQA
+                                  x1, x2, dtype=np.float64):
+    """
+    Interpolate time dependent coefficients with several components given
+    at the tensor product of two sets of points to many points
+    ``(x1[i], x2[i])`` in a single call.
+
+    :param coefficients: The coefficients with the shape
+        ``(nsamp, len(points1), len(points2), ncomp)``.
+    :param x1: The first coordinates of the points.
+    :param x2: The second coordinates of the points.
+    :returns: The interpolants with the shape ``(nsamp, ncomp, npoints)``.
+
+    With ``dtype=np.float32`` the coefficients and the returned
+    interpolants are single precision.
+    """
+    dtype = np.dtype(dtype)
+    if dtype == np.float32:
+        fct = lib.lagrange_interpol_2D_td_multi_sp
+        c_type = C.c_float
+    elif dtype == np.float64:
+        fct = lib.lagrange_interpol_2D_td_multi
+        c_type = C.c_double
+    else:
+        raise ValueError("dtype must be either float32 or float64.")
+
+    points1 = np.require(points1, dtype=np.float64,
+                         requirements=["F_CONTIGUOUS"])
+    points2 = np.require(points2, dtype=np.float64,
+                         requirements=["F_CONTIGUOUS"])
+    coefficients = np.require(coefficients, dtype=dtype,
+                              requirements=["F_CONTIGUOUS"])
+    x1 = np.require(np.atleast_1d(x1), dtype=np.float64,
+                    requirements=["F_CONTIGUOUS"])
+    x2 = np.require(np.atleast_1d(x2), dtype=np.float64,
+                    requirements=["F_CONTIGUOUS"])
+
+    assert len(points1) == len(points2)
+    if coefficients.ndim != 4 or \
+            coefficients.shape[1:3] != (len(points1), len(points2)):
+        raise ValueError("coefficients must have the shape (nsamp, %i, %i, "
+                         "ncomp)." % (len(points1), len(points2)))
+    if len(x1) != len(x2):
+        raise ValueError("x1 and x2 must have the same length.")
+
+    n = len(points1) - 1
+    nsamp = coefficients.shape[0]
+    ncomp = coefficients.shape[3]
+    npoints = len(x1)
+
+    interpolant = np.zeros((nsamp, ncomp, npoints), dtype=dtype, order="F")
+
+    fct(
+        C.c_int(n),
+        C.c_int(nsamp),
+        C.c_int(ncomp),
+        C.c_int(npoints),
+        points1.ctypes.data_as(C.POINTER(C.c_double)),
+        points2.ctypes.data_as(C.POINTER(C.c_double)),
+        coefficients.ctypes.data_as(C.POINTER(c_type)),
+        x1.ctypes.data_as(C.POINTER(C.c_double)),
+        x2.ctypes.data_as(C.POINTER(C.c_double)),
+        interpolant.ctypes.data_as(C.POINTER(c_type)))
     return interpolant
@@ -7,9 +7,9 @@
 !     (http://www.gnu.org/copyleft/lgpl.html)
 
 module sem_derivatives
-  use global_parameters,      only : dp
+  use global_parameters,      only : sp, dp
   use finite_elem_mapping,    only : inv_jacobian
-  use iso_c_binding, only: c_double, c_int, c_bool
+  use iso_c_binding, only: c_float, c_double, c_int, c_bool
 
   implicit none
   private
@@ -376,5 +376,360 @@ pure function mxm_ipol0_btd(a, b)
 end function mxm_ipol0_btd
 !-----------------------------------------------------------------------------------------
 
+!== Single precision =====================================================================
+! Single precision versions of the strain routines. The time dependent fields are single
+! precision while the geometry of the element is still computed in double precision.
+
+!-----------------------------------------------------------------------------------------
+subroutine strain_monopole_td_sp(u, G, GT, xi, eta, npol, nsamp, nodes, element_type, &
+                                 axial, strain_tensor) &
+  bind(c, name="strain_monopole_td_sp")
+
+  integer(c_int), intent(in), value   :: npol, nsamp
+  real(c_float), intent(in)           :: u(1:nsamp,0:npol,0:npol, 3)
+  real(c_double), intent(in)          :: G(0:npol,0:npol)  ! same for all elements (GLL)
+  real(c_double), intent(in)          :: GT(0:npol,0:npol) ! GLL for non-axial and GLJ for
+                                                           ! axial elements
+  real(c_double), intent(in)          :: xi(0:npol)  ! GLL for non-axial and GLJ for axial
+                                                     ! elements
+  real(c_double), intent(in)          :: eta(0:npol) ! same for all elements (GLL)
+  real(c_double), intent(in)          :: nodes(4,2)
+  integer(c_int), intent(in), value   :: element_type
+  logical(c_bool), intent(in), value  :: axial
+  real(c_float), intent(out)          :: strain_tensor(1:nsamp,0:npol,0:npol,6)
+
+  real(kind=sp)                       :: grad_buff1(1:nsamp,0:npol,0:npol,2)
+  real(kind=sp)                       :: grad_buff2(1:nsamp,0:npol,0:npol,2)
+
+  ! 1: dsus, 2: dzus
+  grad_buff1 = axisym_gradient_td_sp(u(:,:,:,1), G, GT, xi, eta, npol, nsamp, &
+                                     nodes, element_type)
+
+  ! 1: dsuz, 2: dzuz
+  grad_buff2 = axisym_gradient_td_sp(u(:,:,:,3), G, GT, xi, eta, npol, nsamp, &
+                                     nodes, element_type)
+
+  strain_tensor(:,:,:,1) = grad_buff1(:,:,:,1)
+  strain_tensor(:,:,:,2) = f_over_s_td_sp(u(:,:,:,1), G, GT, xi, eta, npol, nsamp, &
+                                          nodes, element_type, logical(axial))
+  strain_tensor(:,:,:,3) = grad_buff2(:,:,:,2)
+  strain_tensor(:,:,:,4) = 0
+  strain_tensor(:,:,:,5) = (grad_buff1(:,:,:,2) + grad_buff2(:,:,:,1)) / 2e0
+  strain_tensor(:,:,:,6) = 0
+
+end subroutine strain_monopole_td_sp
+!-----------------------------------------------------------------------------------------
+
+!-----------------------------------------------------------------------------------------
+subroutine strain_dipole_td_sp(u, G, GT, xi, eta, npol, nsamp, nodes, element_type, &
+                               axial, strain_tensor) &
+  bind(c, name="strain_dipole_td_sp")
+
+  integer(c_int), intent(in), value  :: npol, nsamp
+  real(c_float), intent(in)          :: u(1:nsamp,0:npol,0:npol, 3)
+  real(c_double), intent(in)         :: G(0:npol,0:npol)  ! same for all elements (GLL)
+  real(c_double), intent(in)         :: GT(0:npol,0:npol) ! GLL for non-axial and GLJ for
+                                                          ! axial elements
+  real(c_double), intent(in)         :: xi(0:npol)  ! GLL for non-axial and GLJ for axial
+                                                    ! elements
+  real(c_double), intent(in)         :: eta(0:npol) ! same for all elements (GLL)
+  real(c_double), intent(in)         :: nodes(4,2)
+  integer(c_int), intent(in), value  :: element_type
+  logical(c_bool), intent(in), value :: axial
+  real(c_float), intent(out)         :: strain_tensor(1:nsamp,0:npol,0:npol,6)
+
+  real(kind=sp)                      :: grad_buff1(1:nsamp,0:npol,0:npol,2)
+  real(kind=sp)                      :: grad_buff2(1:nsamp,0:npol,0:npol,2)
+  real(kind=sp)                      :: grad_buff3(1:nsamp,0:npol,0:npol,2)
+
+  ! 1: dsus, 2: dzus
+  grad_buff1 = axisym_gradient_td_sp(u(:,:,:,1), G, GT, xi, eta, npol, nsamp, &
+                                     nodes, element_type)
+
+  ! 1: dsup, 2: dzup
+  grad_buff2 = axisym_gradient_td_sp(u(:,:,:,2), G, GT, xi, eta, npol, nsamp, &
+                                     nodes, element_type)
+
+  ! 1: dsuz, 2: dzuz
+  grad_buff3 = axisym_gradient_td_sp(u(:,:,:,3), G, GT, xi, eta, npol, nsamp, &
+                                     nodes, element_type)
+
+  strain_tensor(:,:,:,1) = grad_buff1(:,:,:,1)
+  strain_tensor(:,:,:,2) = f_over_s_td_sp(u(:,:,:,1) - u(:,:,:,2), G, GT, xi, eta, &
+                                          npol, nsamp, nodes, element_type, &
+                                          logical(axial))
+  strain_tensor(:,:,:,3) = grad_buff3(:,:,:,2)
+  strain_tensor(:,:,:,4) = - 0.5e0 * (f_over_s_td_sp(u(:,:,:,3), G, GT, xi, eta, npol, &
+                                                     nsamp, nodes, element_type, &
+                                                     logical(axial)) &
+                                       + grad_buff2(:,:,:,2))
+  strain_tensor(:,:,:,5) = (grad_buff1(:,:,:,2) + grad_buff3(:,:,:,1)) / 2e0
+  strain_tensor(:,:,:,6) = - f_over_s_td_sp((u(:,:,:,1) - u(:,:,:,2)) / 2, G, GT, xi, &
+                                            eta, npol, nsamp, nodes, element_type, &
+                                            logical(axial)) &
+                           - grad_buff2(:,:,:,1) / 2e0
+
+end subroutine strain_dipole_td_sp
+!-----------------------------------------------------------------------------------------
+
+!-----------------------------------------------------------------------------------------
+subroutine strain_quadpole_td_sp(u, G, GT, xi, eta, npol, nsamp, nodes, element_type, &
+                                 axial, strain_tensor) &
+  bind(c, name="strain_quadpole_td_sp")
+
+  integer(c_int), intent(in), value  :: npol, nsamp
+  real(c_float), intent(in)          :: u(1:nsamp,0:npol,0:npol, 3)
+  real(c_double), intent(in)         :: G(0:npol,0:npol)  ! same for all elements (GLL)
+  real(c_double), intent(in)         :: GT(0:npol,0:npol) ! GLL for non-axial and GLJ for
+                                                          ! axial elements
+  real(c_double), intent(in)         :: xi(0:npol)  ! GLL for non-axial and GLJ for axial
+                                                    ! elements
+  real(c_double), intent(in)         :: eta(0:npol) ! same for all elements (GLL)
+  real(c_double), intent(in)         :: nodes(4,2)
+  integer(c_int), intent(in), value  :: element_type
+  logical(c_bool), intent(in), value :: axial
+  real(c_float), intent(out)         :: strain_tensor(1:nsamp,0:npol,0:npol,6)
+
+  real(kind=sp)                 :: grad_buff1(1:nsamp,0:npol,0:npol,2)
+  real(kind=sp)                 :: grad_buff2(1:nsamp,0:npol,0:npol,2)
+  real(kind=sp)                 :: grad_buff3(1:nsamp,0:npol,0:npol,2)
+
+  ! 1: dsus, 2: dzus
+  grad_buff1 = axisym_gradient_td_sp(u(:,:,:,1), G, GT, xi, eta, npol, nsamp, nodes, &
+                                     element_type)
+
+  ! 1: dsup, 2: dzup
+  grad_buff2 = axisym_gradient_td_sp(u(:,:,:,2), G, GT, xi, eta, npol, nsamp, nodes, &
+                                     element_type)
+
+  ! 1: dsuz, 2: dzuz
+  grad_buff3 = axisym_gradient_td_sp(u(:,:,:,3), G, GT, xi, eta, npol, nsamp, nodes, &
+                                     element_type)
+
+  strain_tensor(:,:,:,1) = grad_buff1(:,:,:,1)
+  strain_tensor(:,:,:,2) = f_over_s_td_sp(u(:,:,:,1) - 2 * u(:,:,:,2), G, GT, xi, eta, &
+                                          npol, nsamp, nodes, element_type, &
+                                          logical(axial))
+  strain_tensor(:,:,:,3) = grad_buff3(:,:,:,2)
+  strain_tensor(:,:,:,4) = - f_over_s_td_sp(u(:,:,:,3), G, GT, xi, eta, npol, nsamp, &
+                                            nodes, element_type, logical(axial)) &
+                           - grad_buff2(:,:,:,2) / 2e0
+  strain_tensor(:,:,:,5) = (grad_buff1(:,:,:,2) + grad_buff3(:,:,:,1)) / 2e0
+  strain_tensor(:,:,:,6) = f_over_s_td_sp(0.5e0 * u(:,:,:,2) - u(:,:,:,1), G, GT, xi, &
+                                          eta, npol, nsamp, nodes, element_type, &
+                                          logical(axial)) &
+                           - grad_buff2(:,:,:,1) / 2e0
+
+end subroutine strain_quadpole_td_sp
+!-----------------------------------------------------------------------------------------
+
+!-----------------------------------------------------------------------------------------
+function f_over_s_td_sp(f, G, GT, xi, eta, npol, nsamp, nodes, element_type, axial)
+  ! Single precision version of f_over_s_td
+
+  use finite_elem_mapping, only : mapping
+
+  integer, intent(in)           :: npol, nsamp
+  real(kind=sp), intent(in)     :: f(nsamp, 0:npol,0:npol)
+  real(kind=dp), intent(in)     :: G(0:npol,0:npol)
+  real(kind=dp), intent(in)     :: GT(0:npol,0:npol)
+  real(kind=dp), intent(in)     :: xi(0:npol)
+  real(kind=dp), intent(in)     :: eta(0:npol)
+  real(kind=dp), intent(in)     :: nodes(4,2)
+  integer, intent(in)           :: element_type
+  logical, intent(in)           :: axial
+  real(kind=sp)                 :: f_over_s_td_sp(nsamp, 0:npol,0:npol)
+
+  integer                       :: ipol, jpol
+  real(kind=dp)                 :: sz(0:npol,0:npol,1:2)
+
+  do jpol=0, npol
+     do ipol=0, npol
+        sz(ipol, jpol,:) =  mapping(xi(ipol), eta(jpol), nodes, element_type)
+     enddo
+  enddo
+
+  if (.not. axial) then
+     do jpol=0, npol
+        do ipol=0, npol
+           f_over_s_td_sp(:,ipol,jpol) = f(:,ipol,jpol) / real(sz(ipol,jpol,1), sp)
+        enddo
+     enddo
+  else
+     do jpol=0, npol
+        do ipol=1, npol
+           f_over_s_td_sp(:,ipol,jpol) = f(:,ipol,jpol) / real(sz(ipol,jpol,1), sp)
+        enddo
+     enddo
+     f_over_s_td_sp(:,0,:) = dsdf_axis_td_sp(f, G, GT, xi, eta, npol, nsamp, nodes, &
+                                             element_type)
+  endif
+
+end function
+!-----------------------------------------------------------------------------------------
+
+!-----------------------------------------------------------------------------------------
+function dsdf_axis_td_sp(f, G, GT, xi, eta, npol, nsamp, nodes, element_type)
+  ! Single precision version of dsdf_axis_td
+
+  integer, intent(in)           :: npol, nsamp
+  real(kind=sp), intent(in)     :: f(1:nsamp,0:npol,0:npol)
+  real(kind=dp), intent(in)     :: G(0:npol,0:npol)
+  real(kind=dp), intent(in)     :: GT(0:npol,0:npol)
+  real(kind=dp), intent(in)     :: xi(0:npol)
+  real(kind=dp), intent(in)     :: eta(0:npol)
+  real(kind=dp), intent(in)     :: nodes(4,2)
+  integer, intent(in)           :: element_type
+  real(kind=sp)                 :: dsdf_axis_td_sp(1:nsamp,0:npol)
+
+  real(kind=sp)                 :: inv_j_npol(0:npol,2,2)
+  integer                       :: ipol, jpol
+  real(kind=sp)                 :: mxm_ipol0_1(1:nsamp,0:npol)
+  real(kind=sp)                 :: mxm_ipol0_2(1:nsamp,0:npol)
+
+  ipol = 0
+  do jpol = 0, npol
+     inv_j_npol(jpol,:,:) = real(inv_jacobian(xi(ipol), eta(jpol), nodes, &
+                                              element_type), sp)
+  enddo
+
+  mxm_ipol0_1 = mxm_ipol0_btd_sp(real(GT, sp), f)
+  mxm_ipol0_2 = mxm_ipol0_atd_sp(f, real(G, sp))
+
+  do jpol = 0, npol
+     dsdf_axis_td_sp(:,jpol) =   inv_j_npol(jpol,1,1) * mxm_ipol0_1(:,jpol) &
+                               + inv_j_npol(jpol,2,1) * mxm_ipol0_2(:,jpol)
+  enddo
+
+end function
+!-----------------------------------------------------------------------------------------
+
+!-----------------------------------------------------------------------------------------
+function axisym_gradient_td_sp(f, G, GT, xi, eta, npol, nsamp, nodes, element_type)
+  ! Single precision version of axisym_gradient_td
+
+  integer, intent(in)           :: npol, nsamp
+  real(kind=sp), intent(in)     :: f(1:nsamp,0:npol,0:npol)
+  real(kind=dp), intent(in)     :: G(0:npol,0:npol)
+  real(kind=dp), intent(in)     :: GT(0:npol,0:npol)
+  real(kind=dp), intent(in)     :: xi(0:npol)
+  real(kind=dp), intent(in)     :: eta(0:npol)
+  real(kind=dp), intent(in)     :: nodes(4,2)
+  integer, intent(in)           :: element_type
+  real(kind=sp)                 :: axisym_gradient_td_sp(1:nsamp,0:npol,0:npol,1:2)
+
+  real(kind=sp)                 :: inv_j_npol(0:npol,0:npol,2,2)
+  integer                       :: ipol, jpol
+  real(kind=sp)                 :: mxm1(1:nsamp,0:npol,0:npol)
+  real(kind=sp)                 :: mxm2(1:nsamp,0:npol,0:npol)
+
+  do ipol = 0, npol
+     do jpol = 0, npol
+        inv_j_npol(ipol,jpol,:,:) = real(inv_jacobian(xi(ipol), eta(jpol), nodes, &
+                                                      element_type), sp)
+     enddo
+  enddo
+
+  mxm1 = mxm_btd_sp(real(GT, sp), f)
+  mxm2 = mxm_atd_sp(f, real(G, sp))
+
+  do jpol = 0, npol
+     do ipol = 0, npol
+        axisym_gradient_td_sp(:,ipol,jpol,1) =   &
+                inv_j_npol(ipol,jpol,1,1) * mxm1(:,ipol,jpol) &
+              + inv_j_npol(ipol,jpol,2,1) * mxm2(:,ipol,jpol)
+        axisym_gradient_td_sp(:,ipol,jpol,2) =   &
+                inv_j_npol(ipol,jpol,1,2) * mxm1(:,ipol,jpol) &
+              + inv_j_npol(ipol,jpol,2,2) * mxm2(:,ipol,jpol)
+     enddo
+  enddo
+
+end function
+!-----------------------------------------------------------------------------------------
+
+!-----------------------------------------------------------------------------------------
+!> Single precision version of mxm_atd
+pure function mxm_atd_sp(a, b)
+
+  real(kind=sp), intent(in)  :: a(1:,0:,0:), b(0:,0:)                  !< Input matrices
+  real(kind=sp)              :: mxm_atd_sp(1:size(a,1), 0:size(a,2)-1,0:size(b,2)-1)
+  integer                    :: i, j, k
+
+  mxm_atd_sp = 0
+
+  do j = 0, size(b,2) -1
+     do i = 0, size(a,2) -1
+        do k = 0, size(a,3) -1
+           mxm_atd_sp(:,i,j) = mxm_atd_sp(:,i,j) + a(:,i,k) * b(k,j)
+        enddo
+     end do
+  end do
+
+end function mxm_atd_sp
+!-----------------------------------------------------------------------------------------
+
+!-----------------------------------------------------------------------------------------
+!> Single precision version of mxm_btd
+pure function mxm_btd_sp(a, b)
+
+  real(kind=sp), intent(in)  :: a(0:,0:), b(1:,0:,0:)                  !< Input matrices
+  real(kind=sp)              :: mxm_btd_sp(1:size(b,1),0:size(a,1)-1,0:size(b,2)-1)
+  integer                    :: i, j, k
+
+  mxm_btd_sp = 0
+
+  do j = 0, size(b,2) -1
+     do i = 0, size(a,1) -1
+        do k = 0, size(a,2) -1
+           mxm_btd_sp(:,i,j) = mxm_btd_sp(:,i,j) + a(i,k) * b(:,k,j)
+        enddo
+     end do
+  end do
+
+end function mxm_btd_sp
+!-----------------------------------------------------------------------------------------
+
+!-----------------------------------------------------------------------------------------
+!> Single precision version of mxm_ipol0_atd
+pure function mxm_ipol0_atd_sp(a, b)
+
+  real(kind=sp), intent(in)  :: a(1:,0:,0:), b(0:,0:)                  !< Input matrices
+  real(kind=sp)              :: mxm_ipol0_atd_sp(1:size(a,1), 0:size(b,2)-1)  !< Result
+  integer                    :: i, j, k
+
+  mxm_ipol0_atd_sp = 0
+  i = 0
+
+  do j = 0, size(b,2) -1
+     do k = 0, size(a,3) -1
+        mxm_ipol0_atd_sp(:,j) = mxm_ipol0_atd_sp(:,j) + a(:,i,k) * b(k,j)
+     enddo
+  end do
+
+end function mxm_ipol0_atd_sp
+!-----------------------------------------------------------------------------------------
+
+!-----------------------------------------------------------------------------------------
+!> Single precision version of mxm_ipol0_btd
+pure function mxm_ipol0_btd_sp(a, b)
+
+  real(kind=sp), intent(in)  :: a(0:,0:), b(1:,0:,0:)                  !< Input matrices
+  real(kind=sp)              :: mxm_ipol0_btd_sp(1:size(b,1),0:size(b,2)-1)  !< Result
+  integer                    :: i, j, k
+
+  mxm_ipol0_btd_sp = 0
+
+  i = 0
+  do j = 0, size(b,2) -1
+     do k = 0, size(a,2) -1
+        mxm_ipol0_btd_sp(:,j) = mxm_ipol0_btd_sp(:,j) + a(i,k) * b(:,k,j)
+     enddo
+  end do
+
+end function mxm_ipol0_btd_sp
+!-----------------------------------------------------------------------------------------
+
+!== END Single precision =================================================================
+
 end module
 !=========================================================================================
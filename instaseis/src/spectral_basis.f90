@@ -8,12 +8,13 @@
 
 module spectral_basis
     use global_parameters, only: sp, dp, pi
-    use iso_c_binding, only: c_double, c_int
+    use iso_c_binding, only: c_float, c_double, c_int
 
     implicit none
     private
 
     public :: lagrange_interpol_2D_td
+    public :: lagrange_interpol_2D_td_multi
 
 contains
 
@@ -34,6 +35,55 @@ subroutine lagrange_interpol_2D_td_wrapped(N, nsamp, points1, points2, coefficie
 end subroutine
 !-----------------------------------------------------------------------------------------
 
+!-----------------------------------------------------------------------------------------
+subroutine lagrange_interpol_2D_td_sp_wrapped(N, nsamp, points1, points2, &
+                                              coefficients, x1, x2, interpolant) &
+  bind(c, name="lagrange_interpol_2D_td_sp")
+
+  integer(c_int), intent(in), value  :: N, nsamp
+  real(c_double), intent(in)         :: points1(0:N), points2(0:N)
+  real(c_float), intent(in)          :: coefficients(1:nsamp, 0:N, 0:N)
+  real(c_double), intent(in), value  :: x1, x2
+  real(c_float), intent(out)         :: interpolant(nsamp)
+
+  interpolant = lagrange_interpol_2D_td_sp(points1, points2, coefficients, x1, x2)
+end subroutine
+!-----------------------------------------------------------------------------------------
+
+!-----------------------------------------------------------------------------------------
+subroutine lagrange_interpol_2D_td_multi_wrapped(N, nsamp, ncomp, npoints, points1, &
+                                                 points2, coefficients, x1, x2, &
+                                                 interpolant) &
+  bind(c, name="lagrange_interpol_2D_td_multi")
+
+  integer(c_int), intent(in), value  :: N, nsamp, ncomp, npoints
+  real(c_double), intent(in)         :: points1(0:N), points2(0:N)
+  real(c_double), intent(in)         :: coefficients(1:nsamp, 0:N, 0:N, 1:ncomp)
+  real(c_double), intent(in)         :: x1(npoints), x2(npoints)
+  real(c_double), intent(out)        :: interpolant(nsamp, ncomp, npoints)
+
+  call lagrange_interpol_2D_td_multi(points1, points2, coefficients, x1, x2, &
+                                     interpolant)
+end subroutine
+!-----------------------------------------------------------------------------------------
+
+!-----------------------------------------------------------------------------------------
+subroutine lagrange_interpol_2D_td_multi_sp_wrapped(N, nsamp, ncomp, npoints, points1, &
+                                                    points2, coefficients, x1, x2, &
+                                                    interpolant) &
+  bind(c, name="lagrange_interpol_2D_td_multi_sp")
+
+  integer(c_int), intent(in), value  :: N, nsamp, ncomp, npoints
+  real(c_double), intent(in)         :: points1(0:N), points2(0:N)
+  real(c_float), intent(in)          :: coefficients(1:nsamp, 0:N, 0:N, 1:ncomp)
+  real(c_double), intent(in)         :: x1(npoints), x2(npoints)
+  real(c_float), intent(out)         :: interpolant(nsamp, ncomp, npoints)
+
+  call lagrange_interpol_2D_td_multi_sp(points1, points2, coefficients, x1, x2, &
+                                        interpolant)
+end subroutine
+!-----------------------------------------------------------------------------------------
+
 !== END  C Wrappers ======================================================================
 
 !-----------------------------------------------------------------------------------------
@@ -81,5 +131,138 @@ function lagrange_interpol_2D_td(points1, points2, coefficients, x1, x2)
 end function lagrange_interpol_2D_td
 !-----------------------------------------------------------------------------------------
 
+!-----------------------------------------------------------------------------------------
+!> Single precision version of lagrange_interpol_2D_td. Only the time dependent
+!  coefficients and the result are single precision.
+function lagrange_interpol_2D_td_sp(points1, points2, coefficients, x1, x2)
+
+  real(dp), intent(in)  :: points1(0:), points2(0:)
+  real(sp), intent(in)  :: coefficients(:,0:,0:)
+  real(dp), intent(in)  :: x1, x2
+  real(sp)              :: lagrange_interpol_2D_td_sp(size(coefficients,1))
+  real(dp)              :: l_i(0:size(points1)-1), l_j(0:size(points2)-1)
+
+  integer               :: i, j, m1, m2, n1, n2
+
+  n1 = size(points1) - 1
+  n2 = size(points2) - 1
+
+  do i=0, n1
+     l_i(i) = 1
+     do m1=0, n1
+        if (m1 == i) cycle
+        l_i(i) = l_i(i) * (x1 - points1(m1)) / (points1(i) - points1(m1))
+     enddo
+  enddo
+
+  do j=0, n2
+     l_j(j) = 1
+     do m2=0, n2
+        if (m2 == j) cycle
+        l_j(j) = l_j(j) * (x2 - points2(m2)) / (points2(j) - points2(m2))
+     enddo
+  enddo
+
+  lagrange_interpol_2D_td_sp(:) = 0
+
+  do i=0, n1
+     do j=0, n2
+        lagrange_interpol_2D_td_sp(:) = lagrange_interpol_2D_td_sp(:) &
+                                        + coefficients(:,i,j) * real(l_i(i) * l_j(j), sp)
+     enddo
+  enddo
+
+end function lagrange_interpol_2D_td_sp
+!-----------------------------------------------------------------------------------------
+
+!-----------------------------------------------------------------------------------------
+!> Lagrangian interpolation of time dependent coefficients with several components
+!  to several points at once. The Lagrange polynomials are evaluated once per point
+!  and shared by all components.
+subroutine lagrange_interpol_2D_td_multi(points1, points2, coefficients, x1, x2, &
+                                         interpolant)
+
+  real(dp), intent(in)  :: points1(0:), points2(0:)
+  real(dp), intent(in)  :: coefficients(:,0:,0:,:)
+  real(dp), intent(in)  :: x1(:), x2(:)
+  real(dp), intent(out) :: interpolant(:,:,:)
+  real(dp)              :: l_i(0:size(points1)-1), l_j(0:size(points2)-1)
+
+  integer               :: i, j, k, p
+
+  interpolant(:,:,:) = 0
+
+  do p=1, size(x1)
+     l_i = lagrange_polynomials(points1, x1(p))
+     l_j = lagrange_polynomials(points2, x2(p))
+     do k=1, size(coefficients, 4)
+        do i=0, size(points1) - 1
+           do j=0, size(points2) - 1
+              interpolant(:,k,p) = interpolant(:,k,p) &
+                                   + coefficients(:,i,j,k) * l_i(i) * l_j(j)
+           enddo
+        enddo
+     enddo
+  enddo
+
+end subroutine lagrange_interpol_2D_td_multi
+!-----------------------------------------------------------------------------------------
+
+!-----------------------------------------------------------------------------------------
+!> Single precision version of lagrange_interpol_2D_td_multi. Only the time dependent
+!  coefficients and the result are single precision.
+subroutine lagrange_interpol_2D_td_multi_sp(points1, points2, coefficients, x1, x2, &
+                                            interpolant)
+
+  real(dp), intent(in)  :: points1(0:), points2(0:)
+  real(sp), intent(in)  :: coefficients(:,0:,0:,:)
+  real(dp), intent(in)  :: x1(:), x2(:)
+  real(sp), intent(out) :: interpolant(:,:,:)
+  real(dp)              :: l_i(0:size(points1)-1), l_j(0:size(points2)-1)
+
+  integer               :: i, j, k, p
+
+  interpolant(:,:,:) = 0
+
+  do p=1, size(x1)
+     l_i = lagrange_polynomials(points1, x1(p))
+     l_j = lagrange_polynomials(points2, x2(p))
+     do k=1, size(coefficients, 4)
+        do i=0, size(points1) - 1
+           do j=0, size(points2) - 1
+              interpolant(:,k,p) = interpolant(:,k,p) &
+                                   + coefficients(:,i,j,k) * real(l_i(i) * l_j(j), sp)
+           enddo
+        enddo
+     enddo
+  enddo
+
+end subroutine lagrange_interpol_2D_td_multi_sp
+!-----------------------------------------------------------------------------------------
+
+!-----------------------------------------------------------------------------------------
+!> The Lagrange polynomials of a set of points evaluated at x.
+pure function lagrange_polynomials(points, x)
+
+  real(dp), intent(in)  :: points(0:)
+  real(dp), intent(in)  :: x
+  real(dp)              :: lagrange_polynomials(0:size(points)-1)
+
+  integer               :: i, m, n
+
+  n = size(points) - 1
+
+  do i=0, n
+     lagrange_polynomials(i) = 1
+     do m=0, n
+        if (m == i) cycle
+        lagrange_polynomials(i) = lagrange_polynomials(i) * (x - points(m)) &
+                                  / (points(i) - points(m))
+     enddo
+  enddo
+
+end function lagrange_polynomials
+!-----------------------------------------------------------------------------------------
+
 end module
 !=========================================================================================
@@ -11,9 +11,17 @@ Tests for the array buffer.
 """
 from __future__ import absolute_import, division
 
+import inspect
+import os
+
 import numpy as np
+import pytest
+
+from instaseis.database_interfaces.mesh import Buffer, CacheManager
 
-from instaseis.database_interfaces.mesh import Buffer
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(
+    inspect.getfile(inspect.currentframe()))), "data")
 
 
 def test_buffer():
@@ -42,3 +50,368 @@ def test_buffer():
     # Once more not in.
     assert "d" not in buf
     assert buf.efficiency == 2.0 / 4.0
+
+
+def test_cache_manager_shared_budget():
+    manager = CacheManager(max_size_in_mb=1.0)
+    buf_a = Buffer(manager=manager, kind="strain")
+    buf_b = Buffer(manager=manager, kind="displacement")
+
+    # The same key in both buffers refers to different items.
+    buf_a.add(1, np.empty(512 * 1024, dtype=np.int8))
+    buf_b.add(1, np.empty(256 * 1024, dtype=np.int8))
+    assert 1 in buf_a
+    assert 1 in buf_b
+    assert buf_a._total_size == 512 * 1024
+    assert buf_b._total_size == 256 * 1024
+    assert manager.get_size_mb() == 0.75
+
+    # Exceeds the shared budget - the oldest item of any buffer goes first.
+    buf_b.add(2, np.empty(512 * 1024, dtype=np.int8))
+    assert 1 not in buf_a
+    assert 1 in buf_b
+    assert 2 in buf_b
+    assert buf_a.get_size_mb() == 0.0
+    assert manager.get_size_mb() == 0.75
+
+    stats = manager.get_statistics()
+    assert stats["strain"]["size_in_mb"] == 0.0
+    assert stats["strain"]["hits"] == 1
+    assert stats["strain"]["misses"] == 1
+    assert stats["displacement"]["size_in_mb"] == 0.75
+    assert stats["displacement"]["items"] == 2
+    assert stats["displacement"]["efficiency"] == 1.0
+
+    buf_b.clear()
+    assert len(manager) == 0
+
+
+def test_cache_manager_policies():
+    one_kb = 1024
+
+    def fill(policy):
+        manager = CacheManager(max_size_in_mb=3 * one_kb / 1024 ** 2,
+                               policy=policy)
+        buf = Buffer(manager=manager)
+        buf.add("a", np.empty(one_kb, dtype=np.int8), cost=10.0)
+        buf.add("b", np.empty(one_kb, dtype=np.int8), cost=1.0)
+        buf.add("c", np.empty(one_kb, dtype=np.int8), cost=5.0)
+        # "a" is the least recently used, "b" is the most frequently used.
+        for _ in range(3):
+            buf.get("b")
+        buf.get("c")
+        buf.add("d", np.empty(one_kb, dtype=np.int8), cost=2.0)
+        return [_i for _i in "abcd" if _i in buf]
+
+    assert fill("lru") == ["b", "c", "d"]
+    # "a" and "d" have not been used - "a" is older.
+    assert fill("lfu") == ["b", "c", "d"]
+    # Cost times usage per byte: a=10, b=4, c=10, d=2.
+    assert fill("cost") == ["a", "b", "c"]
+
+    with pytest.raises(ValueError):
+        CacheManager(policy="random")
+
+
+def test_shared_cache_manager_in_database():
+    from instaseis import Source, Receiver
+    from instaseis.database_interfaces import find_and_open_files
+
+    db_path = os.path.join(DATA, "100s_db_bwd_strain_only")
+    manager = CacheManager(max_size_in_mb=50, policy="cost")
+    db_1 = find_and_open_files(db_path, cache_manager=manager)
+    db_2 = find_and_open_files(db_path, cache_manager=manager)
+
+    src = Source(latitude=4., longitude=3.0, depth_in_m=0,
+                 m_rr=4.71e+17, m_tt=3.81e+17, m_pp=-4.74e+17,
+                 m_rt=3.99e+17, m_rp=-8.05e+17, m_tp=-1.23e+17)
+    rec = Receiver(latitude=10., longitude=20.)
+    st_1 = db_1.get_seismograms(source=src, receiver=rec)
+    st_2 = db_2.get_seismograms(source=src, receiver=rec)
+    for tr_1, tr_2 in zip(st_1, st_2):
+        np.testing.assert_allclose(tr_1.data, tr_2.data)
+
+    assert db_1.parsed_mesh.strain_buffer._manager is manager
+    assert db_2.parsed_mesh.strain_buffer._manager is manager
+    assert manager.get_size_mb() > 0
+    # One element of each of the PX and PZ meshes per database.
+    sizes = [_m.strain_buffer.get_size_mb() for _db in (db_1, db_2)
+             for _m in (_db.meshes.px, _db.meshes.pz)]
+    assert len(manager) == 4
+    assert manager.get_size_mb() == sum(sizes)
+    stats = manager.get_statistics()
+    assert stats["strain"]["misses"] == 4
+    assert stats["strain"]["size_in_mb"] == manager.get_size_mb()
+
+
+def test_compressed_tier():
+    """
+    Items evicted from the uncompressed tier are compressed and moved back
+    once they are used again.
+    """
+    size = 4 * 1024 ** 2
+    manager = CacheManager(max_size_in_mb=5, compressed_size_in_mb=5)
+    buf = Buffer(manager=manager, kind="strain")
+
+    # Repetitive data compresses well. The second item is a tuple with a
+    # missing array in Fortran order as used by the merged databases.
+    a = np.tile(np.linspace(0, 1, 128), size // 8 // 128)
+    b = (np.asfortranarray(np.ones((256, 256, 8))), None)
+    buf.add("a", a)
+    buf.add("b", b)
+
+    assert manager.tier((buf._namespace, "a")) == "compressed"
+    assert manager.tier((buf._namespace, "b")) == "uncompressed"
+    assert len(manager) == 1
+    assert manager.get_compressed_size_mb() < 1
+    assert manager.get_compression_ratio() > 4
+
+    # Lossless and back in the uncompressed tier.
+    value = buf.lookup("a")
+    np.testing.assert_array_equal(value, a)
+    assert manager.tier((buf._namespace, "a")) == "uncompressed"
+    assert manager.tier((buf._namespace, "b")) == "compressed"
+
+    value = buf.lookup("b")
+    assert isinstance(value, tuple)
+    assert value[1] is None
+    assert value[0].flags.f_contiguous
+    np.testing.assert_array_equal(value[0], b[0])
+
+    assert buf.lookup("c") is None
+    stats = buf.get_statistics()
+    assert stats["hits"] == 0
+    assert stats["compressed_hits"] == 2
+    assert stats["misses"] == 1
+    assert stats["compressed_hit_rate"] == 2.0 / 3.0
+    assert stats["compression_ratio"] > 4
+    assert buf.efficiency == 2.0 / 3.0
+
+    stats = manager.get_statistics()["strain"]
+    assert stats["compressed_hits"] == 2
+    assert stats["compressed_items"] == 1
+    assert stats["efficiency"] == 2.0 / 3.0
+
+    buf.clear()
+    assert manager.get_compressed_size_mb() == 0
+    assert "a" not in buf
+
+
+def test_compressed_tier_mantissa_bits():
+    """
+    Lossy compression bounds the relative error.
+    """
+    np.random.seed(12345)
+    for dtype in (np.float32, np.float64):
+        manager = CacheManager(max_size_in_mb=1, compressed_size_in_mb=10,
+                               mantissa_bits=10)
+        buf = Buffer(manager=manager)
+        data = np.random.randn(1024 ** 2 // 4).astype(dtype)
+        buf.add("a", data)
+        buf.add("b", data.copy())
+        assert "a" in buf
+        value = buf.get("a")
+        assert value.dtype == dtype
+        rel_error = np.abs(value - data) / np.abs(data)
+        assert rel_error.max() < 2.0 ** -10
+        assert rel_error.max() > 0
+
+    with pytest.raises(ValueError):
+        CacheManager(mantissa_bits=0)
+
+
+def test_warm_up_with_hot_elements(tmpdir):
+    """
+    The hot elements of one database warm up the buffers of another one so
+    the same seismograms are then extracted without reading any element.
+    """
+    from instaseis import Source, ForceSource, Receiver
+    from instaseis.database_interfaces import find_and_open_files
+    from instaseis.database_interfaces.element_log import read_element_log
+
+    db_path = os.path.join(DATA, "100s_db_bwd_displ_only")
+    db = find_and_open_files(db_path)
+    rec = Receiver(latitude=10., longitude=20.)
+    src = Source(latitude=4., longitude=3.0, depth_in_m=0,
+                 m_rr=4.71e+17, m_tt=3.81e+17, m_pp=-4.74e+17,
+                 m_rt=3.99e+17, m_rp=-8.05e+17, m_tp=-1.23e+17)
+    force_src = ForceSource(latitude=-4., longitude=30.0, depth_in_m=0,
+                            f_r=1E10, f_t=-2E10, f_p=3E10)
+    st = db.get_seismograms(source=src, receiver=rec)
+    st += db.get_seismograms(source=force_src, receiver=rec)
+
+    elements = db.get_hot_elements()
+    assert sorted(_i[0] for _i in elements) == ["displacement", "strain"]
+
+    filename = str(tmpdir.join("hot_elements.txt"))
+    db.write_hot_elements(filename)
+    assert read_element_log(filename) == elements
+
+    db_2 = find_and_open_files(db_path)
+    progress = []
+    assert db_2.preload_elements(
+        read_element_log(filename) + [("strain", -1)],
+        progress_callback=lambda *args: progress.append(args)) == 2
+    assert progress == [(1, 3), (2, 3), (3, 3)]
+    assert db_2.get_hot_elements() == elements
+
+    buffers = [_b for _m in db_2.meshes
+               for _b in (_m.strain_buffer, _m.displ_buffer)]
+    fails = [_b._fails for _b in buffers]
+    st_2 = db_2.get_seismograms(source=src, receiver=rec)
+    st_2 += db_2.get_seismograms(source=force_src, receiver=rec)
+    for tr, tr_2 in zip(st, st_2):
+        np.testing.assert_allclose(tr.data, tr_2.data)
+    assert [_b._fails for _b in buffers] == fails
+
+    with pytest.raises(ValueError):
+        db_2.preload_elements([("velocity", 1)])
+
+
+def test_warm_up_region():
+    from instaseis.database_interfaces import find_and_open_files
+
+    db = find_and_open_files(os.path.join(DATA, "100s_db_bwd_displ_only"))
+    region = {"min_depth_in_m": 100E3, "max_depth_in_m": 200E3,
+              "min_distance_in_degree": 0.0, "max_distance_in_degree": 30.0}
+
+    # Midpoints of the elements.
+    points = np.asarray(db.parsed_mesh.mesh[:], dtype=np.float64)
+    depth = db.info.planet_radius - np.hypot(points[:, 0], points[:, 1])
+    distance = np.rad2deg(np.arctan2(points[:, 0], points[:, 1]))
+
+    ids = db.get_elements_in_region(**region)
+    assert len(ids) > 3
+    assert np.all((depth[ids] >= 100E3) & (depth[ids] <= 200E3))
+    assert np.all((distance[ids] >= 0.0) & (distance[ids] <= 30.0))
+    # Deepest first.
+    assert np.all(np.diff(depth[ids]) <= 0)
+    # A larger region contains all of them.
+    larger = db.get_elements_in_region(min_depth_in_m=100E3,
+                                       max_depth_in_m=200E3)
+    assert len(larger) > len(ids)
+    assert set(ids).issubset(larger)
+    assert len(db.get_elements_in_region(max_depth_in_m=1.0)) == 0
+
+    # Nothing is buffered yet.
+    assert db.get_hot_elements() == []
+
+    # Only the shallowest elements are loaded, the shallowest last so it
+    # is the most recently used one.
+    progress = []
+    assert db.preload_region(
+        max_elements=3,
+        progress_callback=lambda *args: progress.append(args),
+        **region) == 3
+    assert progress == [(1, 3), (2, 3), (3, 3)]
+    expected = [("strain", int(_i)) for _i in ids[-3:]]
+    assert db.get_hot_elements() == expected
+    for m in (db.meshes.px, db.meshes.pz):
+        for _, id_elem in expected:
+            assert id_elem in m.strain_buffer
+        assert m.displ_buffer.get_size_mb() == 0
+
+    # Loading the whole region keeps the elements already loaded and adds
+    # all others.
+    assert db.preload_region(**region) == len(ids)
+    assert sorted(db.get_hot_elements()) == sorted(
+        ("strain", int(_i)) for _i in ids)
+
+    # Forward databases fill the displacement buffers.
+    fwd_db = find_and_open_files(os.path.join(DATA, "100s_db_fwd"))
+    assert fwd_db.preload_region(max_elements=2) == 2
+    assert [_i[0] for _i in fwd_db.get_hot_elements()] == \
+        ["displacement"] * 2
+
+
+def test_access_log_and_buffer_simulation(tmpdir):
+    from instaseis import Source, Receiver
+    from instaseis.database_interfaces import find_and_open_files
+    from instaseis.database_interfaces.element_log import (read_access_log,
+                                                           read_element_log)
+    from instaseis.scripts.simulate_buffers import simulate
+
+    filename = str(tmpdir.join("access.log"))
+    db = find_and_open_files(os.path.join(DATA, "100s_db_bwd_displ_only"),
+                             access_log=filename)
+    rec = Receiver(latitude=10., longitude=20.)
+    for _ in range(2):
+        for lat in (4.0, 40.0):
+            src = Source(latitude=lat, longitude=3.0, depth_in_m=0,
+                         m_rr=4.71e+17, m_tt=3.81e+17, m_pp=-4.74e+17,
+                         m_rt=3.99e+17, m_rp=-8.05e+17, m_tp=-1.23e+17)
+            db.get_seismograms(source=src, receiver=rec)
+    db.access_recorder.close()
+
+    accesses = read_access_log(filename)
+    # Two elements of the PX and PZ meshes, all missed the first time.
+    assert len(accesses) == 8
+    assert [_i.hit for _i in accesses] == [False] * 4 + [True] * 4
+    assert set(_i.mesh for _i in accesses) == set(
+        os.path.join(_i, "Data", "ordered_output.nc4") for _i in ("PX", "PZ"))
+    for a in accesses:
+        assert a.kind == "strain"
+        assert a.nbytes > 0
+        if a.hit:
+            assert a.io_time == a.compute_time == 0.0
+        else:
+            assert a.io_time > 0
+            assert a.compute_time > 0
+    assert read_element_log(filename) == [
+        (_i.kind, _i.id_elem) for _i in accesses]
+
+    # Large enough buffers reproduce the recorded hits.
+    r = simulate(accesses, size_in_mb=100)
+    assert r["hits"] == 4
+    assert r["hit_rate"] == 0.5
+    np.testing.assert_allclose(
+        r["total_time_in_s"],
+        sum(_i.io_time + _i.compute_time for _i in accesses))
+    # Each buffer only fits a single element.
+    nbytes = accesses[0].nbytes
+    for policy in ("lru", "lfu"):
+        r = simulate(accesses, size_in_mb=1.5 * nbytes / 1024 ** 2,
+                     policy=policy)
+        assert r["hits"] == 0
+        assert r["mean_latency_in_s"] > 0
+    # A shared cache needs space for all four.
+    assert simulate(accesses, size_in_mb=3.5 * nbytes / 1024 ** 2,
+                    shared=True)["hits"] == 0
+    assert simulate(accesses, size_in_mb=4.5 * nbytes / 1024 ** 2,
+                    shared=True)["hits"] == 4
+
+
+def test_element_prefetcher():
+    import threading
+    from instaseis.database_interfaces.prefetch import ElementPrefetcher
+
+    reads = []
+    main_thread = threading.current_thread()
+
+    def read(key):
+        assert threading.current_thread() is not main_thread
+        reads.append(key)
+        return None if key == "skip" else key.upper()
+
+    tasks = [(0, "a", ("a",)), (0, "skip", ("skip",)), (1, "b", ("b",)),
+             (2, "a", ("a",)), (3, "c", ("c",)), (4, "d", ("d",))]
+    with ElementPrefetcher(read, tasks, depth=2) as prefetcher:
+        prefetcher.advance(0)
+        assert prefetcher.take("a") == "A"
+        # Nothing was read for it - the caller has to read it.
+        assert prefetcher.take("skip") is None
+        assert prefetcher.take("unknown") is None
+        prefetcher.advance(1)
+        assert prefetcher.take("b") == "B"
+        # Only taken once.
+        assert prefetcher.take("b") is None
+        # Skipped as the caller moves past it.
+        prefetcher.advance(4)
+        assert prefetcher.take("d") == "D"
+        assert prefetcher._data == {}
+
+    # Duplicates are only read once.
+    assert reads == ["a", "skip", "b", "d"]
+
+    with pytest.raises(ValueError):
+        ElementPrefetcher(read, tasks, depth=0)
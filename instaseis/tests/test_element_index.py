@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for the element index.
+
+:copyright:
+    The Instaseis Development Team (instaseis@googlegroups.com), 2026
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+from __future__ import absolute_import, division
+
+import inspect
+import os
+
+import numpy as np
+
+from instaseis.database_interfaces import find_and_open_files
+from instaseis.database_interfaces.base_netcdf_instaseis_db import \
+    Coordinates
+from instaseis.database_interfaces.element_index import (ElementIndex,
+                                                         ElementInfoCache)
+
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(
+    inspect.getfile(inspect.currentframe()))), "data")
+DB = os.path.join(DATA, "100s_db_bwd_displ_only")
+
+
+def _random_points(db, n):
+    np.random.seed(12345)
+    r = np.random.uniform(db.info.min_radius, db.info.max_radius, n)
+    theta = np.random.uniform(0.0, np.pi, n)
+    return r * np.sin(theta), r * np.cos(theta)
+
+
+def test_element_index_vs_kdtree():
+    """
+    The index must find the same elements as the kd-tree based search.
+    """
+    db = find_and_open_files(DB)
+    index = ElementIndex.from_mesh(db.parsed_mesh)
+
+    s, z = _random_points(db, 200)
+    ids, xi, eta = index.locate(s, z)
+    assert (ids >= 0).all()
+
+    for _i in range(len(s)):
+        ref_id, ref_xi, ref_eta = db._find_element_kdtree(
+            Coordinates(s=s[_i], phi=0.0, z=z[_i]))
+        # Points on element boundaries can be found in either element -
+        # only the location must be identical.
+        if ids[_i] == ref_id:
+            np.testing.assert_allclose([xi[_i], eta[_i]], [ref_xi, ref_eta])
+        else:  # pragma: no cover
+            assert max(abs(abs(xi[_i]) - 1), abs(abs(eta[_i]) - 1)) < 1E-3
+
+    # Single point queries give the same result.
+    for _i in range(len(s)):
+        assert index.locate_point(s[_i], z[_i]) == (ids[_i], xi[_i], eta[_i])
+
+    # Points outside of the mesh.
+    ids, xi, eta = index.locate([-1E9, 1E9], [0.0, 0.0])
+    assert (ids == -1).all()
+    assert np.isnan(xi).all()
+    assert np.isnan(eta).all()
+
+    # Points sharing a cell and mixed with points outside of the mesh.
+    ids, xi, eta = index.locate([s[0], -1E9, s[0], s[1]],
+                                [z[0], 0.0, z[0], z[1]])
+    assert ids[1] == -1
+    for _i, _j in ((0, 0), (2, 0), (3, 1)):
+        assert index.locate_point(s[_j], z[_j]) == \
+            (ids[_i], xi[_i], eta[_i])
+
+
+def test_element_index_disk_cache(tmpdir):
+    cache_dir = os.path.join(tmpdir.strpath, "cache")
+    db = find_and_open_files(DB, element_index_cache_dir=cache_dir)
+    index = db.element_index
+    files = os.listdir(cache_dir)
+    assert len(files) == 1
+    assert files[0].startswith("element_index_")
+
+    # Open again - must load the very same index.
+    db_2 = find_and_open_files(DB, element_index_cache_dir=cache_dir)
+    index_2 = db_2.element_index
+    assert os.listdir(cache_dir) == files
+    assert index_2.shape == index.shape
+    assert index_2.cell_size == index.cell_size
+    np.testing.assert_equal(index_2.offsets, index.offsets)
+    np.testing.assert_equal(index_2.elements, index.elements)
+    np.testing.assert_equal(index_2.corner_points, index.corner_points)
+
+
+def test_seismograms_with_and_without_element_index():
+    from instaseis import Source, Receiver
+
+    src = Source(latitude=4., longitude=3.0, depth_in_m=0,
+                 m_rr=4.71e+17, m_tt=3.81e+17, m_pp=-4.74e+17,
+                 m_rt=3.99e+17, m_rp=-8.05e+17, m_tp=-1.23e+17)
+    rec = Receiver(latitude=10., longitude=20.)
+
+    st_1 = find_and_open_files(DB, use_element_index=True).get_seismograms(
+        source=src, receiver=rec)
+    st_2 = find_and_open_files(DB, use_element_index=False).get_seismograms(
+        source=src, receiver=rec)
+    for tr_1, tr_2 in zip(st_1, st_2):
+        np.testing.assert_allclose(tr_1.data, tr_2.data)
+
+
+def test_element_info_cache():
+    cache = ElementInfoCache(max_items=2, quantum_in_m=1.0)
+    assert cache.efficiency == 0.0
+    assert cache.get(0.0, 0.0) is None
+
+    cache.add(0.0, 0.0, "a")
+    # Same quantized coordinates.
+    assert cache.get(0.3, -0.4) == "a"
+    assert cache.get(0.6, 0.0) is None
+    assert cache.hits == 1
+    assert cache.misses == 2
+
+    cache.add(10.0, 0.0, "b")
+    # Access "a" so "b" is the least recently used item.
+    assert cache.get(0.0, 0.0) == "a"
+    cache.add(20.0, 0.0, "c")
+    assert len(cache) == 2
+    assert cache.get(10.0, 0.0) is None
+    assert cache.get(0.0, 0.0) == "a"
+    assert cache.get(20.0, 0.0) == "c"
+    assert cache.efficiency == 4.0 / 7.0
+
+    # Disabled cache.
+    cache = ElementInfoCache(max_items=0)
+    cache.add(0.0, 0.0, "a")
+    assert len(cache) == 0
+    assert cache.get(0.0, 0.0) is None
+
+
+def test_element_info_cache_in_database():
+    from instaseis import Source, Receiver
+
+    src = Source(latitude=4., longitude=3.0, depth_in_m=0,
+                 m_rr=4.71e+17, m_tt=3.81e+17, m_pp=-4.74e+17,
+                 m_rt=3.99e+17, m_rp=-8.05e+17, m_tp=-1.23e+17)
+    rec = Receiver(latitude=10., longitude=20.)
+
+    db = find_and_open_files(DB)
+    st_1 = db.get_seismograms(source=src, receiver=rec, components="RT")
+    assert db.element_info_cache.misses == 1
+    assert db.element_info_cache.hits == 0
+    st_2 = db.get_seismograms(source=src, receiver=rec, components="RT")
+    assert db.element_info_cache.hits == 1
+    for comp in "RT":
+        np.testing.assert_allclose(st_1.select(component=comp)[0].data,
+                                   st_2.select(component=comp)[0].data)
+
+    db = find_and_open_files(DB, element_info_cache_size=0)
+    db.get_seismograms(source=src, receiver=rec)
+    db.get_seismograms(source=src, receiver=rec)
+    assert db.element_info_cache.hits == 0
+    assert len(db.element_info_cache) == 0
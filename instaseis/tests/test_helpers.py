@@ -11,7 +11,9 @@ Tests for some helper routines.
 """
 from __future__ import absolute_import, division
 
-from instaseis.helpers import io_chunker
+import numpy as np
+
+from instaseis.helpers import io_chunker, plan_reads
 
 
 def test_io_chunker():
@@ -29,3 +31,25 @@ def test_io_chunker():
     # A couple more complex cases.
     assert io_chunker([0, 1, 2, 4, 6, 7, 8]) == [[0, 3], 4, [6, 9]]
     assert io_chunker([0, 2, 4, 6, 7, 8, 10]) == [0, 2, 4, [6, 9], 10]
+
+
+def test_plan_reads():
+    ranges, positions = plan_reads([0, 1, 2, 4, 6, 7, 8])
+    assert ranges == [(0, 3), (4, 5), (6, 9)]
+    np.testing.assert_equal(positions, [0, 1, 2, 3, 4, 5, 6])
+
+    # Read over gaps of one item.
+    ranges, positions = plan_reads([0, 1, 2, 4, 6, 7, 8], max_gap=1)
+    assert ranges == [(0, 9)]
+    np.testing.assert_equal(positions, [0, 1, 2, 4, 6, 7, 8])
+
+    # Works with unsorted indices and keeps their order.
+    ranges, positions = plan_reads([20, 3, 1, 2, 17], max_gap=2)
+    assert ranges == [(1, 4), (17, 21)]
+    np.testing.assert_equal(positions, [6, 2, 0, 1, 3])
+    data = np.concatenate([np.arange(_a, _b) for _a, _b in ranges])
+    np.testing.assert_equal(data[positions], [20, 3, 1, 2, 17])
+
+    ranges, positions = plan_reads([])
+    assert ranges == []
+    assert len(positions) == 0
@@ -12,14 +12,17 @@ Basic integration tests for the AxiSEM database Python interface.
 """
 from __future__ import absolute_import
 
+import h5py
 import inspect
 import io
 import math
+import multiprocessing
 import numpy as np
 import obspy
 import os
 import pytest
 import shutil
+import threading
 
 import instaseis
 from instaseis import InstaseisError, InstaseisNotFoundError
@@ -62,6 +65,8 @@ for name, path in pytest.config.dbs["databases"].items():
     TEST_DATA[path] = test_data
 
 BW_DISPL_DBS = [_i for _i in DBS if "_db_bwd_displ_" in _i]
+MERGED_BW_DISPL_DBS = [_i for _i in BW_DISPL_DBS
+                       if os.path.basename(_i).startswith("merged")]
 
 
 @pytest.mark.parametrize("bwd_db", BW_DISPL_DBS)
@@ -1718,6 +1723,348 @@ def test_merged_forward_database_layout():
                 assert st_fwd == st_fwd_m
 
 
+def test_merged_forward_database_multi_point_interpolation(monkeypatch):
+    """
+    Interpolating all components of the merged forward database in a single
+    call must give the same seismograms as one call per component.
+    """
+    from instaseis import spectral_basis
+
+    def per_component(points1, points2, coefficients, x1, x2,
+                      dtype=np.float64):
+        return np.array([
+            spectral_basis.lagrange_interpol_2D_td(
+                points1=points1, points2=points2,
+                coefficients=coefficients[:, :, :, _i], x1=x1[0], x2=x2[0],
+                dtype=dtype)
+            for _i in range(coefficients.shape[-1])]).T[:, :, np.newaxis]
+
+    db = instaseis.open_db(
+        pytest.config.dbs["databases"]["merged_100s_db_fwd"])
+    receiver = Receiver(latitude=10.0, longitude=20.0)
+    source = Source(latitude=-10.0, longitude=50.0,
+                    m_rr=4.710000e+24 / 1E7, m_tt=3.810000e+22 / 1E7,
+                    m_pp=-4.740000e+24 / 1E7, m_rt=3.990000e+23 / 1E7,
+                    m_rp=-8.050000e+23 / 1E7, m_tp=-1.230000e+24 / 1E7)
+    components = ("Z", "N", "E", "R", "T")
+
+    st = db.get_seismograms(source=source, receiver=receiver,
+                            components=components)
+    db.parsed_mesh.displ_buffer.clear()
+    monkeypatch.setattr(spectral_basis, "lagrange_interpol_2D_td_multi",
+                        per_component)
+    st_ref = db.get_seismograms(source=source, receiver=receiver,
+                                components=components)
+    for tr, tr_ref in zip(st, st_ref):
+        np.testing.assert_allclose(tr.data, tr_ref.data, rtol=1E-10,
+                                   atol=1E-12 * np.abs(tr_ref.data).max())
+
+
+@pytest.mark.skipif(
+    "merged_strain_100s_db_bwd_displ_only" not in pytest.config.dbs[
+        "databases"],
+    reason="requires generated tests databases.")
+@pytest.mark.parametrize("strain_dtype", ["float16", "float32"])
+@pytest.mark.parametrize("subfolders", [["PX", "PZ"], ["PX"], ["PZ"]])
+def test_merged_strain_database_layout(tmpdir, monkeypatch, strain_dtype,
+                                       subfolders):
+    """
+    Databases with precomputed strain must return the same seismograms as
+    the original ones without ever computing the strain.
+    """
+    from instaseis.database_interfaces.reciprocal_merged_strain_instaseis_db \
+        import ReciprocalMergedStrainInstaseisDB
+    from instaseis.scripts.repack_db import merge_files
+
+    db = os.path.join(DATA, "100s_db_bwd_displ_only")
+    merge_files(filenames=[os.path.join(db, _i, "Data", "ordered_output.nc4")
+                           for _i in subfolders],
+                output_folder=tmpdir.strpath, contiguous=True,
+                compression_level=None, quiet=True, strain_dtype=strain_dtype)
+
+    ref_db = find_and_open_files(db)
+    strain_db = find_and_open_files(tmpdir.strpath)
+    assert isinstance(strain_db, ReciprocalMergedStrainInstaseisDB)
+
+    def _raise(*args, **kwargs):
+        raise AssertionError("Strain must not be computed.")
+    monkeypatch.setattr(instaseis.sem_derivatives, "strain_monopole_td",
+                        _raise)
+    monkeypatch.setattr(instaseis.sem_derivatives, "strain_dipole_td",
+                        _raise)
+
+    components = []
+    if "PZ" in subfolders:
+        components.append("Z")
+    if "PX" in subfolders:
+        components.extend(["N", "E"])
+
+    src = Source(latitude=4., longitude=3.0, depth_in_m=0,
+                 m_rr=4.71e+17, m_tt=3.81e+17, m_pp=-4.74e+17,
+                 m_rt=3.99e+17, m_rp=-8.05e+17, m_tp=-1.23e+17)
+    rec = Receiver(latitude=10., longitude=20.)
+
+    st = strain_db.get_seismograms(source=src, receiver=rec,
+                                   components=components)
+    monkeypatch.undo()
+    st_ref = ref_db.get_seismograms(source=src, receiver=rec,
+                                    components=components)
+
+    rtol = 1E-2 if strain_dtype == "float16" else 1E-5
+    for tr, tr_ref in zip(st, st_ref):
+        np.testing.assert_allclose(
+            tr.data, tr_ref.data, rtol=rtol,
+            atol=np.abs(tr_ref.data).max() * rtol)
+
+
+@pytest.mark.skipif(
+    "merged_100s_db_bwd_displ_only" not in pytest.config.dbs["databases"],
+    reason="requires generated tests databases.")
+@pytest.mark.parametrize("block_size_in_mb", [0.05, 64])
+@pytest.mark.parametrize("processes", [1, 2])
+def test_merge_in_blocks_and_processes(tmpdir, monkeypatch,
+                                       block_size_in_mb, processes):
+    """
+    The merged database must not depend on the block size and the number
+    of processes.
+    """
+    from instaseis.scripts import repack_db
+
+    monkeypatch.setattr(repack_db, "BLOCK_SIZE_IN_MB", block_size_in_mb)
+    db = os.path.join(DATA, "100s_db_bwd_displ_only")
+    repack_db.merge_files(
+        filenames=[os.path.join(db, _i, "Data", "ordered_output.nc4")
+                   for _i in ["PX", "PZ"]],
+        output_folder=tmpdir.strpath, contiguous=True,
+        compression_level=None, quiet=True, processes=processes)
+
+    ref = os.path.join(pytest.config.dbs["databases"][
+        "merged_100s_db_bwd_displ_only"], "merged_output.nc4")
+    with h5py.File(ref, "r") as f_ref, \
+            h5py.File(os.path.join(tmpdir.strpath, "merged_output.nc4"),
+                      "r") as f:
+        np.testing.assert_equal(f["MergedSnapshots"][:],
+                                f_ref["MergedSnapshots"][:])
+        np.testing.assert_equal(f["Mesh"]["sem_mesh"][:],
+                                f_ref["Mesh"]["sem_mesh"][:])
+
+
+@pytest.mark.parametrize("method", ["merge", "transpose"])
+def test_resume_interrupted_repacking(tmpdir, monkeypatch, method):
+    """
+    Interrupted repacking runs can be resumed. Corrupted blocks are
+    detected and rewritten.
+    """
+    from instaseis.scripts import repack_db
+
+    class Interrupted(Exception):
+        pass
+
+    monkeypatch.setattr(repack_db, "BLOCK_SIZE_IN_MB", 0.2)
+    monkeypatch.setattr(repack_db, "COPY_SIZE_IN_MB", 0.2)
+
+    db = os.path.join(DATA, "100s_db_bwd_displ_only")
+    inputs = [os.path.join(db, _i, "Data", "ordered_output.nc4")
+              for _i in ["PX", "PZ"]]
+    if method == "merge":
+        options = {"contiguous": False, "strain_dtype": None,
+                   "compression_level": 2, "layout": "c"}
+    else:
+        inputs = inputs[:1]
+        options = {"contiguous": False, "transpose": True,
+                   "compression_level": 2}
+
+    def run(folder, resume=False):
+        if method == "merge":
+            repack_db.merge_files(
+                filenames=inputs, output_folder=folder, contiguous=False,
+                compression_level=2, quiet=True, resume=resume)
+            return os.path.join(folder, "merged_output.nc4")
+        output = os.path.join(folder, "ordered_output.nc4")
+        repack_db.repack_file(
+            input_filename=inputs[0], output_filename=output,
+            contiguous=False, compression_level=2, transpose=True,
+            quiet=True, resume=resume)
+        return output
+
+    added = []
+    interrupt = [False]
+    original_add = repack_db.RepackCheckpoint.add
+
+    def add(self, **kwargs):
+        if interrupt[0] and len(added) == 3:
+            raise Interrupted
+        added.append(kwargs["name"])
+        return original_add(self, **kwargs)
+
+    monkeypatch.setattr(repack_db.RepackCheckpoint, "add", add)
+
+    ref_folder = tmpdir.mkdir("reference").strpath
+    reference = run(ref_folder)
+    total = len(added)
+    assert total > 5
+    assert sorted(os.listdir(ref_folder)) == [
+        os.path.basename(reference), os.path.basename(reference) +
+        ".checkpoint"]
+
+    folder = tmpdir.mkdir("output").strpath
+    del added[:]
+    interrupt[0] = True
+    with pytest.raises(Interrupted):
+        run(folder)
+    interrupt[0] = False
+    output = os.path.join(folder, os.path.basename(reference))
+    checkpoint_file = output + ".checkpoint"
+    assert os.path.exists(checkpoint_file)
+
+    # The output exists and can only be resumed.
+    with pytest.raises(ValueError):
+        run(folder)
+
+    # Corrupt the first recorded block.
+    with io.open(checkpoint_file, "rt") as fh:
+        name, axis, start, stop, _ = [
+            _i.split() for _i in fh.read().splitlines()[1:]
+            if len(_i.split()) == 5][0]
+    with h5py.File(output, "r+") as f:
+        index = [slice(None)] * len(f[name].shape)
+        index[int(axis)] = slice(int(start), int(stop))
+        f[name][tuple(index)] = 0
+    with pytest.raises(ValueError) as err:
+        repack_db.RepackCheckpoint(output, inputs, options).verify(output)
+    assert "Checksum mismatch" in err.value.args[0]
+
+    # Resume - the interrupted and the corrupted block are written again.
+    del added[:]
+    run(folder, resume=True)
+    assert len(added) == total - 3 + 1
+    assert sorted(os.listdir(folder)) == sorted(os.listdir(ref_folder))
+
+    with h5py.File(reference, "r") as f_ref, h5py.File(output, "r") as f:
+        def check(path, obj):
+            if isinstance(obj, h5py.Dataset):
+                np.testing.assert_equal(f[path][...], obj[...])
+        f_ref.visititems(check)
+
+    # Resuming a complete run only verifies it.
+    del added[:]
+    run(folder, resume=True)
+    assert not added
+    with h5py.File(output, "r+") as f:
+        index = [slice(None)] * len(f[name].shape)
+        index[int(axis)] = slice(int(start), int(stop))
+        f[name][tuple(index)] = 0
+    with pytest.raises(ValueError) as err:
+        run(folder, resume=True)
+    assert "Checksum mismatch" in err.value.args[0]
+
+    # Output files without a checkpoint are never accepted.
+    os.remove(checkpoint_file)
+    with pytest.raises(ValueError) as err:
+        run(folder, resume=True)
+    assert "no checkpoint" in err.value.args[0]
+
+    # Interrupted while creating the output file - the checkpoint has
+    # already been started and the run starts over.
+    folder = tmpdir.mkdir("output_2").strpath
+    output = os.path.join(folder, os.path.basename(reference))
+    repack_db.RepackCheckpoint(output, inputs, options).begin()
+    with io.open(output, "wb") as fh:
+        fh.write(b"truncated")
+    del added[:]
+    run(folder, resume=True)
+    assert len(added) == total
+
+
+@pytest.mark.parametrize("subfolders", [["PX", "PZ"], ["PX"], ["PZ"]])
+def test_merged_fortran_layout(tmpdir, subfolders):
+    """
+    Merged databases in the Fortran layout must return the same
+    seismograms as the original ones.
+    """
+    from instaseis.scripts.repack_db import merge_files
+
+    db = os.path.join(DATA, "100s_db_bwd_displ_only")
+    merge_files(filenames=[os.path.join(db, _i, "Data", "ordered_output.nc4")
+                           for _i in subfolders],
+                output_folder=tmpdir.strpath, contiguous=False,
+                compression_level=2, quiet=True, layout="fortran")
+
+    ref_db = find_and_open_files(db)
+    fortran_db = find_and_open_files(tmpdir.strpath)
+    assert fortran_db.meshes.merged.merged_layout == "fortran"
+
+    components = []
+    if "PZ" in subfolders:
+        components.append("Z")
+    if "PX" in subfolders:
+        components.extend(["N", "E"])
+
+    src = Source(latitude=4., longitude=3.0, depth_in_m=0,
+                 m_rr=4.71e+17, m_tt=3.81e+17, m_pp=-4.74e+17,
+                 m_rt=3.99e+17, m_rp=-8.05e+17, m_tp=-1.23e+17)
+    rec = Receiver(latitude=10., longitude=20.)
+    st = fortran_db.get_seismograms(source=src, receiver=rec,
+                                    components=components)
+    st_ref = ref_db.get_seismograms(source=src, receiver=rec,
+                                    components=components)
+    for tr, tr_ref in zip(st, st_ref):
+        np.testing.assert_allclose(tr.data, tr_ref.data, rtol=1E-7,
+                                   atol=1E-12)
+
+    # The reordered data is ready for the Fortran routines and in single
+    # precision just a view of the data read from the file.
+    utemp = fortran_db._get_and_reorder_utemp(0)
+    assert utemp.flags["F_CONTIGUOUS"]
+    assert utemp.dtype == np.float64
+    utemp = find_and_open_files(
+        tmpdir.strpath, precision="float32")._get_and_reorder_utemp(0)
+    assert utemp.flags["F_CONTIGUOUS"]
+    assert utemp.dtype == np.float32
+    assert utemp.base is not None
+
+    # The same in the C layout which requires a copy.
+    utemp = find_and_open_files(
+        pytest.config.dbs["databases"][
+            "merged_100s_db_bwd_displ_only"])._get_and_reorder_utemp(0)
+    assert utemp.flags["F_CONTIGUOUS"]
+    assert utemp.dtype == np.float64
+
+
+@pytest.mark.parametrize("db", MERGED_BW_DISPL_DBS)
+def test_repeated_force_source_extraction_from_buffer(db):
+    """
+    Force sources use the buffered displacement - which must not be
+    modified by the extraction.
+    """
+    db = find_and_open_files(db)
+    src = ForceSource(latitude=4., longitude=3.0, f_r=1E10, f_t=1E10,
+                      f_p=1E10)
+    rec = Receiver(latitude=10., longitude=20.)
+    st_1 = db.get_seismograms(source=src, receiver=rec, components="ZNE")
+    st_2 = db.get_seismograms(source=src, receiver=rec, components="ZNE")
+    for tr_1, tr_2 in zip(st_1, st_2):
+        np.testing.assert_equal(tr_1.data, tr_2.data)
+
+
+def test_merged_strain_database_requires_reciprocal_database(tmpdir):
+    """
+    The strain can only be precomputed for reciprocal databases.
+    """
+    from instaseis.scripts.repack_db import merge_files
+
+    db = os.path.join(DATA, "100s_db_fwd")
+    with pytest.raises(ValueError) as err:
+        merge_files(filenames=[
+            os.path.join(db, _i, "Data", "ordered_output.nc4")
+            for _i in ["MZZ", "MXX_P_MYY", "MXZ_MYZ", "MXY_MXX_M_MYY"]],
+            output_folder=tmpdir.strpath, contiguous=True,
+            compression_level=None, quiet=True, strain_dtype="float32")
+    assert err.value.args[0] == (
+        "The strain can only be precomputed for reciprocal databases.")
+    assert not os.listdir(tmpdir.strpath)
+
+
 @pytest.mark.parametrize("bwd_db", BW_DISPL_DBS)
 def test_error_handling_source_too_deep(bwd_db):
     """
@@ -1930,3 +2277,525 @@ def test_no_downsampling(bwd_db):
         "The database is sampled with a sample spacing of 24.725 seconds. You "
         "must not pass a 'dt' larger than that as that would be a "
         "downsampling operation which Instaseis does not do.")
+
+
+@pytest.mark.parametrize("db", DBS)
+def test_get_seismograms_batch(db):
+    """
+    The batch extraction must give the same results as individual calls to
+    get_seismograms().
+    """
+    db = find_and_open_files(db)
+    depth = 0 if db.info.is_reciprocal else None
+
+    src = Source(latitude=4., longitude=3.0, depth_in_m=depth,
+                 m_rr=4.71e+17, m_tt=3.81e+17, m_pp=-4.74e+17,
+                 m_rt=3.99e+17, m_rp=-8.05e+17, m_tp=-1.23e+17)
+    # Some receivers are close enough to share an element.
+    receivers = [Receiver(latitude=lat, longitude=lon)
+                 for lat, lon in [(10., 20.), (10.01, 20.01), (10., 20.02),
+                                  (-20., 30.), (40., -50.), (10., 20.)]]
+    components = db.default_components
+
+    for kwargs in [{}, {"kind": "velocity", "dt": 10.0},
+                   {"remove_source_shift": False}]:
+        batch = db.get_seismograms_batch(source=src, receivers=receivers,
+                                         **kwargs)
+        assert batch.shape[:2] == (len(receivers), len(components))
+        for _i, rec in enumerate(receivers):
+            st = db.get_seismograms(source=src, receiver=rec, **kwargs)
+            for _j, comp in enumerate(components):
+                np.testing.assert_allclose(
+                    batch[_i, _j], st.select(component=comp)[0].data,
+                    rtol=1E-7, atol=1E-12)
+
+    # Multiple sources and a single receiver.
+    sources = [Source(latitude=lat, longitude=lon, depth_in_m=depth,
+                      m_rr=4.71e+17, m_tt=3.81e+17, m_pp=-4.74e+17,
+                      m_rt=3.99e+17, m_rp=-8.05e+17, m_tp=-1.23e+17)
+               for lat, lon in [(4., 3.), (4.01, 3.01), (-10., 12.)]]
+    rec = receivers[0]
+    batch = db.get_seismograms_batch_sources(
+        sources=sources, receiver=rec, components=components[::-1])
+    for _i, s in enumerate(sources):
+        st = db.get_seismograms(source=s, receiver=rec)
+        for _j, comp in enumerate(components[::-1]):
+            np.testing.assert_allclose(
+                batch[_i, _j], st.select(component=comp)[0].data,
+                rtol=1E-7, atol=1E-12)
+
+
+@pytest.mark.parametrize("db", DBS)
+def test_concurrent_extraction_is_identical_to_serial(db):
+    """
+    Hammer a single database with many threads sharing a small cache and
+    make sure the results are bit-identical to a serial extraction.
+    """
+    import threading
+    from instaseis.database_interfaces.mesh import CacheManager
+
+    serial_db = find_and_open_files(db, buffer_size_in_mb=0)
+    depth = 0 if serial_db.info.is_reciprocal else None
+    jobs = [(Source(latitude=lat, longitude=lon, depth_in_m=depth,
+                    m_rr=4.71e+17, m_tt=3.81e+17, m_pp=-4.74e+17,
+                    m_rt=3.99e+17, m_rp=-8.05e+17, m_tp=-1.23e+17),
+             Receiver(latitude=rlat, longitude=rlon))
+            for lat, lon, rlat, rlon in [
+                (4., 3., 10., 20.), (4., 3., 10.01, 20.01),
+                (-10., 12., 40., -50.), (30., -20., -20., 30.),
+                (4., 3., -60., 100.), (-45., 170., 10., 20.)]]
+    expected = [serial_db.get_seismograms(source=src, receiver=rec)
+                for src, rec in jobs]
+
+    # Small enough to force constant evictions.
+    manager = CacheManager(max_size_in_mb=0.5)
+    shared_db = find_and_open_files(db, cache_manager=manager)
+    n_threads = 8
+    results = [[None] * len(jobs) for _ in range(n_threads)]
+    errors = []
+
+    def worker(idx):
+        try:
+            for _ in range(3):
+                # Every thread has its own order.
+                for _j in np.random.RandomState(idx).permutation(len(jobs)):
+                    src, rec = jobs[_j]
+                    results[idx][_j] = shared_db.get_seismograms(
+                        source=src, receiver=rec)
+        except Exception as e:  # pragma: no cover
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(_i,))
+               for _i in range(n_threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    assert manager.get_size_mb() <= 0.5
+    for thread_results in results:
+        for st, st_expected in zip(thread_results, expected):
+            assert len(st) == len(st_expected)
+            for tr, tr_expected in zip(st, st_expected):
+                assert tr.id == tr_expected.id
+                np.testing.assert_array_equal(tr.data, tr_expected.data)
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"),
+                    reason="Requires forking processes.")
+@pytest.mark.parametrize("db", DBS)
+def test_shared_data_in_forked_processes(db):
+    """
+    Databases opened before forking processes must give identical results in
+    all processes after reopening the files.
+    """
+    import multiprocessing
+
+    db = find_and_open_files(db)
+    db.load_shared_data()
+    for m in db.meshes:
+        if m is None:
+            continue
+        # Nothing but the file itself may refer to the file.
+        assert not [_i for _i in m.__dict__.values()
+                    if isinstance(_i, h5py.Dataset)]
+
+    depth = 0 if db.info.is_reciprocal else None
+    src = Source(latitude=4., longitude=3.0, depth_in_m=depth,
+                 m_rr=4.71e+17, m_tt=3.81e+17, m_pp=-4.74e+17,
+                 m_rt=3.99e+17, m_rp=-8.05e+17, m_tp=-1.23e+17)
+    receivers = [Receiver(latitude=10., longitude=20.),
+                 Receiver(latitude=-20., longitude=30.)]
+
+    def worker(idx, queue):
+        db.reopen_files()
+        st = db.get_seismograms(source=src, receiver=receivers[idx])
+        queue.put((idx, [tr.data for tr in st]))
+
+    # Forking is the default on Python 2 without get_context().
+    if hasattr(multiprocessing, "get_context"):
+        multiprocessing = multiprocessing.get_context("fork")
+    queue = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=worker, args=(_i, queue))
+                 for _i in range(len(receivers))]
+    for p in processes:
+        p.start()
+    results = dict(queue.get(timeout=60) for _ in processes)
+    for p in processes:
+        p.join()
+        assert p.exitcode == 0
+
+    for idx, rec in enumerate(receivers):
+        st = db.get_seismograms(source=src, receiver=rec)
+        assert len(st) == len(results[idx])
+        for tr, data in zip(st, results[idx]):
+            np.testing.assert_array_equal(tr.data, data)
+
+
+@pytest.mark.parametrize("db", DBS)
+def test_single_precision(db):
+    """
+    Seismograms computed in single precision must be very close to the
+    double precision ones while the buffers only need about half the
+    memory.
+    """
+    from instaseis.benchmark.precision import compare_precisions
+
+    report = compare_precisions(db, n=3)
+    assert report["max_relative_error"] < 1E-4
+    assert report["buffer_size_in_mb_float64"] > 0
+    for buffer in ("strain", "displ"):
+        size_64 = report["%s_buffer_size_in_mb_float64" % buffer]
+        size_32 = report["%s_buffer_size_in_mb_float32" % buffer]
+        if not size_64:
+            # Buffer not used by this kind of database.
+            assert size_32 == 0
+            continue
+        assert 0.4 < size_32 / size_64 < 0.6
+
+    assert find_and_open_files(db, precision="float32").dtype == np.float32
+
+
+def test_invalid_precision():
+    with pytest.raises(ValueError) as err:
+        find_and_open_files(os.path.join(DATA, "100s_db_bwd_displ_only"),
+                            precision="float16")
+    assert "precision" in str(err.value)
+
+
+@pytest.mark.parametrize("db", DBS)
+def test_get_element_order(db):
+    """
+    Pairs are sorted by the element containing their point of interest.
+    """
+    db = find_and_open_files(db)
+    depth = 0 if db.info.is_reciprocal else None
+    src = Source(latitude=4., longitude=3.0, depth_in_m=depth,
+                 m_rr=4.71e+17, m_tt=3.81e+17, m_pp=-4.74e+17,
+                 m_rt=3.99e+17, m_rp=-8.05e+17, m_tp=-1.23e+17)
+    receivers = [Receiver(latitude=lat, longitude=lon)
+                 for lat, lon in [(10., 20.), (-20., 30.), (10.01, 20.01),
+                                  (40., -50.), (10., 20.), (-60., 100.)]]
+    sources = [src] * len(receivers)
+
+    order = db.get_element_order(sources, receivers)
+    assert sorted(order) == list(range(len(receivers)))
+    ids = [db._get_element_info(db._get_coordinates(src, rec)).id_elem
+           for rec in receivers]
+    assert [ids[_i] for _i in order] == sorted(ids)
+    # Stable for pairs in the same element.
+    for _i, _j in zip(order[:-1], order[1:]):
+        if ids[_i] == ids[_j]:
+            assert _i < _j
+
+    assert len(db.get_element_order([], [])) == 0
+
+
+@pytest.mark.parametrize("db", DBS)
+def test_prefetching(db):
+    """
+    Reading elements ahead on a background thread does not change the
+    results.
+    """
+    ref_db = find_and_open_files(db, buffer_size_in_mb=0)
+    prefetch_db = find_and_open_files(db, buffer_size_in_mb=0,
+                                      prefetch_depth=2)
+    depth = 0 if ref_db.info.is_reciprocal else None
+    sources = [Source(latitude=lat, longitude=lon, depth_in_m=depth,
+                      m_rr=4.71e+17, m_tt=3.81e+17, m_pp=-4.74e+17,
+                      m_rt=3.99e+17, m_rp=-8.05e+17, m_tp=-1.23e+17)
+               for lat, lon in [(4., 3.), (4.01, 3.01), (-10., 12.),
+                                (30., -40.)]]
+    receivers = [Receiver(latitude=lat, longitude=lon)
+                 for lat, lon in [(10., 20.), (-20., 30.), (40., -50.),
+                                  (10., 20.)]]
+
+    np.testing.assert_allclose(
+        prefetch_db.get_seismograms_batch_sources(
+            sources=sources, receiver=receivers[0]),
+        ref_db.get_seismograms_batch_sources(
+            sources=sources, receiver=receivers[0]),
+        rtol=1E-7, atol=1E-12)
+    np.testing.assert_allclose(
+        prefetch_db.get_seismograms_batch(source=sources[0],
+                                          receivers=receivers),
+        ref_db.get_seismograms_batch(source=sources[0],
+                                     receivers=receivers),
+        rtol=1E-7, atol=1E-12)
+    assert getattr(prefetch_db._prefetchers, "current", None) is None
+
+    if not ref_db.info.is_reciprocal:
+        return
+    for src in sources:
+        src.set_sliprate_dirac(ref_db.info.dt, nsamp=100)
+    st = prefetch_db.get_seismograms_finite_source(
+        sources=sources, receiver=receivers[0])
+    st_ref = ref_db.get_seismograms_finite_source(
+        sources=sources, receiver=receivers[0])
+    for tr, tr_ref in zip(st, st_ref):
+        np.testing.assert_allclose(tr.data, tr_ref.data, rtol=1E-7,
+                                   atol=1E-12)
+
+
+@pytest.mark.parametrize("db", DBS)
+def test_coalesced_reads(db):
+    """
+    Merging the reads of nearby GLL points does not change the results.
+    """
+    dbs = [find_and_open_files(db, buffer_size_in_mb=0, max_read_gap=_i)
+           for _i in (0, 8, 100000)]
+    depth = 0 if dbs[0].info.is_reciprocal else None
+    src = Source(latitude=4., longitude=3.0, depth_in_m=depth,
+                 m_rr=4.71e+17, m_tt=3.81e+17, m_pp=-4.74e+17,
+                 m_rt=3.99e+17, m_rp=-8.05e+17, m_tp=-1.23e+17)
+    receivers = [Receiver(latitude=lat, longitude=lon)
+                 for lat, lon in [(10., 20.), (-20., 30.), (40., -50.)]]
+    ref = dbs[0].get_seismograms_batch(source=src, receivers=receivers)
+    for d in dbs[1:]:
+        np.testing.assert_array_equal(
+            d.get_seismograms_batch(source=src, receivers=receivers), ref)
+
+
+@pytest.mark.parametrize("bwd_db", BW_DISPL_DBS)
+def test_batch_reconvolve_stf(bwd_db):
+    """
+    Reconvolving all components and sources at once gives the same results
+    as the single seismogram route.
+    """
+    db = find_and_open_files(bwd_db)
+    sources = []
+    for _i, (lat, lon) in enumerate([(4., 3.), (-10., 12.), (30., 40.)]):
+        src = Source(latitude=lat, longitude=lon, depth_in_m=1000.0 * _i,
+                     m_rr=4.71e+17, m_tt=3.81e+17, m_pp=-4.74e+17,
+                     m_rt=3.99e+17, m_rp=-8.05e+17, m_tp=-1.23e+17)
+        sliprate = np.zeros(100)
+        sliprate[10 + _i:20 + 2 * _i] = 1.0
+        src.set_sliprate(sliprate, db.info.dt, time_shift=10.0 * _i,
+                         normalize=True)
+        sources.append(src)
+    rec = Receiver(latitude=10., longitude=20.)
+    components = db.default_components
+
+    batch = db.get_seismograms_batch_sources(
+        sources=sources, receiver=rec, components=components,
+        reconvolve_stf=True, remove_source_shift=False)
+    for _i, src in enumerate(sources):
+        st = db.get_seismograms(source=src, receiver=rec,
+                                components=components, reconvolve_stf=True,
+                                remove_source_shift=False)
+        for _j, comp in enumerate(components):
+            np.testing.assert_allclose(
+                batch[_i, _j], st.select(component=comp)[0].data,
+                rtol=1E-7, atol=1E-12)
+
+    # The spectrum of the database STF is only computed once.
+    assert db._get_stf_cache() is db._get_stf_cache()
+
+    sources[1].sliprate = None
+    with pytest.raises(ValueError) as err:
+        db.get_seismograms_batch_sources(sources=sources, receiver=rec,
+                                         reconvolve_stf=True,
+                                         remove_source_shift=False)
+    assert err.value.args[0] == "source has no source time function"
+
+
+@pytest.mark.parametrize("bwd_db", BW_DISPL_DBS)
+def test_finite_source_engines(bwd_db):
+    """
+    Summing the point sources in the frequency domain gives the same
+    results as summing the seismograms.
+    """
+    db = find_and_open_files(bwd_db)
+    sources = []
+    for _i in range(4):
+        src = Source(latitude=10.0 + 0.5 * _i, longitude=20.0,
+                     depth_in_m=5000.0 * _i,
+                     m_rr=4.71e+17, m_tt=3.81e+17, m_pp=-4.74e+17,
+                     m_rt=3.99e+17, m_rp=-8.05e+17, m_tp=-1.23e+17)
+        sliprate = np.zeros(100)
+        sliprate[10:20 + _i] = 1.0
+        src.set_sliprate(sliprate, db.info.dt, time_shift=5.0 * _i,
+                         normalize=True)
+        sources.append(src)
+    receiver = Receiver(latitude=42.6390, longitude=74.4940)
+
+    for kwargs in [{}, {"correct_mu": True},
+                   {"kind": "velocity", "dt": db.info.dt / 2}]:
+        st = db.get_seismograms_finite_source(
+            sources=sources, receiver=receiver, **kwargs)
+        st_ref = db.get_seismograms_finite_source(
+            sources=sources, receiver=receiver, engine="time", **kwargs)
+        assert len(st) == len(st_ref)
+        for tr, tr_ref in zip(st, st_ref):
+            assert tr.stats == tr_ref.stats
+            np.testing.assert_allclose(
+                tr.data, tr_ref.data, rtol=1E-7,
+                atol=1E-12 * np.abs(tr_ref.data).max())
+
+    with pytest.raises(ValueError) as err:
+        db.get_seismograms_finite_source(sources=sources, receiver=receiver,
+                                         engine="random")
+    assert err.value.args[0] == "engine must be one of 'frequency', 'time'."
+
+
+@pytest.mark.parametrize("bwd_db", BW_DISPL_DBS)
+def test_parallel_finite_source(bwd_db):
+    """
+    Splitting the point sources across worker processes gives the same
+    results as the serial engines.
+    """
+    db = find_and_open_files(bwd_db)
+    sources = []
+    for _i in range(10):
+        src = Source(latitude=10.0 + 0.2 * _i, longitude=20.0,
+                     depth_in_m=2000.0 * _i,
+                     m_rr=4.71e+17, m_tt=3.81e+17, m_pp=-4.74e+17,
+                     m_rt=3.99e+17, m_rp=-8.05e+17, m_tp=-1.23e+17)
+        src.set_sliprate_dirac(db.info.dt, nsamp=100)
+        sources.append(src)
+    receiver = Receiver(latitude=42.6390, longitude=74.4940)
+
+    for engine in ("frequency", "time"):
+        st_ref = db.get_seismograms_finite_source(
+            sources=sources, receiver=receiver, engine=engine,
+            correct_mu=True)
+        progress = []
+        st = db.get_seismograms_finite_source(
+            sources=sources, receiver=receiver, engine=engine,
+            correct_mu=True, processes=2,
+            progress_callback=lambda *args: progress.append(args))
+        for tr, tr_ref in zip(st, st_ref):
+            np.testing.assert_allclose(
+                tr.data, tr_ref.data, rtol=1E-7,
+                atol=1E-12 * np.abs(tr_ref.data).max())
+        assert progress[-1] == (10, 10)
+        assert [_i[0] for _i in progress] == sorted(_i[0] for _i in progress)
+
+    # Cancel after the first share.
+    assert db.get_seismograms_finite_source(
+        sources=sources, receiver=receiver, processes=2,
+        progress_callback=lambda *args: True) is None
+
+    # The workers open the database themselves instead of being forked
+    # from this process.
+    from instaseis.database_interfaces.base_instaseis_db import \
+        _get_finite_source_context
+    context = _get_finite_source_context()
+    if hasattr(context, "get_start_method"):
+        assert context.get_start_method() in ("forkserver", "spawn")
+    path, kwargs = db._get_worker_open_arguments()
+    assert path == bwd_db
+    assert "cache_manager" not in kwargs
+
+
+@pytest.mark.parametrize("bwd_db", BW_DISPL_DBS)
+def test_parallel_finite_source_cancel_with_threads(bwd_db):
+    """
+    Cancelling a parallel finite source must not hang in a process that
+    has other threads, e.g. a server.
+    """
+    def _cancel():
+        stop = threading.Event()
+        thread = threading.Thread(target=stop.wait)
+        thread.daemon = True
+        thread.start()
+        db = find_and_open_files(bwd_db)
+        sources = []
+        for _i in range(20):
+            src = Source(latitude=10.0 + 0.1 * _i, longitude=20.0,
+                         depth_in_m=1000.0 * _i,
+                         m_rr=4.71e+17, m_tt=3.81e+17, m_pp=-4.74e+17,
+                         m_rt=3.99e+17, m_rp=-8.05e+17, m_tp=-1.23e+17)
+            src.set_sliprate_dirac(db.info.dt, nsamp=100)
+            sources.append(src)
+        receiver = Receiver(latitude=42.6390, longitude=74.4940)
+        for engine in ("frequency", "time"):
+            st = db.get_seismograms_finite_source(
+                sources=sources, receiver=receiver, processes=2,
+                engine=engine, progress_callback=lambda *args: True)
+            if st is not None:
+                os._exit(1)
+        stop.set()
+        thread.join()
+        os._exit(0)
+
+    try:
+        context = multiprocessing.get_context("fork")
+    except AttributeError:
+        context = multiprocessing
+    p = context.Process(target=_cancel)
+    p.start()
+    p.join(120)
+    if p.is_alive():
+        p.terminate()
+        p.join()
+        pytest.fail("Cancelling the parallel finite source hangs.")
+    assert p.exitcode == 0
+
+
+@pytest.mark.parametrize("bwd_db", BW_DISPL_DBS)
+def test_finite_source_element_groups(bwd_db):
+    """
+    Point sources in the same element are evaluated together by the
+    frequency engine. Same results as evaluating them one by one.
+    """
+    db = find_and_open_files(bwd_db)
+    sources = []
+    for _i in range(6):
+        src = Source(latitude=10.0 + 0.01 * _i, longitude=20.0 - 0.01 * _i,
+                     depth_in_m=1000.0 + 100.0 * _i,
+                     m_rr=4.71e+17, m_tt=3.81e+17, m_pp=-4.74e+17,
+                     m_rt=3.99e+17, m_rp=-8.05e+17, m_tp=-1.23e+17)
+        src.set_sliprate_dirac(db.info.dt, nsamp=100)
+        src.time_shift = 2.0 * _i
+        sources.append(src)
+    receiver = Receiver(latitude=42.6390, longitude=74.4940)
+
+    # Make sure some of them actually share an element.
+    groups = [_i for _i, _ in db._iter_seismograms_batch(
+        sources=sources, receivers=[receiver] * len(sources),
+        components=["Z"])]
+    assert sorted(sum(groups, [])) == list(range(len(sources)))
+    assert len(groups) < len(sources)
+
+    progress = []
+    st = db.get_seismograms_finite_source(
+        sources=sources, receiver=receiver, correct_mu=True,
+        progress_callback=lambda *args: progress.append(args))
+    st_ref = db.get_seismograms_finite_source(
+        sources=sources, receiver=receiver, correct_mu=True, engine="time")
+    for tr, tr_ref in zip(st, st_ref):
+        np.testing.assert_allclose(
+            tr.data, tr_ref.data, rtol=1E-7,
+            atol=1E-12 * np.abs(tr_ref.data).max())
+    assert [_i[0] for _i in progress] == \
+        list(np.cumsum([len(_i) for _i in groups]))
+
+
+def test_interpolate_strain_batch():
+    """
+    Interpolating many points at once is identical to interpolating them
+    one after another.
+    """
+    from instaseis.database_interfaces.base_netcdf_instaseis_db import (
+        _interpolate_strain, _interpolate_strain_batch)
+
+    np.random.seed(12345)
+    col_points = np.array([-1.0, -0.65465367, 0.0, 0.65465367, 1.0])
+    strain = np.random.random((20, 5, 5, 6))
+    xi = np.random.uniform(-1.0, 1.0, 7)
+    eta = np.random.uniform(-1.0, 1.0, 7)
+
+    for flip_sign in (True, False):
+        for dtype in (np.float64, np.float32):
+            expected = np.array([_interpolate_strain(
+                strain.astype(dtype), col_points, col_points, _x, _e,
+                flip_sign=flip_sign, dtype=dtype) for _x, _e in zip(xi, eta)])
+            actual = _interpolate_strain_batch(
+                strain.astype(dtype), col_points, col_points, xi, eta,
+                flip_sign=flip_sign, dtype=dtype)
+            assert actual.dtype == dtype
+            assert actual.shape == (7, 20, 6)
+            np.testing.assert_allclose(
+                actual, expected, rtol=1E-5 if dtype == np.float32 else 1E-12)
@@ -206,3 +206,55 @@ def test_coord_transform_lat_lon_depth_to_xyz_2():
 
     np.testing.assert_allclose(np.array([latitude, longitude, depth_in_m]),
                                np.array([lat, lon, dep]))
+
+
+def test_array_versions_of_rotations():
+    """
+    The array versions of the rotations must give the same results as
+    looping over the scalar versions.
+    """
+    np.random.seed(12345)
+    n = 20
+    mt = np.random.randn(n, 6) * 1e17
+    vec = np.random.randn(n, 3)
+    phi = np.random.uniform(-np.pi, np.pi, n)
+    theta = np.random.uniform(0.0, np.pi, n)
+
+    for name in ["rotate_symm_tensor_voigt_xyz_earth_to_xyz_src",
+                 "rotate_symm_tensor_voigt_xyz_src_to_xyz_earth",
+                 "rotate_vector_xyz_earth_to_xyz_src",
+                 "rotate_vector_xyz_src_to_xyz_earth"]:
+        data = mt if "tensor" in name else vec
+        fct = getattr(rotations, name)
+        ref = np.array([fct(data[_i], phi[_i], theta[_i])
+                        for _i in range(n)])
+        np.testing.assert_allclose(
+            getattr(rotations, name + "_array")(data, phi, theta), ref,
+            rtol=1e-12, atol=np.abs(ref).max() * 1e-14)
+
+    for name in ["rotate_symm_tensor_voigt_xyz_to_src",
+                 "rotate_vector_xyz_to_src",
+                 "rotate_vector_src_to_xyz"]:
+        data = mt if "tensor" in name else vec
+        fct = getattr(rotations, name)
+        ref = np.array([fct(data[_i], phi[_i]) for _i in range(n)])
+        np.testing.assert_allclose(
+            getattr(rotations, name + "_array")(data, phi), ref,
+            rtol=1e-12, atol=np.abs(ref).max() * 1e-14)
+
+
+def test_rotate_frame_rd_array():
+    np.random.seed(12345)
+    n = 20
+    x, y, z = np.random.randn(3, n) * 6371e3
+    # Make sure both branches for phi are hit.
+    lon = np.random.uniform(-180.0, 180.0, n)
+    colat = np.random.uniform(0.0, 180.0, n)
+
+    s, phi, z_rd = rotations.rotate_frame_rd_array(x, y, z, lon, colat)
+    ref = np.array([rotations.rotate_frame_rd(x[_i], y[_i], z[_i], lon[_i],
+                                              colat[_i]) for _i in range(n)])
+    assert (ref[:, 1] > np.pi).any() and (ref[:, 1] < np.pi).any()
+    np.testing.assert_allclose(s, ref[:, 0])
+    np.testing.assert_allclose(phi, ref[:, 1])
+    np.testing.assert_allclose(z_rd, ref[:, 2])
@@ -5230,3 +5230,145 @@ def test_sourcewidth_parameter(all_clients):
         d = st.select(component=comp)[0].data
         d_re = st_re.select(component=comp)[0].data
         assert np.abs(np.fft.rfft(d)).sum() > np.abs(np.fft.rfft(d_re)).sum()
+
+
+def test_worker_pool_queue_limit(reciprocal_clients):
+    """
+    Requests arriving while all workers are busy and the queue is full are
+    rejected with HTTP 503.
+    """
+    import threading
+
+    client = reciprocal_clients
+    params = {"sourcelatitude": 10, "sourcelongitude": 10,
+              "receiverlatitude": -10, "receiverlongitude": -10,
+              "mtt": "100000", "mpp": "200000", "mrr": "300000",
+              "mrt": "400000", "mrp": "500000", "mtp": "600000"}
+
+    release = threading.Event()
+    results = []
+
+    @util.run_async
+    def _block(callback):
+        release.wait()
+        callback(None)
+
+    pool = util.WorkerPool(max_workers=1, max_queue_size=0)
+    util.set_worker_pool(pool)
+    try:
+        _block(callback=results.append)
+        assert pool.pending == 1
+
+        request = client.fetch(_assemble_url('seismograms_raw', **params))
+        assert request.code == 503
+        assert request.reason == "Server is too busy. Please try again later."
+
+        release.set()
+        # Wait until the blocking task is done.
+        while pool.pending:
+            client.io_loop.run_sync(lambda: None)
+        request = client.fetch(_assemble_url('seismograms_raw', **params))
+        assert request.code == 200
+        assert pool.pending == 0
+        assert results == [None]
+    finally:
+        release.set()
+        util.set_worker_pool(None)
+
+
+def test_worker_pool_processes(reciprocal_clients):
+    """
+    A process pool must return the same results as the default thread pool.
+    """
+    import functools
+    from instaseis.database_interfaces import find_and_open_files
+
+    client = reciprocal_clients
+    params = {"sourcelatitude": 10, "sourcelongitude": 10,
+              "receiverlatitude": -10, "receiverlongitude": -10,
+              "mtt": "100000", "mpp": "200000", "mrr": "300000",
+              "mrt": "400000", "mrp": "500000", "mtp": "600000"}
+
+    util.set_worker_pool(None)
+    request = client.fetch(_assemble_url('seismograms_raw', **params))
+    assert request.code == 200
+    st_threads = obspy.read(request.buffer)
+
+    util.set_worker_pool(util.WorkerPool(
+        max_workers=2, kind="process", db=client.application.db,
+        db_opener=functools.partial(find_and_open_files,
+                                    path=client.filepath)))
+    try:
+        request = client.fetch(_assemble_url('seismograms_raw', **params))
+        assert request.code == 200
+        st_processes = obspy.read(request.buffer)
+        assert len(st_threads) == len(st_processes)
+        for tr_1, tr_2 in zip(st_threads, st_processes):
+            assert tr_1.id == tr_2.id
+            np.testing.assert_array_equal(tr_1.data, tr_2.data)
+
+        # Errors and their reasons must survive the process boundary. This
+        # also passes the request to the worker.
+        request = client.fetch(_assemble_url('seismograms'),
+                               method="POST", body=b'abcdefg')
+        assert request.code == 400
+        assert request.reason == ("The body of the POST request is not a "
+                                  "valid JSON file.")
+    finally:
+        util.set_worker_pool(None)
+
+
+def test_worker_pool_invalid_arguments():
+    with pytest.raises(ValueError):
+        util.WorkerPool(max_workers=0)
+    with pytest.raises(ValueError):
+        util.WorkerPool(kind="random")
+    # Process pools need to be able to open the database.
+    with pytest.raises(ValueError):
+        util.WorkerPool(kind="process")
+
+
+def test_locality_scheduling(all_clients_station_coordinates_callback,
+                             monkeypatch):
+    """
+    Processing the receivers in a different order must not change the
+    order of the returned seismograms.
+    """
+    client = all_clients_station_coordinates_callback
+    db = client.application.db
+    params = {"sourcelatitude": 10, "sourcelongitude": 10,
+              "sourcedepthinmeters": client.source_depth,
+              "sourcemomenttensor": "100000,100000,100000,100000,100000,"
+                                    "100000",
+              "network": "IU,B*", "station": "ANT*,ANM?",
+              "format": "miniseed"}
+
+    request = client.fetch(_assemble_url('seismograms', **params))
+    assert request.code == 200
+    expected = request.body
+
+    order = []
+
+    def reversed_order(sources, receivers):
+        order.append(len(receivers))
+        return np.arange(len(receivers))[::-1]
+
+    monkeypatch.setattr(db, "get_element_order", reversed_order)
+    monkeypatch.setattr(client.application, "locality_scheduling", True)
+    request = client.fetch(_assemble_url('seismograms', **params))
+    assert request.code == 200
+    assert order == [2]
+    assert request.body == expected
+    stations = []
+    for tr in obspy.read(io.BytesIO(request.body)):
+        if tr.stats.station not in stations:
+            stations.append(tr.stats.station)
+    assert stations == ["ANTO", "ANMO"]
+
+    # Receivers are only reordered within windows.
+    del order[:]
+    monkeypatch.setattr(client.application, "locality_window", 1)
+    request = client.fetch(_assemble_url('seismograms', **params))
+    assert request.code == 200
+    assert order == [1, 1]
+    assert request.body == expected
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for the persistent on-disc strain cache.
+
+:copyright:
+    The Instaseis Development Team (instaseis@googlegroups.com), 2026
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+from __future__ import absolute_import, division
+
+import inspect
+import os
+
+import numpy as np
+import pytest
+
+from instaseis import Source, Receiver
+from instaseis.database_interfaces import find_and_open_files
+from instaseis.database_interfaces.strain_cache import DiskStrainCache
+
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(
+    inspect.getfile(inspect.currentframe()))), "data")
+
+DBS = [os.path.join(DATA, "100s_db_bwd_displ_only")]
+for _name in ["merged_100s_db_bwd_displ_only",
+              "horizontal_only_merged_database",
+              "vertical_only_merged_database"]:
+    DBS.append(pytest.config.dbs["databases"][_name])
+
+
+def _mesh_file(tmpdir):
+    filename = os.path.join(tmpdir.strpath, "mesh.nc4")
+    with open(filename, "wb") as fh:
+        fh.write(b"mesh")
+    return filename
+
+
+def _item(value):
+    return [np.ones((2, 3)) * value, np.ones((4,)) * -value]
+
+
+def test_disk_strain_cache(tmpdir):
+    """
+    Items can be retrieved and survive reopening the cache.
+    """
+    mesh_file = _mesh_file(tmpdir)
+    cache_dir = os.path.join(tmpdir.strpath, "cache")
+    cache = DiskStrainCache(cache_dir, mesh_file, n_elements=10,
+                            shapes=[(2, 3), (4,)])
+    assert cache.enabled
+    assert len(cache) == 0
+    assert cache.get(3) is None
+
+    cache.add(3, _item(3.0))
+    item = cache.get(3)
+    assert len(item) == 2
+    np.testing.assert_equal(item[0], _item(3.0)[0])
+    np.testing.assert_equal(item[1], _item(3.0)[1])
+    assert len(cache) == 1
+    assert cache.hits == 1
+    assert cache.misses == 1
+    assert cache.efficiency == 0.5
+
+    with pytest.raises(ValueError):
+        cache.add(4, [np.ones((2, 3))])
+
+    cache.flush()
+    del cache
+
+    cache = DiskStrainCache(cache_dir, mesh_file, n_elements=10,
+                            shapes=[(2, 3), (4,)])
+    assert len(cache) == 1
+    np.testing.assert_equal(cache.get(3)[0], _item(3.0)[0])
+
+    # Other shapes result in a different cache.
+    cache = DiskStrainCache(cache_dir, mesh_file, n_elements=10,
+                            shapes=[(3, 2), (4,)])
+    assert len(cache) == 0
+    assert cache.get(3) is None
+
+
+def test_disk_strain_cache_eviction(tmpdir):
+    """
+    Slots are reused in a ring once the cache is full.
+    """
+    mesh_file = _mesh_file(tmpdir)
+    # Room for exactly three items of 10 float64 values each.
+    cache = DiskStrainCache(tmpdir.strpath, mesh_file, n_elements=10,
+                            shapes=[(2, 3), (4,)],
+                            max_size_in_mb=3 * 10 * 8 / 1024 ** 2)
+    assert cache.n_slots == 3
+
+    for _i in range(5):
+        cache.add(_i, _item(float(_i)))
+    assert len(cache) == 3
+
+    assert cache.get(0) is None
+    assert cache.get(1) is None
+    for _i in range(2, 5):
+        np.testing.assert_equal(cache.get(_i)[0], _item(float(_i))[0])
+
+
+def test_disk_strain_cache_too_small(tmpdir):
+    """
+    A cache without room for a single item is disabled.
+    """
+    mesh_file = _mesh_file(tmpdir)
+    cache = DiskStrainCache(tmpdir.strpath, mesh_file, n_elements=10,
+                            shapes=[(2, 3), (4,)], max_size_in_mb=1E-6)
+    assert not cache.enabled
+    cache.add(1, _item(1.0))
+    assert cache.get(1) is None
+    assert len(cache) == 0
+    assert os.listdir(tmpdir.strpath) == ["mesh.nc4"]
+
+
+@pytest.mark.parametrize("path", DBS)
+def test_seismograms_with_disk_strain_cache(path, tmpdir):
+    """
+    Seismograms must not change if the strain is read from the cache - also
+    not with a fresh database object.
+    """
+    src = Source(latitude=4., longitude=3.0, depth_in_m=0,
+                 m_rr=4.71e+17, m_tt=3.81e+17, m_pp=-4.74e+17,
+                 m_rt=3.99e+17, m_rp=-8.05e+17, m_tp=-1.23e+17)
+    rec = Receiver(latitude=10., longitude=20.)
+
+    reference = find_and_open_files(path).get_seismograms(
+        source=src, receiver=rec)
+
+    db = find_and_open_files(path, strain_cache_dir=tmpdir.strpath)
+    st = db.get_seismograms(source=src, receiver=rec)
+    assert all(len(_i) == 1 for _i in db._disk_strain_caches.values())
+    for tr, tr_ref in zip(st, reference):
+        np.testing.assert_allclose(tr.data, tr_ref.data)
+
+    db = find_and_open_files(path, strain_cache_dir=tmpdir.strpath)
+    st = db.get_seismograms(source=src, receiver=rec)
+    caches = list(db._disk_strain_caches.values())
+    assert caches
+    assert all(_i.hits == 1 and _i.misses == 0 for _i in caches)
+    for tr, tr_ref in zip(st, reference):
+        np.testing.assert_allclose(tr.data, tr_ref.data)
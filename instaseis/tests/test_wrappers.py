@@ -12,9 +12,10 @@ Mostly testing the various wrappers.
 from __future__ import absolute_import
 
 import numpy as np
+import pytest
 
 
-from instaseis import finite_elem_mapping, rotations
+from instaseis import finite_elem_mapping, rotations, spectral_basis
 
 
 def test_rotate_frame_rd():
@@ -41,3 +42,43 @@ def test_inside_element():
     assert is_in
     assert abs(xi - -0.68507753579755248 < 1E-5)
     assert abs(eta - -0.60000654152462352 < 1E-5)
+
+
+def test_lagrange_interpol_2D_td_multi():  # NOQA
+    """
+    Interpolating all components to many points at once gives the same
+    results as interpolating them one by one.
+    """
+    np.random.seed(12345)
+    points = np.array([-1.0, -0.65465367, 0.0, 0.65465367, 1.0])
+    coefficients = np.random.random((20, 5, 5, 6))
+    x1 = np.random.uniform(-1.0, 1.0, 4)
+    x2 = np.random.uniform(-1.0, 1.0, 4)
+
+    for dtype in (np.float64, np.float32):
+        c = coefficients.astype(dtype)
+        interpolant = spectral_basis.lagrange_interpol_2D_td_multi(
+            points, points, c, x1, x2, dtype=dtype)
+        assert interpolant.shape == (20, 6, 4)
+        assert interpolant.dtype == dtype
+        for i in range(6):
+            for j in range(4):
+                np.testing.assert_allclose(
+                    interpolant[:, i, j],
+                    spectral_basis.lagrange_interpol_2D_td(
+                        points, points, c[:, :, :, i], x1[j], x2[j],
+                        dtype=dtype),
+                    rtol=1E-6 if dtype == np.float32 else 1E-12)
+
+    # Interpolating at a collocation point returns its coefficients.
+    interpolant = spectral_basis.lagrange_interpol_2D_td_multi(
+        points, points, coefficients, [points[1]], [points[3]])
+    np.testing.assert_allclose(interpolant[:, :, 0],
+                               coefficients[:, 1, 3, :], atol=1E-12)
+
+    with pytest.raises(ValueError):
+        spectral_basis.lagrange_interpol_2D_td_multi(
+            points, points, coefficients[:, :4], x1, x2)
+    with pytest.raises(ValueError):
+        spectral_basis.lagrange_interpol_2D_td_multi(
+            points, points, coefficients, x1, x2[:2])
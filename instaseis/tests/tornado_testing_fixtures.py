@@ -250,6 +250,8 @@ def create_async_client(path, station_coordinates_callback=None,
     application.event_info_callback = event_info_callback
     application.travel_time_callback = travel_time_callback
     application.max_size_of_finite_sources = 1000
+    application.locality_scheduling = False
+    application.locality_window = 64
     # Build server as in testing:311
     sock, port = bind_unused_port()
     server = HTTPServer(application, io_loop=IOLoop.instance())
@@ -156,6 +156,8 @@ EXTRAS_REQUIRE = {
 # library.
 if sys.version_info[0] == 2:
     INSTALL_REQUIRES.append("mock")
+    # Backport of concurrent.futures for the server.
+    INSTALL_REQUIRES.append("futures")
 
 setup_config = dict(
     name="instaseis",